@@ -0,0 +1,41 @@
+"""Drop totals of days without entries
+
+Days holding only empty meals used to get an all-zero ``dailytotals`` row and
+counted as logged in ``periodtotals``. Remove those rows and the cached
+periods; both are recomputed on the next read. Every day version moves up so
+ETags handed out for the old rollups stop matching.
+
+Revision ID: 1e5d8c2a7f43
+Revises: 6a1c8e3f9b47
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "1e5d8c2a7f43"
+down_revision = "6a1c8e3f9b47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    tables = set(inspect(bind).get_table_names())
+    if "dailytotals" in tables:
+        op.execute(
+            "DELETE FROM dailytotals WHERE date NOT IN ("
+            "SELECT meal.date FROM meal "
+            "JOIN foodentry ON foodentry.meal_id = meal.id)"
+        )
+    if "periodtotals" in tables:
+        op.execute("DELETE FROM periodtotals")
+    if "dayversion" in tables:
+        op.execute("UPDATE dayversion SET version = version + 1")
+
+
+def downgrade() -> None:
+    # Nothing to restore: the rows were derived data
+    pass
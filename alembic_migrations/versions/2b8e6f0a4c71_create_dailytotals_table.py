@@ -0,0 +1,40 @@
+"""Create dailytotals table
+
+Revision ID: 2b8e6f0a4c71
+Revises: 7d4f2a9c3e15
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "2b8e6f0a4c71"
+down_revision = "7d4f2a9c3e15"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    # Left empty: days are filled on first read or by python -m server.daily_totals
+    if "dailytotals" not in insp.get_table_names():
+        op.create_table(
+            "dailytotals",
+            sa.Column("date", sa.String(), primary_key=True),
+            sa.Column("kcal", sa.Float(), nullable=False),
+            sa.Column("protein", sa.Float(), nullable=False),
+            sa.Column("carb", sa.Float(), nullable=False),
+            sa.Column("fat", sa.Float(), nullable=False),
+            sa.Column("nutrients", sa.LargeBinary(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "dailytotals" in insp.get_table_names():
+        op.drop_table("dailytotals")
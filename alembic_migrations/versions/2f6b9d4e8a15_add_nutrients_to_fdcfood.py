@@ -0,0 +1,37 @@
+"""Add nutrients and portions columns to fdcfood
+
+Revision ID: 2f6b9d4e8a15
+Revises: 1e5d8c2a7f43
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "2f6b9d4e8a15"
+down_revision = "1e5d8c2a7f43"
+branch_labels = None
+depends_on = None
+
+COLUMNS = {"nutrients": sa.LargeBinary, "portions": sa.String}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    existing = [c["name"] for c in insp.get_columns("fdcfood")]
+    for name, type_ in COLUMNS.items():
+        if name not in existing:
+            op.add_column("fdcfood", sa.Column(name, type_(), nullable=True))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    existing = [c["name"] for c in insp.get_columns("fdcfood")]
+    for name in COLUMNS:
+        if name in existing:
+            op.drop_column("fdcfood", name)
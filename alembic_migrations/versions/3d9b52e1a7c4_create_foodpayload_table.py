@@ -0,0 +1,36 @@
+"""Create foodpayload table
+
+Revision ID: 3d9b52e1a7c4
+Revises: c6367ec8473a
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "3d9b52e1a7c4"
+down_revision = "c6367ec8473a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "foodpayload" not in insp.get_table_names():
+        op.create_table(
+            "foodpayload",
+            sa.Column("fdc_id", sa.Integer(), primary_key=True),
+            sa.Column("fetched_at", sa.DateTime(), primary_key=True),
+            sa.Column("data", sa.LargeBinary(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "foodpayload" in insp.get_table_names():
+        op.drop_table("foodpayload")
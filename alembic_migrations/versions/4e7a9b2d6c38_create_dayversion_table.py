@@ -0,0 +1,35 @@
+"""Create dayversion table
+
+Revision ID: 4e7a9b2d6c38
+Revises: 9f3c1d7e5b20
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "4e7a9b2d6c38"
+down_revision = "9f3c1d7e5b20"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "dayversion" not in insp.get_table_names():
+        op.create_table(
+            "dayversion",
+            sa.Column("date", sa.String(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "dayversion" in insp.get_table_names():
+        op.drop_table("dayversion")
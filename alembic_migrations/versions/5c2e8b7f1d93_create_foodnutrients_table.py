@@ -0,0 +1,35 @@
+"""Create foodnutrients table
+
+Revision ID: 5c2e8b7f1d93
+Revises: a41f0c9d6e28
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "5c2e8b7f1d93"
+down_revision = "a41f0c9d6e28"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "foodnutrients" not in insp.get_table_names():
+        op.create_table(
+            "foodnutrients",
+            sa.Column("fdc_id", sa.Integer(), primary_key=True),
+            sa.Column("vector", sa.LargeBinary(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "foodnutrients" in insp.get_table_names():
+        op.drop_table("foodnutrients")
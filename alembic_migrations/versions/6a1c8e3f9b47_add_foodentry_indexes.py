@@ -0,0 +1,39 @@
+"""Add foodentry indexes for analytics
+
+Revision ID: 6a1c8e3f9b47
+Revises: 4e7a9b2d6c38
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "6a1c8e3f9b47"
+down_revision = "4e7a9b2d6c38"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_foodentry_fdc_id": ["fdc_id"],
+    "ix_foodentry_meal_food": ["meal_id", "fdc_id", "quantity_g"],
+}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    existing = {ix["name"] for ix in insp.get_indexes("foodentry")}
+    for name, columns in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, "foodentry", columns)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    existing = {ix["name"] for ix in insp.get_indexes("foodentry")}
+    for name in INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name="foodentry")
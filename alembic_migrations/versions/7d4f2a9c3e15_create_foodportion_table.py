@@ -0,0 +1,48 @@
+"""Create foodportion table and foodentry.portion_id
+
+Revision ID: 7d4f2a9c3e15
+Revises: 5c2e8b7f1d93
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "7d4f2a9c3e15"
+down_revision = "5c2e8b7f1d93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "foodportion" not in insp.get_table_names():
+        op.create_table(
+            "foodportion",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("fdc_id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("amount", sa.Float(), nullable=False),
+            sa.Column("gram_weight", sa.Float(), nullable=False),
+            sa.UniqueConstraint("fdc_id", "name", name="uq_portion_name"),
+        )
+        op.create_index("ix_foodportion_fdc_id", "foodportion", ["fdc_id"])
+    columns = {c["name"] for c in insp.get_columns("foodentry")}
+    if "portion_id" not in columns:
+        op.add_column("foodentry", sa.Column("portion_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    columns = {c["name"] for c in insp.get_columns("foodentry")}
+    if "portion_id" in columns:
+        with op.batch_alter_table("foodentry") as batch:
+            batch.drop_column("portion_id")
+    if "foodportion" in insp.get_table_names():
+        op.drop_index("ix_foodportion_fdc_id", table_name="foodportion")
+        op.drop_table("foodportion")
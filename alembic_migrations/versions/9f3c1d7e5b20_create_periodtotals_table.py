@@ -0,0 +1,38 @@
+"""Create periodtotals table
+
+Revision ID: 9f3c1d7e5b20
+Revises: 2b8e6f0a4c71
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "9f3c1d7e5b20"
+down_revision = "2b8e6f0a4c71"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "periodtotals" not in insp.get_table_names():
+        op.create_table(
+            "periodtotals",
+            sa.Column("granularity", sa.String(), primary_key=True),
+            sa.Column("start", sa.String(), primary_key=True),
+            sa.Column("end", sa.String(), nullable=False),
+            sa.Column("logged_days", sa.Integer(), nullable=False),
+            sa.Column("nutrients", sa.LargeBinary(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "periodtotals" in insp.get_table_names():
+        op.drop_table("periodtotals")
@@ -0,0 +1,35 @@
+"""Create missingfood table
+
+Revision ID: a41f0c9d6e28
+Revises: 3d9b52e1a7c4
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "a41f0c9d6e28"
+down_revision = "3d9b52e1a7c4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "missingfood" not in insp.get_table_names():
+        op.create_table(
+            "missingfood",
+            sa.Column("fdc_id", sa.Integer(), primary_key=True),
+            sa.Column("checked_at", sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "missingfood" in insp.get_table_names():
+        op.drop_table("missingfood")
@@ -0,0 +1,91 @@
+"""Create food_fts full-text index
+
+Revision ID: c6367ec8473a
+Revises: fee6a10376eb
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import logging
+
+from alembic import op
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+revision = "c6367ec8473a"
+down_revision = "fee6a10376eb"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger(__name__)
+
+# Literal copies of the DDL at the time of this revision; server/search_index.py
+# keeps the live version for databases created from the models.
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE food_fts USING fts5("
+    "description, brand_owner, alias, tokenize = 'unicode61 remove_diacritics 2')"
+)
+BACKFILL = """
+    INSERT INTO food_fts(rowid, description, brand_owner, alias)
+    SELECT food.fdc_id, food.description, food.brand_owner, favorite.alias
+    FROM food LEFT JOIN favorite ON favorite.fdc_id = food.fdc_id
+"""
+TRIGGERS = {
+    "food_fts_ai": """CREATE TRIGGER IF NOT EXISTS food_fts_ai
+        AFTER INSERT ON food BEGIN
+        INSERT INTO food_fts(rowid, description, brand_owner, alias)
+        VALUES (new.fdc_id, new.description, new.brand_owner,
+                (SELECT alias FROM favorite WHERE fdc_id = new.fdc_id));
+    END""",
+    "food_fts_au": """CREATE TRIGGER IF NOT EXISTS food_fts_au
+        AFTER UPDATE OF description, brand_owner ON food BEGIN
+        UPDATE food_fts SET description = new.description,
+            brand_owner = new.brand_owner
+        WHERE rowid = new.fdc_id;
+    END""",
+    "food_fts_ad": """CREATE TRIGGER IF NOT EXISTS food_fts_ad
+        AFTER DELETE ON food BEGIN
+        DELETE FROM food_fts WHERE rowid = old.fdc_id;
+    END""",
+    "favorite_fts_ai": """CREATE TRIGGER IF NOT EXISTS favorite_fts_ai
+        AFTER INSERT ON favorite BEGIN
+        UPDATE food_fts SET alias = new.alias WHERE rowid = new.fdc_id;
+    END""",
+    "favorite_fts_au": """CREATE TRIGGER IF NOT EXISTS favorite_fts_au
+        AFTER UPDATE OF alias ON favorite BEGIN
+        UPDATE food_fts SET alias = new.alias WHERE rowid = new.fdc_id;
+    END""",
+    "favorite_fts_ad": """CREATE TRIGGER IF NOT EXISTS favorite_fts_ad
+        AFTER DELETE ON favorite BEGIN
+        UPDATE food_fts SET alias = NULL WHERE rowid = old.fdc_id;
+    END""",
+}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    exists = bind.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'food_fts'")
+    ).first()
+    if exists is None:
+        try:
+            bind.execute(text(CREATE_TABLE))
+        except OperationalError as exc:
+            # Search falls back to LIKE scans without FTS5
+            logger.warning("FTS5 unavailable, skipping food_fts: %s", exc)
+            return
+        bind.execute(text(BACKFILL))
+    for ddl in TRIGGERS.values():
+        bind.execute(text(ddl))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    for name in TRIGGERS:
+        bind.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    bind.execute(text("DROP TABLE IF EXISTS food_fts"))
@@ -0,0 +1,43 @@
+"""Create fdcfood table
+
+Revision ID: fee6a10376eb
+Revises: 8e7a06648fd2
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "fee6a10376eb"
+down_revision = "8e7a06648fd2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "fdcfood" not in insp.get_table_names():
+        op.create_table(
+            "fdcfood",
+            sa.Column("fdc_id", sa.Integer(), primary_key=True),
+            sa.Column("description", sa.String(), nullable=False),
+            sa.Column("brand_owner", sa.String(), nullable=True),
+            sa.Column("data_type", sa.String(), nullable=True),
+            sa.Column("kcal_per_100g", sa.Float(), nullable=False),
+            sa.Column("protein_g_per_100g", sa.Float(), nullable=False),
+            sa.Column("fat_g_per_100g", sa.Float(), nullable=False),
+            sa.Column("carb_g_per_100g", sa.Float(), nullable=False),
+        )
+        op.create_index("ix_fdcfood_description", "fdcfood", ["description"])
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "fdcfood" in insp.get_table_names():
+        op.drop_index("ix_fdcfood_description", table_name="fdcfood")
+        op.drop_table("fdcfood")
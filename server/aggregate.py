@@ -0,0 +1,124 @@
+"""Column-wise nutrient totals for the day, export and history endpoints.
+
+:class:`EntryNutrients` loads a set of entries as columns: one scale factor
+per entry (grams / 100, or units for foods logged per unit) and the food's
+nutrient coefficients as one row of a matrix. Per-entry nutrients are then a
+single broadcast multiplication and per-meal or per-day totals one grouped
+sum, instead of a call to :func:`server.utils.scaled_macros_from_food` with
+its ``unit_name`` branch per entry.
+
+NumPy is used when it is installed; otherwise the same arithmetic runs on
+plain lists. Both add in entry order, so results match the per-entry loop to
+the last bit.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Hashable, List, Mapping, Optional, Sequence
+
+from server import nutrients as nutrient_vectors
+from server.models import Food, FoodEntry
+
+try:
+    import numpy as np
+except ModuleNotFoundError:  # pragma: no cover - optional dependency
+    np = None
+
+SIZE = len(nutrient_vectors.NUTRIENTS)
+
+
+class EntryNutrients:
+    """Nutrient vectors of a column of entries, in order.
+
+    ``fdc_ids`` and ``quantities`` hold one value per entry; use :meth:`of`
+    for ``FoodEntry`` rows. Entries whose food is not cached count as zero.
+    ``vectors`` are the stored per-food vectors from
+    :func:`server.nutrients.load_vectors`; leave them out when only macros
+    are needed.
+    """
+
+    def __init__(
+        self,
+        fdc_ids: Sequence[int],
+        quantities: Sequence[Optional[float]],
+        foods: Mapping[int, Food],
+        vectors: Optional[Mapping[int, List[float]]] = None,
+        use_numpy: Optional[bool] = None,
+    ) -> None:
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        vectors = vectors or {}
+        # One coefficient row per distinct food; row 0 stands for uncached foods
+        coefs: List[List[float]] = [[0.0] * SIZE]
+        per_unit: List[bool] = [False]
+        slots: Dict[int, int] = {}
+        for fdc_id in dict.fromkeys(fdc_ids):
+            food = foods.get(fdc_id)
+            if food is None:
+                slots[fdc_id] = 0
+                continue
+            slots[fdc_id] = len(coefs)
+            coefs.append(nutrient_vectors.food_vector(food, vectors.get(fdc_id)))
+            per_unit.append(bool(food.unit_name))
+        food_rows = [slots[fdc_id] for fdc_id in fdc_ids]
+        factors = [
+            (q or 0) if per_unit[slot] else (q or 0) / 100.0
+            for slot, q in zip(food_rows, quantities)
+        ]
+        if self.use_numpy:
+            index = np.array(food_rows, dtype=np.intp)
+            matrix = np.array(coefs, dtype=float)
+            self._values = matrix[index] * np.array(factors, dtype=float)[:, None]
+        else:
+            self._values = [
+                [v * factor for v in coefs[slot]]
+                for slot, factor in zip(food_rows, factors)
+            ]
+
+    @classmethod
+    def of(
+        cls,
+        entries: Sequence[FoodEntry],
+        foods: Mapping[int, Food],
+        vectors: Optional[Mapping[int, List[float]]] = None,
+        use_numpy: Optional[bool] = None,
+    ) -> "EntryNutrients":
+        return cls(
+            [e.fdc_id for e in entries],
+            [e.quantity_g for e in entries],
+            foods,
+            vectors,
+            use_numpy,
+        )
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def rows(self) -> List[List[float]]:
+        """Per-entry vectors as plain floats."""
+        if self.use_numpy:
+            return self._values.tolist()
+        return self._values
+
+    def sum_by(self, keys: Sequence[Hashable]) -> Dict[Hashable, List[float]]:
+        """Totals grouped by ``keys``, one key per entry."""
+        index: Dict[Hashable, int] = {}
+        groups = [index.setdefault(k, len(index)) for k in keys]
+        if self.use_numpy:
+            out = np.zeros((len(index), SIZE))
+            # add.at sums sequentially, unlike sum(), so floats match the loop
+            np.add.at(out, np.array(groups, dtype=np.intp), self._values)
+            sums = out.tolist()
+        else:
+            sums = [[0.0] * SIZE for _ in index]
+            for group, row in zip(groups, self._values):
+                acc = sums[group]
+                for i in range(SIZE):
+                    acc[i] += row[i]
+        return {k: sums[i] for k, i in index.items()}
+
+    def total(self) -> List[float]:
+        return self.sum_by([None] * len(self)).get(None, [0.0] * SIZE)
+
+
+def as_dict(vector: Sequence[float], names: Sequence[str]) -> Dict[str, float]:
+    return {n: vector[nutrient_vectors.INDEX[n]] for n in names}
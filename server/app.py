@@ -6,12 +6,24 @@ from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import SQLModel
+from sqlmodel import Session, SQLModel
 
 from server import utils
 from server.db import get_engine
-from server.routers import config, foods, history, meals, presets, weight, water
+from server.refresher import food_refresher
+from server.routers import (
+    analytics,
+    config,
+    foods,
+    history,
+    meals,
+    presets,
+    weight,
+    water,
+)
 from server.run_migrations import run_migrations
+from server.suggest import suggest_index
+from server.trends import series_cache
 
 logging.basicConfig(level=logging.INFO)
 
@@ -22,12 +34,18 @@ async def lifespan(app: FastAPI):
     engine = get_engine()
     SQLModel.metadata.create_all(engine)
     run_migrations(str(Path(__file__).resolve().parent.parent / "alembic.ini"), engine)
+    with Session(engine) as session:
+        suggest_index.build(session)
+    meals.day_cache.clear()
+    series_cache.clear()
+    food_refresher.start()
     try:
         yield
     except asyncio.CancelledError:
         # Swallow cancellation so reloads or Ctrl+C don't raise a stack trace
         pass
     finally:
+        await food_refresher.stop()
         await utils.aclose_usda_client()
 
 
@@ -52,6 +70,7 @@ app.include_router(foods.router)
 app.include_router(meals.router)
 app.include_router(presets.router)
 app.include_router(history.router)
+app.include_router(analytics.router)
 app.include_router(weight.router)
 app.include_router(water.router)
 app.include_router(config.router)
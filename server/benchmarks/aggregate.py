@@ -0,0 +1,118 @@
+"""Benchmark :class:`server.aggregate.EntryNutrients` against the per-entry loop.
+
+Builds a synthetic log (``--entries`` entries over ``--days`` days, a mix of
+per-100 g and per-unit foods with stored nutrient vectors), sums it per day
+with the loop the endpoints used before and with ``EntryNutrients`` on both
+backends, and checks the totals are identical::
+
+    python -m server.benchmarks.aggregate [--entries N] [--days N] [--rounds N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+from server import aggregate
+from server import nutrients as nutrient_vectors
+from server.models import Food, FoodEntry
+from server.utils import scaled_macros_from_food
+
+
+def synthetic_log(entries: int, days: int, foods: int = 500, seed: int = 1):
+    rng = random.Random(seed)
+    food_map: Dict[int, Food] = {}
+    vectors: Dict[int, List[float]] = {}
+    for fdc_id in range(foods):
+        per_unit = fdc_id % 10 == 0
+        food_map[fdc_id] = Food(
+            fdc_id=fdc_id,
+            description=f"Food {fdc_id}",
+            kcal_per_100g=rng.uniform(0, 900),
+            protein_g_per_100g=rng.uniform(0, 40),
+            carb_g_per_100g=rng.uniform(0, 90),
+            fat_g_per_100g=rng.uniform(0, 60),
+            unit_name="piece" if per_unit else None,
+            kcal_per_unit=rng.uniform(0, 300) if per_unit else None,
+            protein_g_per_unit=rng.uniform(0, 20) if per_unit else None,
+        )
+        vectors[fdc_id] = [rng.uniform(0, 50) for _ in nutrient_vectors.NUTRIENTS]
+    log = [
+        FoodEntry(
+            meal_id=rng.randrange(days),
+            fdc_id=rng.randrange(foods + 5),  # a few entries of uncached foods
+            quantity_g=rng.uniform(1, 400),
+            sort_order=i,
+        )
+        for i in range(entries)
+    ]
+    return log, food_map, vectors
+
+
+def legacy_daily_totals(log, foods, vectors) -> Dict[int, List[float]]:
+    """The per-entry loop the day, history and export endpoints used."""
+    extra = nutrient_vectors.NUTRIENTS[4:]
+    totals: Dict[int, List[float]] = {}
+    for e in log:
+        acc = totals.setdefault(e.meal_id, [0.0] * len(nutrient_vectors.NUTRIENTS))
+        food = foods.get(e.fdc_id)
+        if not food:
+            continue
+        for i, v in enumerate(scaled_macros_from_food(food, e.quantity_g)):
+            acc[i] += v
+        vec = nutrient_vectors.scaled(food, vectors.get(food.fdc_id), e.quantity_g)
+        for name in extra:
+            acc[nutrient_vectors.INDEX[name]] += vec[nutrient_vectors.INDEX[name]]
+    return totals
+
+
+def _time(fn: Callable[[], object], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=150_000)
+    parser.add_argument("--days", type=int, default=1_800)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+    log, foods, vectors = synthetic_log(args.entries, args.days)
+    # The endpoints load these columns straight from SQL
+    days = [e.meal_id for e in log]
+    fdc_ids = [e.fdc_id for e in log]
+    quantities = [e.quantity_g for e in log]
+
+    def vectorized(use_numpy: bool) -> Dict[int, List[float]]:
+        values = aggregate.EntryNutrients(
+            fdc_ids, quantities, foods, vectors, use_numpy=use_numpy
+        )
+        return values.sum_by(days)
+
+    expected = legacy_daily_totals(log, foods, vectors)
+    backends = {"python": False}
+    if aggregate.np is not None:
+        backends["numpy"] = True
+    for name, use_numpy in backends.items():
+        if vectorized(use_numpy) != expected:
+            raise SystemExit(f"EntryNutrients ({name}) differs from the loop")
+
+    rounds = max(1, args.rounds)
+    print(f"{len(log)} entries over {args.days} days, totals identical")
+    legacy = _time(lambda: legacy_daily_totals(log, foods, vectors), rounds)
+    print(f"per-entry loop        {legacy:8.1f} ms")
+    for name, use_numpy in backends.items():
+        ms = _time(lambda: vectorized(use_numpy), rounds)
+        print(f"EntryNutrients {name:<6} {ms:8.1f} ms ({legacy / ms:.2f}x)")
+    if aggregate.np is None:
+        print("numpy is not installed; only the list backend was measured")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark :func:`server.utils.extract_macros_from_fdc` against its predecessor.
+
+Runs both implementations over recorded FDC payloads (``server/logs/*.json`` by
+default, or any JSON files given on the command line, including bulk release
+files) and checks that their output is identical. The old implementation lives
+with its equivalence test in ``server/tests/test_extract_macros.py``::
+
+    python -m server.benchmarks.extract_macros [--rounds N] [paths ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from server.tests.test_extract_macros import legacy_extract_macros_from_fdc
+from server.utils import extract_macros_from_fdc, extract_macros_many
+
+LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
+
+
+def load_payloads(paths: List[Path]) -> List[dict]:
+    """Read food payloads from single-food, list or bulk release JSON files."""
+    foods: List[dict] = []
+    for path in paths:
+        with open(path, encoding="utf-8") as fp:
+            data = json.load(fp)
+        if isinstance(data, list):
+            foods.extend(d for d in data if isinstance(d, dict))
+        elif "foodNutrients" in data or "fdcId" in data:
+            foods.append(data)
+        else:
+            for value in data.values():
+                if isinstance(value, list):
+                    foods.extend(d for d in value if isinstance(d, dict))
+    return foods
+
+
+def _time_per_food(fn: Callable[[], object], count: int, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / (rounds * count) * 1e6
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", type=Path)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args(argv)
+    foods = load_payloads(args.paths or sorted(LOG_DIR.glob("*.json")))
+    if not foods:
+        parser.error("no FDC payloads found")
+
+    expected = [legacy_extract_macros_from_fdc(d) for d in foods]
+    if extract_macros_many(foods) != expected:
+        raise SystemExit("extract_macros_from_fdc output differs from legacy")
+
+    rounds = max(1, args.rounds)
+    legacy = _time_per_food(
+        lambda: [legacy_extract_macros_from_fdc(d) for d in foods], len(foods), rounds
+    )
+    single = _time_per_food(
+        lambda: [extract_macros_from_fdc(d) for d in foods], len(foods), rounds
+    )
+    batch = _time_per_food(lambda: extract_macros_many(foods), len(foods), rounds)
+    print(f"{len(foods)} foods x {rounds} rounds, output identical")
+    print(f"legacy               {legacy:8.2f} us/food")
+    print(f"table-driven         {single:8.2f} us/food ({legacy / single:.2f}x)")
+    print(f"extract_macros_many  {batch:8.2f} us/food ({legacy / batch:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""Per-day nutrient totals in ``dailytotals``, kept current on every commit.
+
+Session hooks note which days a flush touched: entries added, rescaled, moved
+or removed, meals re-dated or deleted, and foods (or their nutrient vectors)
+whose values changed. Right before the transaction commits those days are
+recomputed from their entries with a ``GROUP BY`` in SQL, so the totals change
+atomically with the log and ``/api/history`` reads one row per day instead of
+every entry.
+
+Every such commit also moves the touched days (and days whose weight or water
+changed) to a new version in ``dayversion``; day and history responses derive
+their ETags from those versions.
+
+Days logged before the table existed are filled the first time they are read.
+To regenerate the whole table, run::
+
+    python -m server.daily_totals
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import zlib
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import case, delete, event, func, insert, inspect
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from server import db
+from server import nutrients as nutrient_vectors
+from server.models import (
+    BodyWeight,
+    DailyTotals,
+    DayVersion,
+    Food,
+    FoodEntry,
+    FoodNutrients,
+    FoodPortion,
+    Meal,
+    PeriodTotals,
+    WaterIntake,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+_PENDING = "daily_totals_pending"
+_COMMITTING = "daily_totals_committing"
+# Called with the changed days after each commit, see on_change()
+_listeners: List[Callable[[Set[str]], None]] = []
+_ENTRY_FIELDS = ("meal_id", "fdc_id", "quantity_g", "sort_order", "portion_id")
+_FOOD_FIELDS = (
+    "description",
+    "kcal_per_100g",
+    "protein_g_per_100g",
+    "carb_g_per_100g",
+    "fat_g_per_100g",
+    "unit_name",
+    "kcal_per_unit",
+    "protein_g_per_unit",
+    "carb_g_per_unit",
+    "fat_g_per_unit",
+)
+_table = DailyTotals.__table__
+_periods = PeriodTotals.__table__
+_versions = DayVersion.__table__
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def _chunks(items: Iterable, size: int = BATCH_SIZE) -> Iterable[list]:
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _changes(obj, fields: Iterable[str]) -> Optional[list]:
+    """Previous values of ``fields`` that changed, or None if none did."""
+    state = inspect(obj)
+    old: list = []
+    changed = False
+    for field in fields:
+        hist = state.attrs[field].history
+        if hist.has_changes() and list(hist.deleted) != list(hist.added):
+            changed = True
+            old.extend(hist.deleted)
+    return old if changed else None
+
+
+def _dates_for_meals(session: OrmSession, meal_ids: Set[int]) -> Set[str]:
+    meal_ids.discard(None)
+    if not meal_ids:
+        return set()
+    conn = session.connection()
+    return {
+        d
+        for chunk in _chunks(meal_ids)
+        for d in conn.execute(select(Meal.date).where(Meal.id.in_(chunk))).scalars()
+    }
+
+
+def _dates_for_foods(session: OrmSession, fdc_ids: Set[int]) -> Set[str]:
+    conn = session.connection()
+    return {
+        d
+        for chunk in _chunks(fdc_ids)
+        for d in conn.execute(
+            select(Meal.date)
+            .join(FoodEntry, FoodEntry.meal_id == Meal.id)
+            .where(FoodEntry.fdc_id.in_(chunk))
+            .distinct()
+        ).scalars()
+    }
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect(session: OrmSession, flush_context) -> None:
+    dates: Set[str] = set()
+    foods: Set[int] = set()
+    # Days whose history row changes without affecting their totals
+    touched: Set[str] = set()
+    meal_ids: Set[int] = set()
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, FoodEntry):
+            meal_ids.add(obj.meal_id)
+        elif isinstance(obj, Meal):
+            dates.add(obj.date)
+        elif isinstance(obj, (Food, FoodNutrients, FoodPortion)):
+            foods.add(obj.fdc_id)
+        elif isinstance(obj, (BodyWeight, WaterIntake)):
+            touched.add(obj.date)
+    for obj in session.dirty:
+        if isinstance(obj, FoodEntry):
+            if _changes(obj, _ENTRY_FIELDS) is not None:
+                meal_ids.add(obj.meal_id)
+                meal_ids.update(_changes(obj, ("meal_id",)) or ())
+        elif isinstance(obj, Meal):
+            if _changes(obj, ("name", "sort_order", "date")) is not None:
+                dates.update([obj.date, *(_changes(obj, ("date",)) or ())])
+        elif isinstance(obj, Food):
+            if _changes(obj, _FOOD_FIELDS) is not None:
+                foods.add(obj.fdc_id)
+        elif isinstance(obj, FoodNutrients):
+            if _changes(obj, ("vector",)) is not None:
+                foods.add(obj.fdc_id)
+        elif isinstance(obj, FoodPortion):
+            if _changes(obj, ("amount", "gram_weight")) is not None:
+                foods.add(obj.fdc_id)
+        elif isinstance(obj, (BodyWeight, WaterIntake)):
+            value = "weight" if isinstance(obj, BodyWeight) else "milliliters"
+            if _changes(obj, (value, "date")) is not None:
+                touched.update([obj.date, *(_changes(obj, ("date",)) or ())])
+    dates |= _dates_for_meals(session, meal_ids)
+    if dates or foods or touched:
+        pending = session.info.setdefault(_PENDING, (set(), set(), set()))
+        pending[0].update(dates)
+        pending[1].update(foods)
+        pending[2].update(touched)
+
+
+@event.listens_for(OrmSession, "before_commit")
+def _refresh_pending(session: OrmSession) -> None:
+    # commit() flushes only after this hook, so flush now to see every change
+    session.flush()
+    pending = session.info.pop(_PENDING, None)
+    if pending is None:
+        return
+    dates, foods, touched = pending
+    dates |= _dates_for_foods(session, foods)
+    if dates:
+        refresh(session, dates)
+    bump_versions(session, dates | touched)
+    session.info[_COMMITTING] = dates | touched
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _notify(session: OrmSession) -> None:
+    changed = session.info.pop(_COMMITTING, None)
+    if changed:
+        for listener in _listeners:
+            listener(changed)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_pending(session: OrmSession) -> None:
+    session.info.pop(_PENDING, None)
+    session.info.pop(_COMMITTING, None)
+
+
+def on_change(listener: Callable[[Set[str]], None]) -> Callable[[Set[str]], None]:
+    """Register ``listener`` to be called with the days each commit changed."""
+    _listeners.append(listener)
+    return listener
+
+
+def bump_versions(session: OrmSession, dates: Iterable[str]) -> None:
+    """Give ``dates`` the next version number."""
+    dates = sorted(set(dates))
+    if not dates:
+        return
+    conn = session.connection()
+    version = conn.execute(select(func.max(_versions.c.version))).scalar() or 0
+    for chunk in _chunks(dates):
+        conn.execute(delete(_versions).where(_versions.c.date.in_(chunk)))
+        conn.execute(
+            insert(_versions), [{"date": d, "version": version + 1} for d in chunk]
+        )
+
+
+def etag(session: Session, start: str, end: str, variant: str = "") -> str:
+    """Weak ETag for a view of ``[start, end]``, read from ``dayversion`` only.
+
+    ``variant`` tells apart views of the same days (path, query string).
+    """
+    version = session.exec(
+        select(func.max(DayVersion.version)).where(
+            DayVersion.date >= start, DayVersion.date <= end
+        )
+    ).one()
+    return f'W/"{start}.{end}.{version or 0}.{zlib.crc32(variant.encode()):08x}"'
+
+
+def _scaled(per_100g, per_unit):
+    """SQL twin of :func:`server.utils.scaled_macros_from_food` for one macro."""
+    qty = func.coalesce(FoodEntry.quantity_g, 0)
+    return func.coalesce(
+        func.sum(
+            case(
+                (Food.unit_name.is_not(None), qty * func.coalesce(per_unit, 0)),
+                else_=qty * func.coalesce(per_100g, 0) / 100.0,
+            )
+        ),
+        0.0,
+    )
+
+
+# Sum of each macro per day in NUTRIENTS order; entries of foods no longer
+# cached count as zero, like everywhere else
+MACRO_SUMS = (
+    _scaled(Food.kcal_per_100g, Food.kcal_per_unit),
+    _scaled(Food.protein_g_per_100g, Food.protein_g_per_unit),
+    _scaled(Food.carb_g_per_100g, Food.carb_g_per_unit),
+    _scaled(Food.fat_g_per_100g, Food.fat_g_per_unit),
+)
+
+
+def refresh(session: OrmSession, dates: Iterable[str]) -> None:
+    """Recompute the rows of ``dates`` from their entries.
+
+    Macros are summed by one ``GROUP BY meal.date`` query. The remaining
+    nutrients only exist in packed vectors, so those are summed per day and
+    food, and only for foods logged by weight that have a vector.
+    Days without any entry (no meals, or only empty ones) lose their row;
+    history reports them as zero and averages skip them.
+    """
+    size = len(nutrient_vectors.NUTRIENTS)
+    conn = session.connection()
+    for chunk in _chunks(sorted(set(dates))):
+        totals: Dict[str, List[float]] = {
+            day: [*macros] + [0.0] * (size - len(macros))
+            for day, *macros in conn.execute(
+                select(Meal.date, *MACRO_SUMS)
+                .join(FoodEntry, FoodEntry.meal_id == Meal.id)
+                .outerjoin(Food, Food.fdc_id == FoodEntry.fdc_id)
+                .where(Meal.date.in_(chunk))
+                .group_by(Meal.date)
+            )
+        }
+        rows = conn.execute(
+            select(Meal.date, FoodNutrients.vector, func.sum(FoodEntry.quantity_g))
+            .join(FoodEntry, FoodEntry.meal_id == Meal.id)
+            .join(Food, Food.fdc_id == FoodEntry.fdc_id)
+            .join(FoodNutrients, FoodNutrients.fdc_id == Food.fdc_id)
+            .where(Meal.date.in_(chunk), Food.unit_name.is_(None))
+            .group_by(Meal.date, FoodEntry.fdc_id)
+        )
+        for day, vector, qty in rows:
+            acc = totals[day]
+            factor = (qty or 0) / 100.0
+            for i, v in enumerate(nutrient_vectors.unpack(vector)[4:], start=4):
+                acc[i] += v * factor
+        conn.execute(delete(_table).where(_table.c.date.in_(chunk)))
+        _drop_periods(conn, chunk)
+        if totals:
+            conn.execute(
+                insert(_table),
+                [
+                    dict(
+                        zip(nutrient_vectors.MACROS, vec),
+                        date=day,
+                        nutrients=nutrient_vectors.pack(vec),
+                    )
+                    for day, vec in totals.items()
+                ],
+            )
+
+
+def load(session: Session, start: str, end: str) -> Dict[str, List[float]]:
+    """Nutrient vectors of the logged days in ``[start, end]``.
+
+    Logged days without a row yet are computed and stored first.
+    """
+    missing = session.exec(
+        select(Meal.date)
+        .join(FoodEntry, FoodEntry.meal_id == Meal.id)
+        .outerjoin(DailyTotals, DailyTotals.date == Meal.date)
+        .where(Meal.date >= start, Meal.date <= end, DailyTotals.date.is_(None))
+        .distinct()
+    ).all()
+    if missing:
+        refresh(session, missing)
+        session.commit()
+    rows = session.exec(
+        select(DailyTotals.date, DailyTotals.nutrients).where(
+            DailyTotals.date >= start, DailyTotals.date <= end
+        )
+    )
+    return {day: nutrient_vectors.unpack(blob) for day, blob in rows}
+
+
+def period_bounds(day: date, granularity: str) -> Tuple[date, date]:
+    """First and last day of the ISO week or calendar month holding ``day``."""
+    if granularity == "week":
+        first = day - timedelta(days=day.weekday())
+        return first, first + timedelta(days=6)
+    first = day.replace(day=1)
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first, following - timedelta(days=1)
+
+
+def _drop_periods(conn, days: Iterable[str]) -> None:
+    for granularity in GRANULARITIES[1:]:
+        starts = {
+            period_bounds(date.fromisoformat(d), granularity)[0].isoformat()
+            for d in days
+        }
+        conn.execute(
+            delete(_periods).where(
+                _periods.c.granularity == granularity, _periods.c.start.in_(starts)
+            )
+        )
+
+
+class Period(NamedTuple):
+    start: date
+    end: date
+    logged_days: int
+    vector: List[float]
+
+
+def load_periods(
+    session: Session,
+    start: date,
+    end: date,
+    granularity: str,
+    today: Optional[date] = None,
+) -> List[Period]:
+    """Totals of each week or month overlapping ``[start, end]``, clipped to it.
+
+    Periods that lie wholly inside the range and ended before ``today`` are
+    read from (or saved to) ``periodtotals``; the rest are summed from
+    :func:`load`.
+    """
+    today = today or date.today()
+    buckets: List[Tuple[date, date, bool]] = []
+    cur = start
+    while cur <= end:
+        first, last = period_bounds(cur, granularity)
+        closed = first >= start and last <= end and last < today
+        buckets.append((max(first, start), min(last, end), closed))
+        cur = last + timedelta(days=1)
+    cached = {
+        row.start: row
+        for row in session.exec(
+            select(PeriodTotals).where(
+                PeriodTotals.granularity == granularity,
+                PeriodTotals.start.in_([b[0].isoformat() for b in buckets if b[2]]),
+            )
+        ).all()
+    }
+    todo = [b for b in buckets if b[0].isoformat() not in cached]
+    daily: Dict[str, List[float]] = {}
+    # Load runs of consecutive uncached periods with one query each
+    run_start = None
+    for i, (first, last, _) in enumerate(todo):
+        if run_start is None:
+            run_start = first
+        following = todo[i + 1][0] if i + 1 < len(todo) else None
+        if following != last + timedelta(days=1):
+            daily.update(load(session, run_start.isoformat(), last.isoformat()))
+            run_start = None
+    size = len(nutrient_vectors.NUTRIENTS)
+    sums: Dict[date, List[float]] = {}
+    logged: Dict[date, int] = {}
+    for day, vec in daily.items():
+        key = max(period_bounds(date.fromisoformat(day), granularity)[0], start)
+        acc = sums.setdefault(key, [0.0] * size)
+        for i in range(size):
+            acc[i] += vec[i]
+        logged[key] = logged.get(key, 0) + 1
+    out: List[Period] = []
+    for first, last, closed in buckets:
+        row = cached.get(first.isoformat())
+        if row is not None:
+            vector = nutrient_vectors.unpack(row.nutrients)
+            out.append(Period(first, last, row.logged_days, vector))
+            continue
+        period = Period(
+            first, last, logged.get(first, 0), sums.get(first, [0.0] * size)
+        )
+        out.append(period)
+        if closed:
+            session.merge(
+                PeriodTotals(
+                    granularity=granularity,
+                    start=first.isoformat(),
+                    end=last.isoformat(),
+                    logged_days=period.logged_days,
+                    nutrients=nutrient_vectors.pack(period.vector),
+                )
+            )
+    if session.new or session.dirty:
+        session.commit()
+    return out
+
+
+def rebuild(engine=None, batch_size: int = BATCH_SIZE) -> int:
+    """Regenerate every row from the log; return the number of days."""
+    count = 0
+    with Session(engine or db.get_engine()) as session:
+        # Days whose stale rows go away change too, so they get a new version
+        stale = set(session.exec(select(DailyTotals.date)).all())
+        session.exec(delete(DailyTotals))
+        session.exec(delete(PeriodTotals))
+        days = session.exec(
+            select(Meal.date)
+            .join(FoodEntry, FoodEntry.meal_id == Meal.id)
+            .distinct()
+            .order_by(Meal.date)
+        ).all()
+        stale.difference_update(days)
+        if stale:
+            bump_versions(session, stale)
+            session.info[_COMMITTING] = stale
+            session.commit()
+        for chunk in _chunks(days, batch_size):
+            refresh(session, chunk)
+            bump_versions(session, chunk)
+            session.info[_COMMITTING] = set(chunk)
+            session.commit()
+            count += len(chunk)
+            logger.info("Rebuilt totals for %s days", count)
+        session.commit()
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--batch-size", type=int, default=BATCH_SIZE, help="days per transaction"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    count = rebuild(batch_size=args.batch_size)
+    print(f"Rebuilt daily totals for {count} days")
+
+
+if __name__ == "__main__":
+    main()
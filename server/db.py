@@ -35,3 +35,7 @@ def get_engine():
 def get_session():
     with Session(get_engine()) as session:
         yield session
+
+
+# Registers the session hooks that keep DailyTotals in step with every commit
+from server import daily_totals  # noqa: E402,F401
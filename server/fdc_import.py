@@ -0,0 +1,281 @@
+"""Import a FoodData Central bulk download into the local ``fdcfood`` table.
+
+Both release formats published by USDA are supported:
+
+* the JSON release (``FoodData_Central_*_json_*.json``), a single object
+  wrapping one large array of foods, and
+* the CSV release, a directory containing ``food.csv``, ``nutrient.csv``,
+  ``food_nutrient.csv`` and optionally ``branded_food.csv``.
+
+Files are streamed and rows are written in large batches, so even the branded
+release can be imported without holding it in memory. Nutrients are computed
+with :func:`server.utils.extract_nutrients_from_fdc`, the same code used for
+foods fetched from the API, and kept with the household portions, so imported
+foods report fiber, sugar and sodium like fetched ones. The CSV release only
+provides the household serving of branded foods; ``food_portion.csv`` is not
+read. Rows imported by older versions carry macros only; run the import again
+to fill the rest::
+
+    python -m server.fdc_import path/to/download
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import logging
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import insert
+from sqlmodel import Session
+
+from server import nutrients
+from server.db import get_engine
+from server.models import FdcFood
+from server.portions import extract_portions_from_fdc
+from server.utils import _to_float, extract_nutrients_from_fdc
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+# SQLite caps bound parameters at 999 on older builds
+_LOOKUP_SIZE = 500
+_READ_SIZE = 1 << 20
+
+# Nutrients extract_nutrients_from_fdc can act on; everything else is skipped
+# while importing the CSV release.
+_TRACKED_NUMBERS = {
+    1001,
+    1003,
+    1004,
+    1005,
+    1008,
+    1051,
+    1056,
+    1057,
+    1079,
+    1082,
+    1093,
+    1293,
+    2000,
+    2001,
+}
+_TRACKED_KEYWORDS = (
+    "protein",
+    "fat",
+    "carbohydrate",
+    "energy",
+    "sugar",
+    "starch",
+    "fiber",
+    "water",
+    "ash",
+    "alcohol",
+    "sodium",
+)
+
+
+def _iter_json_foods(fp: IO[str]) -> Iterator[dict]:
+    """Yield the foods of a JSON release one object at a time.
+
+    The release wraps a single array (``{"FoundationFoods": [...]}``); elements
+    of that array are decoded incrementally as the file is read. Decoding moves
+    an offset through the buffer and consumed text is only dropped when it is
+    refilled, so yielding a food never copies the rest of the buffer.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    while "[" not in buf:
+        chunk = fp.read(_READ_SIZE)
+        if not chunk:
+            return
+        buf += chunk
+    idx = buf.index("[") + 1
+    size = len(buf)
+    while True:
+        while idx < size and buf[idx] in " \t\r\n,":
+            idx += 1
+        if idx < size and buf[idx] == "]":
+            return
+        try:
+            obj, idx = decoder.raw_decode(buf, idx)
+        except json.JSONDecodeError:
+            chunk = fp.read(_READ_SIZE)
+            if not chunk:
+                raise
+            buf = buf[idx:] + chunk
+            idx, size = 0, len(buf)
+            continue
+        yield obj
+
+
+def _row_from_fdc(data: dict) -> Optional[dict]:
+    fdc_id = data.get("fdcId")
+    if fdc_id is None:
+        return None
+    vector = extract_nutrients_from_fdc(data)
+    portions = extract_portions_from_fdc(data)
+    return {
+        "fdc_id": int(fdc_id),
+        "description": data.get("description") or f"FDC {fdc_id}",
+        "brand_owner": data.get("brandOwner"),
+        "data_type": data.get("dataType"),
+        "kcal_per_100g": vector[0],
+        "protein_g_per_100g": vector[1],
+        "carb_g_per_100g": vector[2],
+        "fat_g_per_100g": vector[3],
+        "nutrients": nutrients.pack(vector),
+        "portions": json.dumps(portions) if portions else None,
+    }
+
+
+def _write_batches(session: Session, rows: Iterable[Optional[dict]]) -> int:
+    stmt = insert(FdcFood).prefix_with("OR REPLACE")
+    batch: List[dict] = []
+    count = 0
+    for row in rows:
+        if row is None:
+            continue
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            session.exec(stmt, params=batch)
+            session.commit()
+            count += len(batch)
+            logger.info("Imported %s foods", count)
+            batch = []
+    if batch:
+        session.exec(stmt, params=batch)
+        session.commit()
+        count += len(batch)
+    return count
+
+
+def _is_tracked_nutrient(number: str, nutrient_id: str, name: str) -> bool:
+    for raw in (number, nutrient_id):
+        try:
+            if int(float(raw)) in _TRACKED_NUMBERS:
+                return True
+        except (TypeError, ValueError):
+            pass
+    name = name.lower()
+    return any(k in name for k in _TRACKED_KEYWORDS)
+
+
+def _iter_csv_foods(folder: Path) -> Iterator[dict]:
+    """Yield FDC-shaped food dicts assembled from a CSV release.
+
+    ``food_nutrient.csv`` is not guaranteed to be grouped by food, so relevant
+    nutrient rows are first staged in a throwaway SQLite file and looked up per
+    batch of foods while ``food.csv`` is streamed.
+    """
+    nutrients: Dict[str, dict] = {}
+    with open(folder / "nutrient.csv", newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            if _is_tracked_nutrient(r.get("nutrient_nbr"), r["id"], r.get("name", "")):
+                nutrients[r["id"]] = {
+                    "id": int(r["id"]),
+                    "number": r.get("nutrient_nbr"),
+                    "name": r.get("name"),
+                }
+    # fdc_id -> (brand owner, serving size, its unit, household serving)
+    brands: Dict[str, tuple] = {}
+    branded = folder / "branded_food.csv"
+    if branded.exists():
+        with open(branded, newline="", encoding="utf-8") as f:
+            for r in csv.DictReader(f):
+                brands[r["fdc_id"]] = (
+                    r.get("brand_owner") or None,
+                    r.get("serving_size") or None,
+                    r.get("serving_size_unit") or None,
+                    r.get("household_serving_fulltext") or None,
+                )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stage = sqlite3.connect(str(Path(tmp) / "stage.db"))
+        try:
+            yield from _stream_staged_foods(stage, folder, nutrients, brands)
+        finally:
+            stage.close()
+
+
+def _stream_staged_foods(
+    stage: sqlite3.Connection,
+    folder: Path,
+    nutrients: Dict[str, dict],
+    brands: Dict[str, tuple],
+) -> Iterator[dict]:
+    stage.execute("CREATE TABLE nutrient (fdc_id INTEGER, nutrient_id TEXT, amount)")
+    with open(folder / "food_nutrient.csv", newline="", encoding="utf-8") as f:
+        rows = (
+            (int(r["fdc_id"]), r["nutrient_id"], r["amount"])
+            for r in csv.DictReader(f)
+            if r["nutrient_id"] in nutrients
+        )
+        stage.executemany("INSERT INTO nutrient VALUES (?, ?, ?)", rows)
+    stage.execute("CREATE INDEX ix_nutrient_fdc_id ON nutrient (fdc_id)")
+    stage.commit()
+
+    def assemble(foods: List[dict]) -> Iterator[dict]:
+        by_id: Dict[int, list] = {int(r["fdc_id"]): [] for r in foods}
+        rows = stage.execute(
+            "SELECT fdc_id, nutrient_id, amount FROM nutrient "
+            f"WHERE fdc_id IN ({','.join('?' * len(by_id))})",
+            list(by_id),
+        )
+        for fdc_id, nutrient_id, amount in rows:
+            by_id[fdc_id].append(
+                {"nutrient": nutrients[nutrient_id], "amount": _to_float(amount)}
+            )
+        for r in foods:
+            owner, serving, unit, household = brands.get(r["fdc_id"], (None,) * 4)
+            yield {
+                "fdcId": int(r["fdc_id"]),
+                "description": r.get("description"),
+                "dataType": r.get("data_type"),
+                "brandOwner": owner,
+                "servingSize": serving,
+                "servingSizeUnit": unit,
+                "householdServingFullText": household,
+                "foodNutrients": by_id[int(r["fdc_id"])],
+            }
+
+    with open(folder / "food.csv", newline="", encoding="utf-8") as f:
+        pending: List[dict] = []
+        for r in csv.DictReader(f):
+            pending.append(r)
+            if len(pending) >= _LOOKUP_SIZE:
+                yield from assemble(pending)
+                pending = []
+        if pending:
+            yield from assemble(pending)
+
+
+def import_fdc(path: str | Path, engine=None) -> int:
+    """Import a JSON file or CSV directory release and return the food count."""
+    path = Path(path)
+    with Session(engine or get_engine()) as session:
+        if path.is_dir():
+            foods = _iter_csv_foods(path)
+            return _write_batches(session, (_row_from_fdc(d) for d in foods))
+        with open(path, encoding="utf-8") as fp:
+            foods = _iter_json_foods(fp)
+            return _write_batches(session, (_row_from_fdc(d) for d in foods))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "path", help="FoodData Central JSON file or extracted CSV directory"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    count = import_fdc(args.path)
+    print(f"Imported {count} foods from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, UniqueConstraint
+from sqlalchemy import Boolean, Index, UniqueConstraint
 from sqlmodel import Column, Field, SQLModel
 
 
@@ -40,12 +40,16 @@ class Meal(SQLModel, table=True):
 class FoodEntry(SQLModel, table=True):
     __table_args__ = (
         UniqueConstraint("meal_id", "sort_order", name="uq_entry_meal_order"),
+        # Covers date-range aggregates: meal.date -> entries without row lookups
+        Index("ix_foodentry_meal_food", "meal_id", "fdc_id", "quantity_g"),
     )
     id: Optional[int] = Field(default=None, primary_key=True)
     meal_id: int = Field(foreign_key="meal.id")
-    fdc_id: int = Field(foreign_key="food.fdc_id")
+    fdc_id: int = Field(foreign_key="food.fdc_id", index=True)
     quantity_g: float
     sort_order: int = Field(index=True)
+    # Household measure the entry was logged in; quantity_g stays authoritative
+    portion_id: Optional[int] = None
 
 
 class Favorite(SQLModel, table=True):
@@ -74,3 +78,77 @@ class BodyWeight(SQLModel, table=True):
 class WaterIntake(SQLModel, table=True):
     date: str = Field(primary_key=True)
     milliliters: float
+
+
+# Local copy of a FoodData Central bulk download, see server/fdc_import.py
+class FdcFood(SQLModel, table=True):
+    fdc_id: int = Field(primary_key=True)
+    description: str = Field(index=True)
+    brand_owner: Optional[str] = None
+    data_type: Optional[str] = None
+    kcal_per_100g: float
+    protein_g_per_100g: float
+    fat_g_per_100g: float
+    carb_g_per_100g: float
+    # Packed nutrient vector, see server/nutrients.py
+    nutrients: Optional[bytes] = None
+    # JSON list of portions as returned by portions.extract_portions_from_fdc
+    portions: Optional[str] = None
+
+
+# Raw FDC detail payloads, zlib-compressed JSON, see server/reextract.py
+class FoodPayload(SQLModel, table=True):
+    fdc_id: int = Field(primary_key=True)
+    fetched_at: datetime = Field(primary_key=True)
+    data: bytes
+
+
+# fdc_ids USDA answered 404 for, so they are not requested again until
+# server.utils.MISSING_TTL has passed
+class MissingFood(SQLModel, table=True):
+    fdc_id: int = Field(primary_key=True)
+    checked_at: datetime
+
+
+# Per-100g nutrient vector, packed by server.nutrients.pack in NUTRIENTS order
+class FoodNutrients(SQLModel, table=True):
+    fdc_id: int = Field(primary_key=True)
+    vector: bytes
+
+
+# Household measures from FDC foodPortions, see server/portions.py
+class FoodPortion(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("fdc_id", "name", name="uq_portion_name"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    fdc_id: int = Field(index=True)
+    name: str
+    amount: float = 1.0
+    gram_weight: float
+
+
+# Per-day totals kept current by server/daily_totals.py; macros are mirrored
+# from ``nutrients`` (a server.nutrients vector) so they can be queried in SQL
+class DailyTotals(SQLModel, table=True):
+    date: str = Field(primary_key=True)
+    kcal: float = 0.0
+    protein: float = 0.0
+    carb: float = 0.0
+    fat: float = 0.0
+    nutrients: bytes
+
+
+# Cached sums of dailytotals over closed weeks and months; rows are dropped
+# whenever a day inside them is recomputed
+class PeriodTotals(SQLModel, table=True):
+    granularity: str = Field(primary_key=True)
+    start: str = Field(primary_key=True)
+    end: str
+    logged_days: int = 0
+    nutrients: bytes
+
+
+# Bumped by server/daily_totals.py whenever anything shown for the day changes;
+# values come from one increasing sequence so a range's max is its version
+class DayVersion(SQLModel, table=True):
+    date: str = Field(primary_key=True)
+    version: int
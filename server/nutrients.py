@@ -0,0 +1,93 @@
+"""Fixed-order nutrient vectors stored per food in ``foodnutrients``.
+
+Each USDA food keeps every tracked nutrient per 100 g as a packed array of
+doubles in :data:`NUTRIENTS` order. Aggregations load the vectors for all
+foods of a query at once and sum any subset of nutrients in a single pass.
+Foods without a stored vector (custom foods, or rows cached or imported before
+vectors were kept) fall back to their ``Food`` macro columns with zeros for the
+rest.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from server.models import Food, FoodNutrients
+
+# Append only: stored vectors are read positionally
+NUTRIENTS = ("kcal", "protein", "carb", "fat", "fiber", "sugar", "sodium")
+INDEX = {name: i for i, name in enumerate(NUTRIENTS)}
+MACROS = NUTRIENTS[:4]
+
+
+def pack(values: Sequence[float]) -> bytes:
+    return array("d", values).tobytes()
+
+
+def unpack(blob: bytes) -> List[float]:
+    values = array("d")
+    values.frombytes(blob)
+    out = values.tolist()[: len(NUTRIENTS)]
+    return out + [0.0] * (len(NUTRIENTS) - len(out))
+
+
+def parse_nutrients(raw: Optional[str]) -> List[str]:
+    """Validate a comma-separated ``nutrients`` query parameter.
+
+    Returns the requested nutrients beyond the macros, which every
+    aggregation reports anyway.
+    """
+    if not raw:
+        return []
+    names = [n.strip().lower() for n in raw.split(",") if n.strip()]
+    unknown = [n for n in names if n not in INDEX]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown nutrients {unknown}; tracked: {', '.join(NUTRIENTS)}",
+        )
+    return [n for n in dict.fromkeys(names) if n not in MACROS]
+
+
+def load_vectors(session: Session, fdc_ids: Iterable[int]) -> Dict[int, List[float]]:
+    ids = set(fdc_ids)
+    if not ids:
+        return {}
+    rows = session.exec(
+        select(FoodNutrients).where(FoodNutrients.fdc_id.in_(ids))
+    ).all()
+    return {r.fdc_id: unpack(r.vector) for r in rows}
+
+
+def food_vector(food: Food, stored: Optional[List[float]]) -> List[float]:
+    """Nutrients per 100 g, or per unit for foods logged by unit.
+
+    The macro columns on ``Food`` always win so edits to custom foods apply.
+    """
+    if food.unit_name:
+        macros = [
+            food.kcal_per_unit,
+            food.protein_g_per_unit,
+            food.carb_g_per_unit,
+            food.fat_g_per_unit,
+        ]
+        rest = [0.0] * (len(NUTRIENTS) - 4)
+    else:
+        macros = [
+            food.kcal_per_100g,
+            food.protein_g_per_100g,
+            food.carb_g_per_100g,
+            food.fat_g_per_100g,
+        ]
+        rest = stored[4:] if stored else [0.0] * (len(NUTRIENTS) - 4)
+    return [m or 0.0 for m in macros] + list(rest)
+
+
+def scaled(food: Food, stored: Optional[List[float]], qty: float) -> List[float]:
+    """Nutrient vector for ``qty`` grams (or units) of ``food``."""
+    factor = (qty or 0) if food.unit_name else (qty or 0) / 100.0
+    return [v * factor for v in food_vector(food, stored)]
@@ -0,0 +1,122 @@
+"""Household measures (cup, slice, tbsp...) cached per food in ``foodportion``.
+
+Portions are taken from the ``foodPortions`` of FDC payloads, or from the
+household serving of branded foods, whenever a payload (or a food from the
+offline import, see :mod:`server.fdc_import`) is applied. Entries can
+then be logged as "2 slices" and converted to grams locally.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from server.models import Food, FoodPayload, FoodPortion
+
+_GRAM_UNITS = {"g", "grm", "gram", "grams"}
+
+
+def _portion_name(portion: dict) -> str:
+    desc = str(portion.get("portionDescription") or "").strip()
+    if desc and desc.lower() != "quantity not specified":
+        return desc
+    unit = str((portion.get("measureUnit") or {}).get("name") or "").strip()
+    if unit.lower() == "undetermined":
+        unit = ""
+    modifier = str(portion.get("modifier") or "").strip()
+    # Survey foods carry numeric modifier codes rather than words
+    parts = [p for p in (unit, modifier) if p and not p.isdigit()]
+    return ", ".join(parts)
+
+
+def extract_portions_from_fdc(data: dict) -> List[dict]:
+    """Return ``{"name", "amount", "gram_weight"}`` for each usable portion."""
+    out: dict[str, dict] = {}
+    for p in data.get("foodPortions") or []:
+        if not isinstance(p, dict):
+            continue
+        name = _portion_name(p)
+        try:
+            grams = float(p.get("gramWeight") or 0)
+            amount = float(p.get("amount") or 1)
+        except (TypeError, ValueError):
+            continue
+        if p.get("portionDescription") and name == p["portionDescription"].strip():
+            amount = 1.0
+        if name and grams > 0 and amount > 0:
+            out.setdefault(name, {"name": name, "amount": amount, "gram_weight": grams})
+    household = str(data.get("householdServingFullText") or "").strip()
+    unit = str(data.get("servingSizeUnit") or "").strip().lower()
+    try:
+        serving = float(data.get("servingSize") or 0)
+    except (TypeError, ValueError):
+        serving = 0.0
+    if household and unit in _GRAM_UNITS and serving > 0:
+        out.setdefault(
+            household, {"name": household, "amount": 1.0, "gram_weight": serving}
+        )
+    return list(out.values())
+
+
+def store_portions(session: Session, fdc_id: int, food_json: dict) -> None:
+    """Upsert the payload's portions by name."""
+    save_portions(session, fdc_id, extract_portions_from_fdc(food_json))
+
+
+def save_portions(session: Session, fdc_id: int, items: List[dict]) -> None:
+    """Upsert portions shaped like :func:`extract_portions_from_fdc` output.
+
+    Rows are never deleted, so ``FoodEntry.portion_id`` stays valid.
+    """
+    existing = {
+        p.name: p
+        for p in session.exec(
+            select(FoodPortion).where(FoodPortion.fdc_id == fdc_id)
+        ).all()
+    }
+    for item in items:
+        row = existing.get(item["name"]) or FoodPortion(fdc_id=fdc_id, **item)
+        row.amount = item["amount"]
+        row.gram_weight = item["gram_weight"]
+        session.add(row)
+
+
+def get_portions(session: Session, fdc_id: int) -> List[FoodPortion]:
+    """Portions of a cached food, extracted from its stored payload if needed."""
+    stmt = select(FoodPortion).where(FoodPortion.fdc_id == fdc_id)
+    rows = session.exec(stmt.order_by(FoodPortion.id)).all()
+    if rows or fdc_id < 0:
+        return rows
+    payload = session.exec(
+        select(FoodPayload)
+        .where(FoodPayload.fdc_id == fdc_id)
+        .order_by(FoodPayload.fetched_at.desc())
+        .limit(1)
+    ).first()
+    if payload is None:
+        return []
+    from server.utils import unpack_payload
+
+    store_portions(session, fdc_id, unpack_payload(payload.data))
+    session.commit()
+    return session.exec(stmt.order_by(FoodPortion.id)).all()
+
+
+def portion_grams(
+    session: Session, food: Food, portion_id: int, count: Optional[float]
+) -> float:
+    """Convert ``count`` of a portion of ``food`` to grams."""
+    portion = session.get(FoodPortion, portion_id)
+    if portion is None or portion.fdc_id != food.fdc_id:
+        raise HTTPException(status_code=404, detail="Portion not found for this food")
+    if food.unit_name:
+        raise HTTPException(
+            status_code=400, detail="Food is logged per unit, not by portion"
+        )
+    return (1.0 if count is None else count) * portion.gram_weight / portion.amount
+
+
+def portion_count(portion: FoodPortion, grams: float) -> float:
+    return round(grams * portion.amount / portion.gram_weight, 3)
@@ -0,0 +1,89 @@
+"""Recompute cached food macros from stored USDA payloads.
+
+The latest FDC detail responses of each food (see
+:data:`server.utils.PAYLOAD_HISTORY`) are kept zlib-compressed in
+``foodpayload``. After changing :func:`server.utils.extract_macros_from_fdc`, run::
+
+    python -m server.reextract
+
+to re-apply the latest payload of each food in batches, without any USDA
+requests. This also (re)builds the ``foodnutrients`` vectors. Foods refreshed
+from another source (e.g. the offline import) since their last payload are
+left alone.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from server.db import get_engine
+from server.models import Food, FoodPayload
+from server.utils import _apply_fdc_payload, unpack_payload
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def reextract(engine=None, batch_size: int = BATCH_SIZE) -> int:
+    """Re-apply the newest stored payload of every food; return foods updated."""
+    latest = (
+        select(FoodPayload.fdc_id, func.max(FoodPayload.fetched_at).label("fetched_at"))
+        .group_by(FoodPayload.fdc_id)
+        .subquery()
+    )
+    count = 0
+    last_id: Optional[int] = None
+    with Session(engine or get_engine()) as session:
+        while True:
+            stmt = (
+                select(FoodPayload, Food)
+                .join(
+                    latest,
+                    (latest.c.fdc_id == FoodPayload.fdc_id)
+                    & (latest.c.fetched_at == FoodPayload.fetched_at),
+                )
+                .join(Food, Food.fdc_id == FoodPayload.fdc_id)
+                .order_by(FoodPayload.fdc_id)
+                .limit(batch_size)
+            )
+            if last_id is not None:
+                stmt = stmt.where(FoodPayload.fdc_id > last_id)
+            rows: List = session.exec(stmt).all()
+            if not rows:
+                break
+            todo = [
+                (payload, food)
+                for payload, food in rows
+                if not (food.fetched_at and food.fetched_at > payload.fetched_at)
+            ]
+            for payload, food in todo:
+                food_json = unpack_payload(payload.data)
+                _apply_fdc_payload(session, food, food_json, payload.fetched_at)
+                session.add(food)
+            count += len(todo)
+            last_id = rows[-1][0].fdc_id
+            session.commit()
+            session.expunge_all()
+            logger.info("Re-extracted %s foods", count)
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--batch-size", type=int, default=BATCH_SIZE, help="foods per transaction"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    count = reextract(batch_size=args.batch_size)
+    print(f"Re-extracted {count} foods")
+
+
+if __name__ == "__main__":
+    main()
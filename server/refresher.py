@@ -0,0 +1,150 @@
+"""Background refresh of cached ``Food`` rows.
+
+While the refresher runs, :func:`server.utils.ensure_food_cached` and
+:func:`server.utils.ensure_foods_cached` serve stale rows immediately and hand
+their ids to :meth:`FoodRefresher.schedule`. A small pool of workers re-fetches
+queued foods in USDA-sized batches, and a sweep at startup and then every
+``sweep_interval`` queues foods that are about to expire so requests rarely see
+a stale row at all. Search prefetch uses the same queue to cache foods that are
+not stored yet. Workers run under :func:`server.usda.low_priority`, so they
+never eat into the interactive share of the USDA quota.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Set
+
+from sqlmodel import Session, or_, select
+
+from server import usda, utils
+from server.db import get_engine
+from server.models import Food
+
+logger = logging.getLogger(__name__)
+
+
+class FoodRefresher:
+    def __init__(
+        self,
+        workers: int = 2,
+        sweep_interval: float = 6 * 3600,
+        refresh_ahead: timedelta = timedelta(days=3),
+        sweep_limit: int = 200,
+    ) -> None:
+        self.workers = workers
+        self.sweep_interval = sweep_interval
+        self.refresh_ahead = refresh_ahead
+        self.sweep_limit = sweep_limit
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def max_age(self) -> timedelta:
+        """Age after which the refresher re-fetches a food."""
+        return utils.CACHE_TTL - self.refresh_ahead
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._queued.clear()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep_loop()))
+        utils.stale_refresher = self
+
+    async def stop(self) -> None:
+        if utils.stale_refresher is self:
+            utils.stale_refresher = None
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queue = None
+        self._queued.clear()
+
+    def schedule(self, fdc_ids: Iterable[int]) -> bool:
+        """Queue foods for refresh; False if they must be fetched inline."""
+        if not self.running or self._queue is None:
+            return False
+        try:
+            if asyncio.get_running_loop() is not self._loop:
+                return False
+        except RuntimeError:
+            return False
+        for fdc_id in fdc_ids:
+            if fdc_id >= 0 and fdc_id not in self._queued:
+                self._queued.add(fdc_id)
+                self._queue.put_nowait(fdc_id)
+        return True
+
+    def sweep(self) -> int:
+        """Queue the foods closest to expiry and return how many were queued."""
+        if utils.USDA_OFFLINE or not utils.USDA_KEY:
+            return 0
+        cutoff = datetime.utcnow() - self.max_age
+        with Session(get_engine()) as session:
+            ids = session.exec(
+                select(Food.fdc_id)
+                .where(
+                    Food.fdc_id >= 0,
+                    Food.archived == False,
+                    or_(Food.fetched_at.is_(None), Food.fetched_at < cutoff),
+                )
+                .order_by(Food.fetched_at)
+                .limit(self.sweep_limit)
+            ).all()
+        before = len(self._queued)
+        self.schedule(ids)
+        return len(self._queued) - before
+
+    async def drain(self) -> None:
+        """Wait until every queued food has been processed."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < utils.USDA_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                with Session(get_engine()) as session, usda.low_priority():
+                    await utils.ensure_foods_cached(
+                        batch, session, max_age=self.max_age, defer_stale=False
+                    )
+            except Exception as exc:
+                logger.warning("Background refresh of %s failed: %s", batch, exc)
+            finally:
+                self._queued.difference_update(batch)
+                for _ in batch:
+                    queue.task_done()
+
+    async def _sweep_loop(self) -> None:
+        # Sweep right away: sessions are often much shorter than the interval
+        while True:
+            try:
+                queued = self.sweep()
+                if queued:
+                    logger.info("Queued %s foods for background refresh", queued)
+            except Exception:
+                logger.exception("Food refresh sweep failed")
+            await asyncio.sleep(self.sweep_interval)
+
+
+food_refresher = FoodRefresher(
+    workers=int(os.getenv("FOOD_REFRESH_WORKERS", "2")),
+    sweep_interval=float(os.getenv("FOOD_REFRESH_SWEEP_SECONDS", str(6 * 3600))),
+)
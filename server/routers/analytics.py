@@ -0,0 +1,147 @@
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from server import daily_totals
+from server import nutrients as nutrient_vectors
+from server import trends
+from server.db import get_session
+from server.models import Food, FoodEntry, Meal
+from server.utils import not_modified
+
+router = APIRouter()
+
+MAX_WINDOW = 365
+# Bounds of /api/analytics/trends: days per request, and how far past today
+MAX_TREND_DAYS = 3 * 366
+MAX_DAYS_AHEAD = 31
+
+
+def _parse_windows(raw: str):
+    try:
+        windows = tuple(sorted({int(w) for w in raw.split(",") if w.strip()}))
+    except ValueError:
+        windows = ()
+    if not windows or not all(1 <= w <= MAX_WINDOW for w in windows):
+        raise HTTPException(
+            status_code=400,
+            detail=f"windows must be comma-separated day counts from 1 to {MAX_WINDOW}",
+        )
+    return windows
+
+
+def _check_trend_range(start: date, end: date) -> None:
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+    if (end - start).days >= MAX_TREND_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Ranges are limited to {MAX_TREND_DAYS} days"
+        )
+    if end > date.today() + timedelta(days=MAX_DAYS_AHEAD):
+        raise HTTPException(
+            status_code=400,
+            detail=f"end_date may be at most {MAX_DAYS_AHEAD} days after today",
+        )
+
+
+@router.get("/api/analytics/trends")
+def get_trends(
+    start_date: date,
+    end_date: date,
+    request: Request,
+    response: Response,
+    windows: str = Query("7,30", description="Rolling window sizes in days"),
+    alpha: float = Query(
+        0.1, gt=0, le=1, description="Smoothing factor of the weight trend"
+    ),
+    nutrients: Optional[str] = Query(
+        None, description="Extra nutrients to average, comma-separated"
+    ),
+    session: Session = Depends(get_session),
+):
+    _check_trend_range(start_date, end_date)
+    sizes = _parse_windows(windows)
+    keys = [*nutrient_vectors.MACROS, *nutrient_vectors.parse_nutrients(nutrients)]
+    variant = f"{request.url.path}?{request.url.query}"
+    # The weight trend carries every earlier weigh-in, so any day up to the end counts
+    tag = daily_totals.etag(session, "", end_date.isoformat(), variant)
+    if cached := not_modified(request, response, tag):
+        return cached
+    return trends.load(session, start_date, end_date, sizes, alpha, keys)
+
+
+@router.get("/api/analytics/top_foods")
+def get_top_foods(
+    start_date: date,
+    end_date: date,
+    request: Request,
+    response: Response,
+    metric: str = Query("kcal", description="kcal, protein, carb or fat"),
+    limit: int = Query(10, ge=1, le=100),
+    session: Session = Depends(get_session),
+):
+    """Foods ranked by their contribution to ``metric`` over the range.
+
+    Totals, shares and counts are aggregated in SQL; only the top rows are
+    returned to Python.
+    """
+    if metric not in nutrient_vectors.MACROS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"metric must be one of {', '.join(nutrient_vectors.MACROS)}",
+        )
+    start, end = start_date.isoformat(), end_date.isoformat()
+    variant = f"{request.url.path}?{request.url.query}"
+    tag = daily_totals.etag(session, start, end, variant)
+    if cached := not_modified(request, response, tag):
+        return cached
+    in_range = (Meal.date >= start, Meal.date <= end)
+    total = daily_totals.MACRO_SUMS[nutrient_vectors.INDEX[metric]]
+    rows = session.exec(
+        select(
+            FoodEntry.fdc_id,
+            Food.description,
+            total.label("total"),
+            func.sum(total).over().label("grand_total"),
+            func.count(FoodEntry.id).label("entries"),
+            func.count(func.distinct(Meal.date)).label("days"),
+            func.sum(FoodEntry.quantity_g).label("quantity"),
+            Food.unit_name,
+        )
+        .join(Meal, Meal.id == FoodEntry.meal_id)
+        .outerjoin(Food, Food.fdc_id == FoodEntry.fdc_id)
+        .where(*in_range)
+        .group_by(FoodEntry.fdc_id)
+        .order_by(total.desc(), FoodEntry.fdc_id)
+        .limit(limit)
+    ).all()
+    logged_days = session.exec(
+        select(func.count(func.distinct(Meal.date)))
+        .join(FoodEntry, FoodEntry.meal_id == Meal.id)
+        .where(*in_range)
+    ).one()
+    grand_total = rows[0].grand_total if rows else 0.0
+    return {
+        "start": start,
+        "end": end,
+        "metric": metric,
+        "total": round(grand_total, 2),
+        "logged_days": logged_days,
+        "foods": [
+            {
+                "fdc_id": r.fdc_id,
+                "description": r.description,
+                "total": round(r.total, 2),
+                "share": round(r.total / grand_total, 4) if grand_total else 0.0,
+                "entries": r.entries,
+                "days": r.days,
+                "frequency": round(r.days / logged_days, 4) if logged_days else 0.0,
+                "quantity": round(r.quantity or 0, 2),
+                "unit_name": r.unit_name,
+            }
+            for r in rows
+        ],
+    }
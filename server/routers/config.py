@@ -3,7 +3,7 @@ import os
 from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel
 
-from server import utils
+from server import usda, utils
 
 router = APIRouter()
 
@@ -29,3 +29,12 @@ def set_usda_key(payload: KeyPayload, _: None = Depends(require_config_token)):
         raise HTTPException(status_code=400, detail="Key required")
     utils.update_usda_key(payload.key)
     return {"ok": True}
+
+
+@router.get("/api/config/usda-status")
+def get_usda_status():
+    return {
+        "offline": utils.USDA_OFFLINE,
+        "breaker": utils.usda_breaker.snapshot(),
+        "rate_limit": usda.limiter.snapshot(),
+    }
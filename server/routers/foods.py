@@ -1,17 +1,21 @@
+import asyncio
 import logging
+import os
 import time
 from typing import List, Optional
 from uuid import uuid4
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 from sqlalchemy import func
-from sqlmodel import Session, delete, select
+from sqlmodel import Session, select
 
-from server import utils
+from server import portions, search_index, usda, utils
+from server.cache import TTLCache
 from server.db import get_session
-from server.models import Favorite, Food, FoodEntry
+from server.models import Favorite, FdcFood, Food, FoodEntry, FoodPortion
+from server.suggest import suggest_index
 
 logger = logging.getLogger(__name__)
 
@@ -22,10 +26,27 @@ ensure_food_cached = utils.ensure_food_cached
 router = APIRouter()
 
 
-@router.get("/api/foods/search")
-async def foods_search(q: str, dataType: Optional[str] = None):
-    if not utils.USDA_KEY:
-        raise HTTPException(status_code=503, detail="USDA_KEY not set")
+# Search results are served from memory for SEARCH_CACHE_TTL seconds, then
+# served stale for up to a day while a background refresh replaces them.
+search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "600")),
+    stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_TTL", "86400")),
+)
+_search_refreshes: dict[tuple, asyncio.Task] = {}
+# Upper bound for the opt-in ``prefetch`` parameter of /api/foods/search
+SEARCH_PREFETCH_MAX = 10
+
+
+def _search_cache_key(q: str, dataType: Optional[str]) -> tuple:
+    types: tuple = ()
+    if dataType and dataType.lower() != "all":
+        types = tuple(sorted({s.strip().lower() for s in dataType.split(",")} - {""}))
+    return " ".join(q.lower().split()), types
+
+
+@utils.with_breaker
+async def _usda_search(q: str, dataType: Optional[str]) -> dict:
     params: dict = {
         "api_key": utils.USDA_KEY,
         "query": q,
@@ -35,10 +56,9 @@ async def foods_search(q: str, dataType: Optional[str] = None):
     if dataType and dataType.lower() != "all":
         params["dataType"] = [s.strip() for s in dataType.split(",") if s.strip()]
     try:
-        async with httpx.AsyncClient(timeout=12.0) as client:
-            r = await client.get(f"{USDA_BASE}/foods/search", params=params)
-            r.raise_for_status()
-            data = r.json()
+        r = await usda.get(f"{USDA_BASE}/foods/search", params=params, timeout=12.0)
+        r.raise_for_status()
+        data = r.json()
     except httpx.HTTPStatusError as e:
         raise HTTPException(
             status_code=e.response.status_code,
@@ -59,9 +79,121 @@ async def foods_search(q: str, dataType: Optional[str] = None):
     }
 
 
+async def _refresh_search(key: tuple, q: str, dataType: Optional[str]) -> None:
+    try:
+        search_cache.set(key, await _usda_search(q, dataType))
+    except HTTPException as exc:
+        logger.warning("Background search refresh for %r failed: %s", q, exc.detail)
+    finally:
+        _search_refreshes.pop(key, None)
+
+
+def _local_search(session: Session, q: str, dataType: Optional[str]) -> Optional[dict]:
+    """Search the imported FoodData Central copy, or None if nothing is imported."""
+    if session.exec(select(FdcFood.fdc_id).limit(1)).first() is None:
+        return None
+    stmt = select(FdcFood)
+    for word in q.split():
+        stmt = stmt.where(FdcFood.description.ilike(f"%{word}%"))
+    if dataType and dataType.lower() != "all":
+        types = [s.strip().lower() for s in dataType.split(",") if s.strip()]
+        stmt = stmt.where(func.lower(FdcFood.data_type).in_(types))
+    rows = session.exec(
+        stmt.order_by(func.length(FdcFood.description), FdcFood.description).limit(50)
+    ).all()
+    return {
+        "results": [
+            {
+                "fdcId": f.fdc_id,
+                "description": f.description,
+                "brandOwner": f.brand_owner,
+                "dataType": f.data_type,
+            }
+            for f in rows
+        ]
+    }
+
+
+def _prefetch_details(session: Session, result: dict, count: int) -> None:
+    """Queue the top ``count`` uncached hits for a low-priority background fetch."""
+    refresher = utils.stale_refresher
+    if refresher is None:
+        return
+    ids = [
+        r["fdcId"]
+        for r in result.get("results", [])[:count]
+        if isinstance(r.get("fdcId"), int)
+    ]
+    if not ids:
+        return
+    cached = set(session.exec(select(Food.fdc_id).where(Food.fdc_id.in_(ids))).all())
+    skip = cached.union(utils.known_missing(session, ids))
+    refresher.schedule(i for i in ids if i not in skip)
+
+
+@router.get("/api/foods/search")
+async def foods_search(
+    q: str,
+    dataType: Optional[str] = None,
+    prefetch: int = Query(0, ge=0, le=SEARCH_PREFETCH_MAX),
+    session: Session = Depends(get_session),
+):
+    """Search USDA; ``prefetch=N`` warms the food cache for the top N hits."""
+    if utils.USDA_OFFLINE:
+        return _local_search(session, q, dataType) or {"results": []}
+    if not utils.USDA_KEY:
+        local = _local_search(session, q, dataType)
+        if local is not None:
+            return local
+        raise HTTPException(status_code=503, detail="USDA_KEY not set")
+    key = _search_cache_key(q, dataType)
+    cached = search_cache.get(key)
+    if cached is not None:
+        result, stale = cached
+        if stale and key not in _search_refreshes:
+            _search_refreshes[key] = asyncio.create_task(
+                _refresh_search(key, q, dataType)
+            )
+        if prefetch:
+            _prefetch_details(session, result, prefetch)
+        return result
+    try:
+        result = await _usda_search(q, dataType)
+    except HTTPException as exc:
+        # Network failures fall back to the imported dataset when there is one
+        local = _local_search(session, q, dataType) if exc.status_code == 503 else None
+        if local is None:
+            raise
+        return local
+    search_cache.set(key, result)
+    if prefetch:
+        _prefetch_details(session, result, prefetch)
+    return result
+
+
+@router.get("/api/foods/suggest")
+def foods_suggest(q: str, limit: int = Query(10, ge=1, le=50)):
+    """Complete ``q`` against cached foods and aliases, most-logged first."""
+    return {"results": suggest_index.suggest(q, limit)}
+
+
+@router.get("/api/foods/search/stats")
+def foods_search_stats():
+    return search_cache.stats()
+
+
+def _serve_stale(response: Response, food: Food) -> Food:
+    """Return a cached row USDA could not refresh, flagged for the client."""
+    response.headers["X-Food-Stale"] = "true"
+    return food
+
+
 @router.get("/api/foods/{fdc_id}")
 async def foods_get(
-    fdc_id: int, session: Session = Depends(get_session), refresh: bool = False
+    fdc_id: int,
+    response: Response,
+    session: Session = Depends(get_session),
+    refresh: bool = False,
 ):
     if not refresh:
         food = session.get(Food, fdc_id)
@@ -71,81 +203,31 @@ async def foods_get(
             return food
     if fdc_id < 0:
         raise HTTPException(status_code=404, detail="Custom food not found")
-    data = await fetch_food_detail(fdc_id)
-    try:
-        params = {
-            "api_key": utils.USDA_KEY,
-            "format": "abridged",
-            "fdcIds": fdc_id,
-            "nutrients": [1008, 1004, 1003, 1005],
-        }
-        url = httpx.URL(f"{USDA_BASE}/foods")
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, params=params)
-            resp.raise_for_status()
-            abr = resp.json()[0]
-        abr_fn = abr.get("foodNutrients") or []
-    except Exception as e:
-        logger.warning(
-            "Abridged fetch failed (%s), falling back to full foodNutrients", e
-        )
-        abr_fn = []
-    full_fn = data.get("foodNutrients") or []
-    fn = abr_fn if abr_fn else full_fn
-    nut_map: dict[int, float] = {}
-    for item in fn:
-        nid = None
-        if "nutrientId" in item:
-            nid = item["nutrientId"]
-        elif isinstance(item.get("nutrient"), dict):
-            nid = item["nutrient"].get("id") or item["nutrient"].get("nutrientId")
-        if nid is None:
-            continue
-        amt = item.get("amount", item.get("value"))
-        if amt is None and isinstance(item.get("nutrient"), dict):
-            amt = item["nutrient"].get("value")
-        try:
-            nut_map[nid] = float(amt or 0)
-        except (ValueError, TypeError):
-            nut_map[nid] = 0.0
-    lbl = data.get("labelNutrients") or {}
-    fat = (
-        nut_map.get(1085)
-        or nut_map.get(1004)
-        or float(lbl.get("fat", {}).get("value", 0))
-    )
-    protein = nut_map.get(1003) or float(lbl.get("protein", {}).get("value", 0))
-    carb = nut_map.get(1005) or float(lbl.get("carbohydrates", {}).get("value", 0))
-    kcal = nut_map.get(1008) or float(lbl.get("calories", {}).get("value", 0))
-    if kcal == 0 and (fat or protein or carb):
-        kcal = round(fat * 9 + protein * 4 + carb * 4, 2)
-    macros = {"kcal": kcal, "protein": protein, "fat": fat, "carb": carb}
-    values = dict(
-        fdc_id=fdc_id,
-        description=data.get("description")
-        or data.get("descriptionShort")
-        or "Unknown",
-        brand_owner=data.get("brandOwner"),
-        data_type=data.get("dataType") or data.get("dataCategory"),
-        kcal_per_100g=float(macros["kcal"]),
-        protein_g_per_100g=float(macros["protein"]),
-        carb_g_per_100g=float(macros["carb"]),
-        fat_g_per_100g=float(macros["fat"]),
-    )
+    if session.get(FdcFood, fdc_id) is not None or utils.USDA_OFFLINE:
+        return await ensure_food_cached(fdc_id, session)
     existing = session.get(Food, fdc_id)
-    if existing:
-        for k, v in values.items():
-            setattr(existing, k, v)
-        session.add(existing)
-        session.commit()
-        session.refresh(existing)
-        return existing
-    else:
-        food = Food(**values)
-        session.add(food)
-        session.commit()
-        session.refresh(food)
-        return food
+    if existing is None:
+        utils.raise_if_missing(session, [fdc_id])
+    elif not utils.usda_breaker.available():
+        return _serve_stale(response, existing)
+    try:
+        data = await fetch_food_detail(fdc_id)
+    except HTTPException as exc:
+        if exc.status_code == 404:
+            utils.record_missing(session, [fdc_id])
+        elif existing is not None and utils.is_outage(exc):
+            return _serve_stale(response, existing)
+        raise
+    return utils.save_fdc_food(session, fdc_id, data)
+
+
+@router.get("/api/foods/{fdc_id}/portions", response_model=List[FoodPortion])
+async def foods_portions(fdc_id: int, session: Session = Depends(get_session)):
+    """Household measures of a food, for logging entries by portion."""
+    food = await ensure_food_cached(fdc_id, session)
+    if food.archived:
+        raise HTTPException(status_code=404, detail="Food archived")
+    return portions.get_portions(session, fdc_id)
 
 
 class FavoriteIn(BaseModel):
@@ -220,6 +302,8 @@ async def add_favorite(payload: FavoriteIn, session: Session = Depends(get_sessi
         session.add(fav)
         session.commit()
         return {"ok": True}
+    # Before adding the row, so a food USDA doesn't know leaves nothing behind
+    await ensure_food_cached(payload.fdc_id, session)
     fav = Favorite(
         fdc_id=payload.fdc_id,
         alias=payload.alias,
@@ -228,15 +312,16 @@ async def add_favorite(payload: FavoriteIn, session: Session = Depends(get_sessi
         ),
     )
     session.add(fav)
-    await ensure_food_cached(payload.fdc_id, session)
     session.commit()
     return {"ok": True}
 
 
 @router.delete("/api/favorites/{fdc_id}")
 def remove_favorite(fdc_id: int, session: Session = Depends(get_session)):
-    session.exec(delete(Favorite).where(Favorite.fdc_id == fdc_id))
-    session.commit()
+    fav = session.get(Favorite, fdc_id)
+    if fav:
+        session.delete(fav)
+        session.commit()
     return {"ok": True}
 
 
@@ -402,17 +487,9 @@ def create_custom_food(body: CustomFoodIn, session: Session = Depends(get_sessio
 
 @router.get("/api/custom_foods/search", response_model=List[CustomFoodSearchResult])
 def search_custom_foods(q: str, session: Session = Depends(get_session)):
-    q_like = f"%{q.strip()}%"
-    rows = session.exec(
-        select(Food)
-        .where(
-            Food.data_type == "Custom",
-            Food.archived == False,
-            Food.description.ilike(q_like),
-        )
-        .order_by(Food.description)
-        .limit(50)
-    ).all()
+    rows = search_index.search_foods(
+        session, q, Food.data_type == "Custom", Food.archived == False
+    )
     return [
         CustomFoodSearchResult(
             fdc_id=r.fdc_id,
@@ -463,12 +540,17 @@ def delete_custom_food(fdc_id: int, session: Session = Depends(get_session)):
 
 
 @router.get("/api/my_foods", response_model=List[CustomFoodSearchResult])
-def my_foods(session: Session = Depends(get_session)):
-    rows = session.exec(
-        select(Food)
-        .where(Food.data_type == "Custom", Food.archived == False)
-        .order_by(Food.description)
-    ).all()
+def my_foods(q: Optional[str] = None, session: Session = Depends(get_session)):
+    if q:
+        rows = search_index.search_foods(
+            session, q, Food.data_type == "Custom", Food.archived == False, limit=500
+        )
+    else:
+        rows = session.exec(
+            select(Food)
+            .where(Food.data_type == "Custom", Food.archived == False)
+            .order_by(Food.description)
+        ).all()
     return [
         CustomFoodSearchResult(
             fdc_id=f.fdc_id,
@@ -1,44 +1,46 @@
 from datetime import date, timedelta
-from typing import Dict
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy import func
 from sqlmodel import Session, select
 
+from server import daily_totals
+from server import nutrients as nutrient_vectors
 from server.db import get_session
-from server.models import BodyWeight, Food, FoodEntry, Meal, WaterIntake
-from server.utils import scaled_macros_from_food
+from server.models import BodyWeight, WaterIntake
+from server.utils import not_modified
 
 router = APIRouter()
 
 
 @router.get("/api/history")
 def get_history(
-    start_date: date, end_date: date, session: Session = Depends(get_session)
+    start_date: date,
+    end_date: date,
+    request: Request,
+    response: Response,
+    nutrients: Optional[str] = Query(
+        None, description="Extra nutrients to total, comma-separated"
+    ),
+    granularity: str = Query(
+        "day", description="day, or week/month for one row per ISO week or month"
+    ),
+    session: Session = Depends(get_session),
 ):
+    if granularity not in daily_totals.GRANULARITIES:
+        raise HTTPException(
+            status_code=400,
+            detail="granularity must be one of "
+            + ", ".join(daily_totals.GRANULARITIES),
+        )
+    extra = nutrient_vectors.parse_nutrients(nutrients)
     start_str = start_date.isoformat()
     end_str = end_date.isoformat()
-    meals = session.exec(
-        select(Meal).where(Meal.date >= start_str, Meal.date <= end_str)
-    ).all()
-    meal_map = {m.id: m for m in meals}
-    meal_ids = list(meal_map.keys())
-
-    entries = []
-    foods: Dict[int, Food] = {}
-    if meal_ids:
-        entries = session.exec(
-            select(FoodEntry).where(FoodEntry.meal_id.in_(meal_ids))
-        ).all()
-        fdc_ids = {e.fdc_id for e in entries}
-        if fdc_ids:
-            foods = {
-                f.fdc_id: f
-                for f in session.exec(
-                    select(Food).where(Food.fdc_id.in_(fdc_ids))
-                ).all()
-            }
-
+    variant = f"{request.url.path}?{request.url.query}"
+    tag = daily_totals.etag(session, start_str, end_str, variant)
+    if cached := not_modified(request, response, tag):
+        return cached
     weights = session.exec(
         select(BodyWeight).where(
             BodyWeight.date >= start_str, BodyWeight.date <= end_str
@@ -56,28 +58,19 @@ def get_history(
     ).all()
     water_map = {d: ml for d, ml in waters}
 
-    totals: Dict[str, Dict[str, float]] = {}
-    for e in entries:
-        meal = meal_map.get(e.meal_id)
-        if not meal:
-            continue
-        day = meal.date
-        if day not in totals:
-            totals[day] = {"kcal": 0.0, "protein": 0.0, "carb": 0.0, "fat": 0.0}
-        food = foods.get(e.fdc_id)
-        if not food:
-            continue
-        kcal, p, c, fat = scaled_macros_from_food(food, e.quantity_g)
-        totals[day]["kcal"] += kcal
-        totals[day]["protein"] += p
-        totals[day]["carb"] += c
-        totals[day]["fat"] += fat
+    if granularity != "day":
+        return _rollup(
+            session, start_date, end_date, granularity, extra, weight_map, water_map
+        )
+
+    totals = daily_totals.load(session, start_str, end_str)
+    zero = [0.0] * len(nutrient_vectors.NUTRIENTS)
 
     out = []
     cur = start_date
     while cur <= end_date:
         day = cur.isoformat()
-        t = totals.get(day, {"kcal": 0.0, "protein": 0.0, "carb": 0.0, "fat": 0.0})
+        t = dict(zip(nutrient_vectors.NUTRIENTS, totals.get(day, zero)))
         out.append(
             {
                 "date": day,
@@ -88,7 +81,50 @@ def get_history(
                 "weight": weight_map.get(day),
                 "water": round(water_map.get(day, 0.0), 2),
             }
+            | {n: round(t[n], 2) for n in extra}
         )
         cur += timedelta(days=1)
 
     return out
+
+
+def _rollup(
+    session: Session,
+    start_date: date,
+    end_date: date,
+    granularity: str,
+    extra: List[str],
+    weight_map: Dict[str, float],
+    water_map: Dict[str, float],
+):
+    """One row per week or month with sums and per-logged-day averages.
+
+    Macro averages divide by the days with at least one entry (the period's
+    logged days) and water by the days with water logged, so days left empty,
+    including days holding only empty meals, do not drag them down. ``weight``
+    is the mean weigh-in.
+    """
+    keys = [*nutrient_vectors.MACROS, *extra]
+    out = []
+    for period in daily_totals.load_periods(session, start_date, end_date, granularity):
+        start, end = period.start.isoformat(), period.end.isoformat()
+        t = dict(zip(nutrient_vectors.NUTRIENTS, period.vector))
+        weights = [w for d, w in weight_map.items() if start <= d <= end]
+        waters = [ml for d, ml in water_map.items() if start <= d <= end]
+        logged = period.logged_days
+        totals = {k: round(t[k], 2) for k in keys}
+        averages = {k: round(t[k] / logged, 2) if logged else 0.0 for k in keys}
+        totals["water"] = round(sum(waters), 2)
+        averages["water"] = round(sum(waters) / len(waters), 2) if waters else 0.0
+        out.append(
+            {
+                "start": start,
+                "end": end,
+                "days": (period.end - period.start).days + 1,
+                "logged_days": logged,
+                "totals": totals,
+                "averages": averages,
+                "weight": round(sum(weights) / len(weights), 2) if weights else None,
+            }
+        )
+    return out
@@ -1,16 +1,21 @@
 import csv
 import io
+import os
 from datetime import date
-from typing import List, Optional
+from typing import Dict, List, Optional, Set
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
-from pydantic import BaseModel, field_validator
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import BaseModel, field_validator, model_validator
 from sqlalchemy import delete, desc, func
 from sqlmodel import Session, select
 
+from server import aggregate, daily_totals
+from server import nutrients as nutrient_vectors
+from server import portions
+from server.cache import TTLCache
 from server.db import get_session
-from server.models import Food, FoodEntry, Meal
-from server.utils import ensure_food_cached, get_or_create_meal, scaled_macros_from_food
+from server.models import Food, FoodEntry, FoodPortion, Meal
+from server.utils import ensure_foods_cached, get_or_create_meal, not_modified
 
 router = APIRouter()
 
@@ -26,6 +31,8 @@ class DaySummary(BaseModel):
     meals: List[Meal]
     entries: List[FoodEntry]
     totals: DayTotals
+    # Extra nutrients requested via ``?nutrients=``
+    nutrients: Optional[Dict[str, float]] = None
 
 
 class MealCreate(BaseModel):
@@ -40,15 +47,26 @@ class MealUpdate(BaseModel):
 class FoodEntryCreate(BaseModel):
     meal_id: int
     fdc_id: int
-    quantity_g: float
+    quantity_g: Optional[float] = None
+    # Log a household measure instead, e.g. 2 x "slice"
+    portion_id: Optional[int] = None
+    portion_count: Optional[float] = None
 
-    @field_validator("quantity_g")
+    @field_validator("quantity_g", "portion_count")
     @classmethod
-    def quantity_non_negative(cls, v: float) -> float:
-        if v < 0:
-            raise ValueError("quantity_g must be ≥ 0")
+    def quantity_non_negative(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and v < 0:
+            raise ValueError("quantity must be ≥ 0")
         return v
 
+    @model_validator(mode="after")
+    def quantity_or_portion(self) -> "FoodEntryCreate":
+        if self.portion_id is None and self.quantity_g is None:
+            raise ValueError("quantity_g or portion_id is required")
+        if self.portion_id is None and self.portion_count is not None:
+            raise ValueError("portion_count requires portion_id")
+        return self
+
 
 @router.post("/api/meals", response_model=Meal)
 def create_meal(payload: MealCreate, session: Session = Depends(get_session)):
@@ -140,11 +158,17 @@ def create_entry(payload: FoodEntryCreate, session: Session = Depends(get_sessio
         ).first()
         or 0
     )
+    quantity_g = payload.quantity_g
+    if payload.portion_id is not None:
+        quantity_g = portions.portion_grams(
+            session, food, payload.portion_id, payload.portion_count
+        )
     entry = FoodEntry(
         meal_id=payload.meal_id,
         fdc_id=payload.fdc_id,
-        quantity_g=payload.quantity_g,
+        quantity_g=quantity_g,
         sort_order=max_order + 1,
+        portion_id=payload.portion_id,
     )
     session.add(entry)
     session.commit()
@@ -152,9 +176,26 @@ def create_entry(payload: FoodEntryCreate, session: Session = Depends(get_sessio
     return entry
 
 
+NUTRIENTS_QUERY = Query(
+    None,
+    description="Extra nutrients to total, comma-separated (e.g. fiber,sugar,sodium)",
+)
+
+
 @router.get("/api/days/{date}", response_model=DaySummary)
-def get_day(date: date, session: Session = Depends(get_session)) -> DaySummary:
+def get_day(
+    date: date,
+    request: Request,
+    response: Response,
+    nutrients: Optional[str] = NUTRIENTS_QUERY,
+    session: Session = Depends(get_session),
+) -> DaySummary:
+    extra = nutrient_vectors.parse_nutrients(nutrients)
     date_str = date.isoformat()
+    variant = f"{request.url.path}?{request.url.query}"
+    tag = daily_totals.etag(session, date_str, date_str, variant)
+    if cached := not_modified(request, response, tag):
+        return cached
     meals = session.exec(select(Meal).where(Meal.date == date_str)).all()
     meal_ids = [m.id for m in meals]
     if not meal_ids:
@@ -162,6 +203,7 @@ def get_day(date: date, session: Session = Depends(get_session)) -> DaySummary:
             meals=[],
             entries=[],
             totals=DayTotals(kcal=0, protein=0, carb=0, fat=0),
+            nutrients={n: 0.0 for n in extra} if extra else None,
         )
     entries = session.exec(
         select(FoodEntry)
@@ -174,28 +216,26 @@ def get_day(date: date, session: Session = Depends(get_session)) -> DaySummary:
             select(Food).where(Food.fdc_id.in_({e.fdc_id for e in entries}))
         ).all()
     }
-    totals = {"kcal": 0.0, "protein": 0.0, "carb": 0.0, "fat": 0.0}
-    for e in entries:
-        f = foods.get(e.fdc_id)
-        if not f:
-            continue
-        kcal, p, c, fat = scaled_macros_from_food(f, e.quantity_g)
-        totals["kcal"] += kcal
-        totals["protein"] += p
-        totals["carb"] += c
-        totals["fat"] += fat
+    vectors = nutrient_vectors.load_vectors(session, foods) if extra else {}
+    total = aggregate.EntryNutrients.of(entries, foods, vectors).total()
+    totals = aggregate.as_dict(total, nutrient_vectors.MACROS)
+    extra_totals = aggregate.as_dict(total, extra)
     return DaySummary(
         meals=meals,
         entries=entries,
         totals=DayTotals(**{k: round(v, 2) for k, v in totals.items()}),
+        nutrients={k: round(v, 2) for k, v in extra_totals.items()} if extra else None,
     )
 
 
 class EntryUpdate(BaseModel):
     quantity_g: Optional[float] = None
     sort_order: Optional[int] = None
+    # Re-scale by household measure; portion_id defaults to the entry's own
+    portion_id: Optional[int] = None
+    portion_count: Optional[float] = None
 
-    @field_validator("quantity_g")
+    @field_validator("quantity_g", "portion_count")
     @classmethod
     def quantity_non_negative(cls, v: Optional[float]) -> Optional[float]:
         if v is not None and v < 0:
@@ -253,6 +293,19 @@ def update_entry(
             e.sort_order = new_order
         if payload.quantity_g is not None:
             e.quantity_g = float(payload.quantity_g)
+        if payload.portion_id is not None or payload.portion_count is not None:
+            portion_id = payload.portion_id or e.portion_id
+            if portion_id is None:
+                raise HTTPException(
+                    status_code=400, detail="Entry was not logged by portion"
+                )
+            food = session.get(Food, e.fdc_id)
+            if food is None:
+                raise HTTPException(status_code=404, detail="Food not available")
+            e.quantity_g = portions.portion_grams(
+                session, food, portion_id, payload.portion_count
+            )
+            e.portion_id = portion_id
     session.refresh(e)
     return e
 
@@ -288,9 +341,45 @@ def delete_entry(entry_id: int, session: Session = Depends(get_session)):
     return {"ok": True}
 
 
+# Rendered /api/days/{date}/full payloads keyed by (date, extra nutrients), each
+# stored with the ETag it was rendered for. Commits that change a day drop its
+# entries; the ETag check also rejects any payload rendered before a change.
+day_cache = TTLCache(
+    maxsize=int(os.getenv("DAY_CACHE_SIZE", "64")),
+    ttl=float(os.getenv("DAY_CACHE_TTL", "3600")),
+)
+
+
+@daily_totals.on_change
+def _drop_cached_days(dates: Set[str]) -> None:
+    day_cache.pop_if(lambda key: key[0] in dates)
+
+
 @router.get("/api/days/{date}/full")
-async def get_day_full(date: date, session: Session = Depends(get_session)):
+async def get_day_full(
+    date: date,
+    request: Request,
+    response: Response,
+    nutrients: Optional[str] = NUTRIENTS_QUERY,
+    session: Session = Depends(get_session),
+):
+    extra = nutrient_vectors.parse_nutrients(nutrients)
     date_str = date.isoformat()
+    variant = f"{request.url.path}?{request.url.query}"
+    tag = daily_totals.etag(session, date_str, date_str, variant)
+    if cached := not_modified(request, response, tag):
+        return cached
+    key = (date_str, tuple(extra))
+    hit = day_cache.get(key)
+    if hit is not None and hit[0][0] == tag:
+        return hit[0][1]
+    payload = _render_day_full(session, date_str, extra)
+    day_cache.set(key, (tag, payload))
+    return payload
+
+
+def _render_day_full(session: Session, date_str: str, extra: List[str]) -> dict:
+    keys = ["kcal", "protein", "carb", "fat", *extra]
     meals = session.exec(
         select(Meal).where(Meal.date == date_str).order_by(Meal.sort_order)
     ).all()
@@ -299,7 +388,8 @@ async def get_day_full(date: date, session: Session = Depends(get_session)):
         return {
             "date": date_str,
             "meals": [],
-            "totals": {"kcal": 0, "protein": 0, "fat": 0, "carb": 0},
+            "totals": {"kcal": 0, "protein": 0, "fat": 0, "carb": 0}
+            | {n: 0 for n in extra},
         }
     entries = session.exec(
         select(FoodEntry)
@@ -312,8 +402,20 @@ async def get_day_full(date: date, session: Session = Depends(get_session)):
         q = select(Food).where(Food.fdc_id.in_(fdc_ids))
         foods_list = session.exec(q).all()
         foods = {f.fdc_id: f for f in foods_list}
+    vectors = nutrient_vectors.load_vectors(session, foods) if extra else {}
+    portion_ids = {e.portion_id for e in entries if e.portion_id is not None}
+    portion_rows: Dict[int, FoodPortion] = {}
+    if portion_ids:
+        portion_rows = {
+            p.id: p
+            for p in session.exec(
+                select(FoodPortion).where(FoodPortion.id.in_(portion_ids))
+            ).all()
+        }
+
+    values = aggregate.EntryNutrients.of(entries, foods, vectors)
 
-    def row_for_entry(e: FoodEntry):
+    def row_for_entry(e: FoodEntry, vec: List[float]):
         f = foods.get(e.fdc_id)
         if f is None:
             return {
@@ -326,32 +428,34 @@ async def get_day_full(date: date, session: Session = Depends(get_session)):
                 "carb": 0.0,
                 "fat": 0.0,
                 "unit_name": None,
-            }
-        kcal, p, c, fat = scaled_macros_from_food(f, e.quantity_g)
-        return {
+            } | {n: 0.0 for n in extra}
+        row = {
             "id": e.id,
             "fdc_id": e.fdc_id,
             "description": f.description,
             "quantity_g": e.quantity_g,
-            "kcal": kcal,
-            "protein": p,
-            "carb": c,
-            "fat": fat,
+            **aggregate.as_dict(vec, nutrient_vectors.MACROS),
             "sort_order": e.sort_order,
             "unit_name": f.unit_name,
         }
+        portion = portion_rows.get(e.portion_id)
+        if portion is not None:
+            row["portion_id"] = portion.id
+            row["portion_name"] = portion.name
+            row["portion_count"] = portions.portion_count(portion, e.quantity_g)
+        row.update(aggregate.as_dict(vec, extra))
+        return row
 
     by_meal: Dict[int, List[Dict]] = {m.id: [] for m in meals}
-    for e in entries:
-        by_meal[e.meal_id].append(row_for_entry(e))
-    totals = {"kcal": 0.0, "protein": 0.0, "carb": 0.0, "fat": 0.0}
+    for e, vec in zip(entries, values.rows()):
+        by_meal[e.meal_id].append(row_for_entry(e, vec))
+    subtotals = values.sum_by([e.meal_id for e in entries])
+    totals = dict.fromkeys(keys, 0.0)
     meals_out = []
+    zero = [0.0] * len(nutrient_vectors.NUTRIENTS)
     for m in meals:
         m_entries = by_meal.get(m.id, [])
-        sub = {"kcal": 0.0, "protein": 0.0, "carb": 0.0, "fat": 0.0}
-        for x in m_entries:
-            for k in sub:
-                sub[k] += x[k]
+        sub = aggregate.as_dict(subtotals.get(m.id, zero), keys)
         for k in totals:
             totals[k] += sub[k]
         meals_out.append(
@@ -375,58 +479,41 @@ async def get_day_full(date: date, session: Session = Depends(get_session)):
 def export_csv(
     start: date = Query(..., description="YYYY-MM-DD"),
     end: date = Query(..., description="YYYY-MM-DD"),
+    nutrients: Optional[str] = NUTRIENTS_QUERY,
     session: Session = Depends(get_session),
 ):
+    extra = nutrient_vectors.parse_nutrients(nutrients)
+    header = ["date", "meal", "item", "grams", "kcal", "protein", "carb", "fat"]
+    header += extra
     start_str = start.isoformat()
     end_str = end.isoformat()
-    meals = session.exec(
-        select(Meal).where(Meal.date >= start_str, Meal.date <= end_str)
-    ).all()
-    if not meals:
-        return Response(
-            content="date,meal,item,grams,kcal,protein,carb,fat\n",
-            media_type="text/csv",
-        )
-    meals_by_id = {m.id: m for m in meals}
-    entries = session.exec(
-        select(FoodEntry)
-        .where(FoodEntry.meal_id.in_(list(meals_by_id.keys())))
-        .order_by(FoodEntry.id)
+    # Entry columns straight from SQL, in export order
+    rows = session.exec(
+        select(Meal.date, Meal.name, FoodEntry.fdc_id, FoodEntry.quantity_g)
+        .join(FoodEntry, FoodEntry.meal_id == Meal.id)
+        .where(Meal.date >= start_str, Meal.date <= end_str)
+        .order_by(Meal.date, Meal.sort_order, FoodEntry.id)
     ).all()
+    if not rows:
+        return Response(content=",".join(header) + "\n", media_type="text/csv")
+    days, meal_names, fdc_ids, quantities = zip(*rows)
     foods = {
         f.fdc_id: f
-        for f in session.exec(
-            select(Food).where(Food.fdc_id.in_({e.fdc_id for e in entries}))
-        ).all()
+        for f in session.exec(select(Food).where(Food.fdc_id.in_(set(fdc_ids)))).all()
     }
+    vectors = nutrient_vectors.load_vectors(session, foods) if extra else {}
+    values = aggregate.EntryNutrients(fdc_ids, quantities, foods, vectors)
+    columns = [nutrient_vectors.INDEX[n] for n in (*nutrient_vectors.MACROS, *extra)]
     buf = io.StringIO()
     w = csv.writer(buf)
-    w.writerow(["date", "meal", "item", "grams", "kcal", "protein", "carb", "fat"])
-    sorted_entries = sorted(
-        entries,
-        key=lambda x: (
-            meals_by_id[x.meal_id].date,
-            meals_by_id[x.meal_id].sort_order,
-            x.id or 0,
-        ),
-    )
-    for e in sorted_entries:
-        f = foods.get(e.fdc_id)
+    w.writerow(header)
+    for day, meal_name, fdc_id, qty, vec in zip(
+        days, meal_names, fdc_ids, quantities, values.rows()
+    ):
+        f = foods.get(fdc_id)
         if not f:
             continue
-        kcal, p, c, fat = scaled_macros_from_food(f, e.quantity_g)
-        w.writerow(
-            [
-                meals_by_id[e.meal_id].date,
-                meals_by_id[e.meal_id].name,
-                f.description,
-                e.quantity_g,
-                kcal,
-                p,
-                c,
-                fat,
-            ]
-        )
+        w.writerow([day, meal_name, f.description, qty] + [vec[i] for i in columns])
     csv_bytes = buf.getvalue().encode("utf-8")
     filename = f"macro_export_{start_str}_to_{end_str}.csv"
     return Response(
@@ -498,15 +585,14 @@ async def copy_meal_to(
         ).first()
         or 0
     )
-    food_ids_to_cache = {e.fdc_id for e in source_entries}
-    for fdc_id in food_ids_to_cache:
-        await ensure_food_cached(fdc_id, session)
+    await ensure_foods_cached({e.fdc_id for e in source_entries}, session)
     for idx, entry in enumerate(source_entries, start=1):
         new_entry = FoodEntry(
             meal_id=dest_meal.id,
             fdc_id=entry.fdc_id,
             quantity_g=entry.quantity_g,
             sort_order=max_sort_order + idx,
+            portion_id=entry.portion_id,
         )
         session.add(new_entry)
     session.commit()
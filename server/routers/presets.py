@@ -8,7 +8,7 @@ from sqlmodel import Session, delete, select
 
 from server.db import get_session
 from server.models import Food, FoodEntry, Meal, Preset, PresetItem
-from server.utils import ensure_food_cached, get_or_create_meal
+from server.utils import ensure_foods_cached, get_or_create_meal
 
 router = APIRouter()
 
@@ -133,20 +133,20 @@ async def apply_preset(
         return {"ok": True, "entries": 0}
     m = get_or_create_meal(session, payload.date, payload.meal_name)
     mult = float(payload.multiplier or 1.0)
-    for it in items:
-        await ensure_food_cached(it.fdc_id, session)
-        max_order = (
-            session.exec(
-                select(func.max(FoodEntry.sort_order)).where(FoodEntry.meal_id == m.id)
-            ).first()
-            or 0
-        )
+    await ensure_foods_cached({it.fdc_id for it in items}, session)
+    max_order = (
+        session.exec(
+            select(func.max(FoodEntry.sort_order)).where(FoodEntry.meal_id == m.id)
+        ).first()
+        or 0
+    )
+    for idx, it in enumerate(items, start=1):
         session.add(
             FoodEntry(
                 meal_id=m.id,
                 fdc_id=it.fdc_id,
                 quantity_g=it.grams * mult,
-                sort_order=max_order + 1,
+                sort_order=max_order + idx,
             )
         )
     session.commit()
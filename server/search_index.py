@@ -0,0 +1,147 @@
+"""SQLite FTS5 index over food descriptions, brands and favorite aliases.
+
+``food_fts`` mirrors ``Food.description``/``Food.brand_owner`` and
+``Favorite.alias`` using the food's ``fdc_id`` as rowid. Triggers on ``food``
+and ``favorite`` keep it in sync with every write, whichever code path makes
+it. The table is created (and backfilled) whenever the schema is created, so
+both fresh and existing databases get it; when SQLite lacks FTS5 the search
+helpers fall back to ``LIKE`` scans.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from typing import Optional
+
+from sqlalchemy import column, event, table, text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, or_, select
+
+from server.models import Favorite, Food
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "food_fts"
+
+_CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "description, brand_owner, alias, tokenize = 'unicode61 remove_diacritics 2')"
+)
+_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS food_fts_ai AFTER INSERT ON food BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, brand_owner, alias)
+        VALUES (new.fdc_id, new.description, new.brand_owner,
+                (SELECT alias FROM favorite WHERE fdc_id = new.fdc_id));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS food_fts_au
+        AFTER UPDATE OF description, brand_owner ON food BEGIN
+        UPDATE {FTS_TABLE} SET description = new.description,
+            brand_owner = new.brand_owner
+        WHERE rowid = new.fdc_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS food_fts_ad AFTER DELETE ON food BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.fdc_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS favorite_fts_ai AFTER INSERT ON favorite BEGIN
+        UPDATE {FTS_TABLE} SET alias = new.alias WHERE rowid = new.fdc_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS favorite_fts_au
+        AFTER UPDATE OF alias ON favorite BEGIN
+        UPDATE {FTS_TABLE} SET alias = new.alias WHERE rowid = new.fdc_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS favorite_fts_ad AFTER DELETE ON favorite BEGIN
+        UPDATE {FTS_TABLE} SET alias = NULL WHERE rowid = old.fdc_id;
+    END""",
+]
+_BACKFILL = f"""
+    INSERT INTO {FTS_TABLE}(rowid, description, brand_owner, alias)
+    SELECT food.fdc_id, food.description, food.brand_owner, favorite.alias
+    FROM food LEFT JOIN favorite ON favorite.fdc_id = food.fdc_id
+"""
+
+_fts = table(FTS_TABLE, column("rowid"), column("rank"))
+
+
+def create_food_fts(connection) -> bool:
+    """Create ``food_fts`` and its triggers if missing, backfilling new tables.
+
+    Returns False when the database is not SQLite or lacks FTS5.
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+    if not _has_fts_table(connection):
+        try:
+            connection.execute(text(_CREATE_TABLE))
+        except OperationalError as exc:
+            logger.warning("FTS5 unavailable, food search will use LIKE: %s", exc)
+            return False
+        connection.execute(text(_BACKFILL))
+    for ddl in _TRIGGERS:
+        connection.execute(text(ddl))
+    return True
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def _create_fts_after_schema(target, connection, **kw) -> None:
+    create_food_fts(connection)
+
+
+def _has_fts_table(connection) -> bool:
+    return (
+        connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"),
+            {"n": FTS_TABLE},
+        ).first()
+        is not None
+    )
+
+
+def fts_available(session: Session) -> bool:
+    connection = session.connection()
+    return connection.dialect.name == "sqlite" and _has_fts_table(connection)
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """Turn user input into an FTS5 query: every token must match as a prefix."""
+    tokens = re.findall(r"\w+", q.lower())
+    if not tokens:
+        return None
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def search_foods(session: Session, q: str, *conditions, limit: int = 50):
+    """Return ``Food`` rows matching ``q`` best-first, filtered by ``conditions``.
+
+    Uses the FTS5 index ranked by bm25 when available, otherwise a ``LIKE``
+    scan over description, brand and favorite alias.
+    """
+    if fts_available(session):
+        match = build_match_query(q)
+        if match is None:
+            return []
+        stmt = (
+            select(Food)
+            .join(_fts, _fts.c.rowid == Food.fdc_id)
+            .where(text(f"{FTS_TABLE} MATCH :match").bindparams(match=match))
+            .where(*conditions)
+            .order_by(_fts.c.rank, Food.description)
+            .limit(limit)
+        )
+        return session.exec(stmt).all()
+    q_like = f"%{q.strip()}%"
+    stmt = (
+        select(Food)
+        .outerjoin(Favorite, Favorite.fdc_id == Food.fdc_id)
+        .where(
+            or_(
+                Food.description.ilike(q_like),
+                Food.brand_owner.ilike(q_like),
+                Favorite.alias.ilike(q_like),
+            ),
+            *conditions,
+        )
+        .order_by(Food.description)
+        .limit(limit)
+    )
+    return session.exec(stmt).all()
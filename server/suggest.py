@@ -0,0 +1,230 @@
+"""In-memory prefix index behind ``/api/foods/suggest``.
+
+Every word position of each cached food's description and favorite alias is
+stored as a ``(suffix, fdc_id)`` pair in one sorted list, so a completion is a
+:func:`bisect.bisect_left` plus a short scan and never touches the database.
+Matches are ranked by how often the food was logged.
+
+The index is built from the database at startup (:meth:`SuggestIndex.build`)
+and kept current by session hooks: each flush notes the ``Food``, ``Favorite``
+and ``FoodEntry`` changes it wrote, and they are applied once the transaction
+commits (or dropped if it rolls back). Bulk ``UPDATE``/``DELETE`` statements on
+those tables carry no per-row changes, so they rebuild the index on commit.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from server.models import Favorite, Food, FoodEntry
+
+# Upper bound on matching keys examined per query, so one-letter prefixes
+# stay cheap on large caches
+MAX_SCAN = 2000
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def _suffixes(text: Optional[str]) -> Set[str]:
+    words = normalize(text or "").split()
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+
+@dataclass
+class _Entry:
+    description: str
+    brand_owner: Optional[str] = None
+    data_type: Optional[str] = None
+
+
+class SuggestIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[str, int]] = []
+        self._entries: Dict[int, _Entry] = {}
+        # Kept apart from _entries: a favorite may be written before its food
+        self._aliases: Dict[int, str] = {}
+        self._usage: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def build(self, session: Session) -> None:
+        """Rebuild the whole index from the database."""
+        entries = {
+            food.fdc_id: _Entry(food.description, food.brand_owner, food.data_type)
+            for food in session.exec(select(Food).where(Food.archived == False))
+        }
+        aliases = {
+            fav.fdc_id: fav.alias
+            for fav in session.exec(select(Favorite).where(Favorite.alias.is_not(None)))
+        }
+        usage = dict(
+            session.exec(
+                select(FoodEntry.fdc_id, func.count()).group_by(FoodEntry.fdc_id)
+            ).all()
+        )
+        with self._lock:
+            self._entries, self._aliases, self._usage = entries, aliases, usage
+            self._keys = sorted(
+                (suffix, fdc_id)
+                for fdc_id in entries
+                for suffix in self._food_suffixes(fdc_id)
+            )
+
+    def _food_suffixes(self, fdc_id: int) -> Set[str]:
+        entry = self._entries.get(fdc_id)
+        if entry is None:
+            return set()
+        return _suffixes(entry.description) | _suffixes(self._aliases.get(fdc_id))
+
+    def _reindex(self, fdc_id: int, change) -> None:
+        """Apply ``change()`` and move the food's keys accordingly."""
+        with self._lock:
+            for suffix in self._food_suffixes(fdc_id):
+                i = bisect_left(self._keys, (suffix, fdc_id))
+                if i < len(self._keys) and self._keys[i] == (suffix, fdc_id):
+                    del self._keys[i]
+            change()
+            for suffix in self._food_suffixes(fdc_id):
+                insort(self._keys, (suffix, fdc_id))
+
+    def upsert_entry(self, fdc_id: int, entry: _Entry) -> None:
+        def change() -> None:
+            self._entries[fdc_id] = entry
+
+        self._reindex(fdc_id, change)
+
+    def remove_food(self, fdc_id: int) -> None:
+        self._reindex(fdc_id, lambda: self._entries.pop(fdc_id, None))
+
+    def set_alias(self, fdc_id: int, alias: Optional[str]) -> None:
+        def change() -> None:
+            if alias:
+                self._aliases[fdc_id] = alias
+            else:
+                self._aliases.pop(fdc_id, None)
+
+        self._reindex(fdc_id, change)
+
+    def record_use(self, fdc_id: int, delta: int = 1) -> None:
+        with self._lock:
+            self._usage[fdc_id] = max(0, self._usage.get(fdc_id, 0) + delta)
+
+    def suggest(self, q: str, limit: int = 10) -> List[dict]:
+        prefix = normalize(q)
+        if not prefix:
+            return []
+        with self._lock:
+            ids: Set[int] = set()
+            i = bisect_left(self._keys, (prefix, -(1 << 63)))
+            end = min(len(self._keys), i + MAX_SCAN)
+            while i < end and self._keys[i][0].startswith(prefix):
+                ids.add(self._keys[i][1])
+                i += 1
+            ranked = sorted(
+                ids,
+                key=lambda fdc_id: (
+                    -self._usage.get(fdc_id, 0),
+                    len(self._entries[fdc_id].description),
+                    self._entries[fdc_id].description,
+                ),
+            )[:limit]
+            return [
+                {
+                    "fdcId": fdc_id,
+                    "description": self._entries[fdc_id].description,
+                    "brandOwner": self._entries[fdc_id].brand_owner,
+                    "dataType": self._entries[fdc_id].data_type,
+                    "alias": self._aliases.get(fdc_id),
+                    "uses": self._usage.get(fdc_id, 0),
+                }
+                for fdc_id in ranked
+            ]
+
+
+suggest_index = SuggestIndex()
+
+
+_PENDING = "suggest_pending"
+_REBUILD = "suggest_rebuild"
+_INDEXED = (Food, Favorite, FoodEntry)
+
+
+def _entry(food: Food) -> Optional[_Entry]:
+    if food.archived:
+        return None
+    return _Entry(food.description, food.brand_owner, food.data_type)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect(session: OrmSession, flush_context) -> None:
+    # Values are captured now: rows are expired by the time the commit lands
+    changes: List[tuple] = []
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Food):
+            changes.append(("food", obj.fdc_id, _entry(obj)))
+        elif isinstance(obj, Favorite):
+            changes.append(("alias", obj.fdc_id, obj.alias))
+        elif isinstance(obj, FoodEntry):
+            if obj in session.new:
+                changes.append(("use", obj.fdc_id, 1))
+                continue
+            old = inspect(obj).attrs.fdc_id.history.deleted
+            if old and old[0] != obj.fdc_id:
+                changes += [("use", old[0], -1), ("use", obj.fdc_id, 1)]
+    for obj in session.deleted:
+        if isinstance(obj, Food):
+            changes.append(("food", obj.fdc_id, None))
+        elif isinstance(obj, Favorite):
+            changes.append(("alias", obj.fdc_id, None))
+        elif isinstance(obj, FoodEntry):
+            changes.append(("use", obj.fdc_id, -1))
+    if changes:
+        session.info.setdefault(_PENDING, []).extend(changes)
+
+
+@event.listens_for(OrmSession, "do_orm_execute")
+def _note_bulk(state) -> None:
+    mapper = state.bind_mapper
+    if (state.is_update or state.is_delete) and mapper is not None:
+        if mapper.class_ in _INDEXED:
+            state.session.info[_REBUILD] = True
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _apply(session: OrmSession) -> None:
+    changes = session.info.pop(_PENDING, ())
+    if session.info.pop(_REBUILD, False):
+        with Session(session.get_bind()) as fresh:
+            suggest_index.build(fresh)
+        return
+    for kind, fdc_id, value in changes:
+        if kind == "food":
+            if value is None:
+                suggest_index.remove_food(fdc_id)
+            else:
+                suggest_index.upsert_entry(fdc_id, value)
+        elif kind == "alias":
+            suggest_index.set_alias(fdc_id, value)
+        else:
+            suggest_index.record_use(fdc_id, value)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard(session: OrmSession) -> None:
+    session.info.pop(_PENDING, None)
+    session.info.pop(_REBUILD, None)
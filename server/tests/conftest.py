@@ -14,6 +14,7 @@ from server import utils
 
 
 @pytest.fixture(autouse=True)
-def close_usda_client():
+def reset_usda_state():
+    utils.usda_breaker.reset()
     yield
     asyncio.run(utils.aclose_usda_client())
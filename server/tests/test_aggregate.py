@@ -0,0 +1,109 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+import csv
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import aggregate, app, db
+from server.benchmarks.aggregate import legacy_daily_totals, synthetic_log
+from server.models import Food, FoodEntry, Meal
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_entry_nutrients_match_per_entry_loop(use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    log, foods, vectors = synthetic_log(2000, 30, foods=50)
+    values = aggregate.EntryNutrients.of(log, foods, vectors, use_numpy=use_numpy)
+    assert values.sum_by([e.meal_id for e in log]) == legacy_daily_totals(
+        log, foods, vectors
+    )
+    rows = values.rows()
+    assert len(rows) == len(log)
+    assert all(type(v) is float for v in rows[0])
+
+
+def test_entry_nutrients_empty():
+    values = aggregate.EntryNutrients([], [], {})
+    assert values.rows() == []
+    assert values.total() == [0.0] * aggregate.SIZE
+
+
+def test_export_rows_in_order():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add_all(
+                [
+                    Food(
+                        fdc_id=1,
+                        description="Rice",
+                        kcal_per_100g=130,
+                        protein_g_per_100g=2.5,
+                        carb_g_per_100g=28,
+                        fat_g_per_100g=0.3,
+                    ),
+                    Food(
+                        fdc_id=2,
+                        description="Egg",
+                        kcal_per_100g=0,
+                        protein_g_per_100g=0,
+                        carb_g_per_100g=0,
+                        fat_g_per_100g=0,
+                        unit_name="egg",
+                        kcal_per_unit=70,
+                        protein_g_per_unit=6,
+                        carb_g_per_unit=0.5,
+                        fat_g_per_unit=5,
+                    ),
+                    Meal(id=1, date="2024-01-02", name="Meal 1", sort_order=1),
+                    Meal(id=2, date="2024-01-01", name="Meal 2", sort_order=2),
+                    Meal(id=3, date="2024-01-01", name="Meal 1", sort_order=1),
+                ]
+            )
+            session.commit()
+            session.add_all(
+                [
+                    FoodEntry(meal_id=1, fdc_id=1, quantity_g=200, sort_order=1),
+                    FoodEntry(meal_id=2, fdc_id=2, quantity_g=2, sort_order=1),
+                    FoodEntry(meal_id=3, fdc_id=1, quantity_g=50, sort_order=1),
+                    FoodEntry(meal_id=3, fdc_id=99, quantity_g=10, sort_order=2),
+                ]
+            )
+            session.commit()
+
+        resp = client.get(
+            "/api/export", params={"start": "2024-01-01", "end": "2024-01-31"}
+        )
+        assert resp.status_code == 200
+        rows = list(csv.reader(io.StringIO(resp.text)))
+        assert rows == [
+            ["date", "meal", "item", "grams", "kcal", "protein", "carb", "fat"],
+            ["2024-01-01", "Meal 1", "Rice", "50.0", "65.0", "1.25", "14.0", "0.15"],
+            ["2024-01-01", "Meal 2", "Egg", "2.0", "140.0", "12.0", "1.0", "10.0"],
+            ["2024-01-02", "Meal 1", "Rice", "200.0", "260.0", "5.0", "56.0", "0.6"],
+        ]
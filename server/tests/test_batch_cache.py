@@ -0,0 +1,149 @@
+import asyncio
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db, utils
+from server.models import Food
+from server.utils import ensure_foods_cached
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+def payload(fdc_id, kcal):
+    return {
+        "fdcId": fdc_id,
+        "description": f"Food {fdc_id}",
+        "labelNutrients": {
+            "calories": {"value": kcal},
+            "protein": {"value": 1},
+            "fat": {"value": 1},
+            "carbohydrates": {"value": 1},
+        },
+    }
+
+
+def test_ensure_foods_cached_fetches_stale_and_missing_in_one_batch(monkeypatch):
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(
+            [
+                Food(
+                    fdc_id=1,
+                    description="Fresh",
+                    kcal_per_100g=10,
+                    protein_g_per_100g=1,
+                    fat_g_per_100g=1,
+                    carb_g_per_100g=1,
+                ),
+                Food(
+                    fdc_id=2,
+                    description="Stale",
+                    kcal_per_100g=10,
+                    protein_g_per_100g=1,
+                    fat_g_per_100g=1,
+                    carb_g_per_100g=1,
+                    fetched_at=datetime.utcnow() - timedelta(days=60),
+                ),
+            ]
+        )
+        session.commit()
+    calls = []
+
+    async def fake_fetch_many(ids):
+        calls.append(list(ids))
+        return {i: payload(i, 100 + i) for i in ids}
+
+    monkeypatch.setattr(utils, "fetch_foods_detail", fake_fetch_many)
+
+    with Session(engine) as session:
+        foods = asyncio.run(ensure_foods_cached([1, 2, 3], session))
+        assert calls == [[2, 3]]
+        assert foods[1].description == "Fresh"
+        assert foods[2].kcal_per_100g == 102
+        assert session.get(Food, 3).description == "Food 3"
+
+
+def test_ensure_foods_cached_raises_for_unknown_food(monkeypatch):
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+
+    async def fake_fetch_many(ids):
+        return {}
+
+    monkeypatch.setattr(utils, "fetch_foods_detail", fake_fetch_many)
+
+    with Session(engine) as session:
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(ensure_foods_cached([7], session))
+        assert exc.value.status_code == 404
+        assert session.get(Food, 7) is None
+
+
+def test_fetch_foods_detail_chunks_requests(monkeypatch):
+    sizes = []
+
+    async def fake_chunk(ids):
+        sizes.append(len(ids))
+        return [{"fdcId": i} for i in ids]
+
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    monkeypatch.setattr(utils, "_fetch_foods_chunk", fake_chunk)
+    out = asyncio.run(utils.fetch_foods_detail(range(45)))
+    assert sorted(sizes) == [5, 20, 20]
+    assert set(out) == set(range(45))
+
+
+def test_apply_preset_caches_missing_foods_in_batch(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    calls = []
+
+    async def fake_fetch_many(ids):
+        calls.append(sorted(ids))
+        return {i: payload(i, 200) for i in ids}
+
+    monkeypatch.setattr(utils, "fetch_foods_detail", fake_fetch_many)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        resp = client.post(
+            "/api/presets",
+            json={
+                "name": "Batch",
+                "items": [{"fdc_id": i, "grams": 100} for i in (11, 12, 13)],
+            },
+        )
+        preset_id = resp.json()["id"]
+        resp_apply = client.post(
+            f"/api/presets/{preset_id}/apply",
+            json={"date": date(2024, 1, 1).isoformat(), "meal_name": "Meal 1"},
+        )
+        assert resp_apply.status_code == 200
+        assert resp_apply.json()["added"] == 3
+        assert calls == [[11, 12, 13]]
+        day = client.get("/api/days/2024-01-01").json()
+        assert [e["sort_order"] for e in day["entries"]] == [1, 2, 3]
+        assert day["totals"]["kcal"] == 600
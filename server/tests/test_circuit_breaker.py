@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db, utils
+from server.models import Food
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def expired_food(fdc_id):
+    return Food(
+        fdc_id=fdc_id,
+        description="Old Apple",
+        kcal_per_100g=52,
+        protein_g_per_100g=0.3,
+        fat_g_per_100g=0.2,
+        carb_g_per_100g=14,
+        fetched_at=datetime.utcnow() - timedelta(days=90),
+    )
+
+
+def test_breaker_opens_and_recovers_through_half_open_trial():
+    clock = FakeClock()
+    breaker = utils.CircuitBreaker(threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.acquire()
+
+    clock.now = 11
+    assert breaker.state == "half_open"
+    assert breaker.acquire()
+    assert not breaker.acquire()  # only one trial call at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 22
+    assert breaker.acquire()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.snapshot() == {"state": "closed", "failures": 0, "retry_in": 0.0}
+
+
+def test_open_breaker_short_circuits_calls(monkeypatch):
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    monkeypatch.setattr(utils, "usda_breaker", utils.CircuitBreaker(threshold=2))
+    calls = []
+
+    @utils.with_breaker
+    async def flaky():
+        calls.append(1)
+        raise HTTPException(status_code=502, detail="USDA network error")
+
+    async def run():
+        for _ in range(4):
+            with pytest.raises(HTTPException) as exc:
+                await flaky()
+        return exc.value.status_code
+
+    assert asyncio.run(run()) == 503
+    assert len(calls) == 2
+
+
+def test_cancelled_calls_do_not_count_as_failures(monkeypatch):
+    clock = FakeClock()
+    breaker = utils.CircuitBreaker(threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 11
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    monkeypatch.setattr(utils, "usda_breaker", breaker)
+
+    @utils.with_breaker
+    async def hang():
+        await asyncio.sleep(3600)
+
+    async def run():
+        task = asyncio.create_task(hang())
+        await asyncio.sleep(0)
+        # The half-open trial is taken while the call is in flight
+        assert not breaker.available()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.failures == 1
+    assert breaker.state == "half_open" and breaker.available()
+
+
+def test_expired_rows_served_while_usda_fails(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    monkeypatch.setattr(utils, "usda_breaker", utils.CircuitBreaker(threshold=1))
+
+    async def down(fdc_id):
+        raise HTTPException(status_code=502, detail="USDA network error")
+
+    monkeypatch.setattr(utils, "fetch_food_detail", utils.with_breaker(down))
+
+    async def cached():
+        with Session(engine) as session:
+            return (await utils.ensure_food_cached(1, session)).description
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(expired_food(1))
+            session.commit()
+
+        assert asyncio.run(cached()) == "Old Apple"
+        assert utils.usda_breaker.state == "open"
+
+        resp = client.get("/api/foods/1", params={"refresh": True})
+        assert resp.status_code == 200
+        assert resp.headers["X-Food-Stale"] == "true"
+        assert resp.json()["description"] == "Old Apple"
+
+        status = client.get("/api/config/usda-status").json()
+        assert status["breaker"]["state"] == "open"
+        assert "remaining" in status["rate_limit"]
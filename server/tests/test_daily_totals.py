@@ -0,0 +1,232 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, delete, select
+
+from server import app, daily_totals, db
+from server import nutrients as nutrient_vectors
+from server import utils
+from server.models import DailyTotals, Food, FoodEntry, Meal
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+FOOD_WITH_FIBER = {
+    "fdcId": 9,
+    "description": "Lentils",
+    "foodNutrients": [
+        {"nutrient": {"number": "208", "name": "Energy"}, "amount": 116},
+        {"nutrient": {"number": "203", "name": "Protein"}, "amount": 9},
+        {"nutrient": {"number": "291", "name": "Fiber, total dietary"}, "amount": 8},
+        {"nutrient": {"number": "307", "name": "Sodium, Na"}, "amount": 2},
+    ],
+}
+
+
+def stored(engine):
+    with Session(engine) as session:
+        return {
+            r.date: (round(r.kcal, 2), round(r.protein, 2))
+            for r in session.exec(select(DailyTotals)).all()
+        }
+
+
+@pytest.fixture
+def client():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(
+                Food(
+                    fdc_id=-1,
+                    description="Oats",
+                    data_type="Custom",
+                    kcal_per_100g=400,
+                    protein_g_per_100g=10,
+                    carb_g_per_100g=60,
+                    fat_g_per_100g=8,
+                )
+            )
+            session.add(Meal(date="2024-01-01", name="Meal 1", sort_order=1))
+            session.commit()
+        client.engine = engine
+        yield client
+
+
+def test_totals_follow_entry_changes(client):
+    engine = client.engine
+    entry = client.post(
+        "/api/entries", json={"meal_id": 1, "fdc_id": -1, "quantity_g": 50}
+    ).json()
+    assert stored(engine) == {"2024-01-01": (200.0, 5.0)}
+
+    client.patch(f"/api/entries/{entry['id']}", json={"quantity_g": 100})
+    assert stored(engine) == {"2024-01-01": (400.0, 10.0)}
+
+    resp = client.post(
+        "/api/meals/1/copy_to", json={"date": "2024-01-02", "meal_name": "Meal 1"}
+    )
+    assert resp.status_code == 201
+    assert stored(engine)["2024-01-02"] == (400.0, 10.0)
+
+    preset = client.post(
+        "/api/presets", json={"name": "P", "items": [{"fdc_id": -1, "grams": 25}]}
+    ).json()
+    client.post(
+        f"/api/presets/{preset['id']}/apply",
+        json={"date": "2024-01-02", "meal_name": "Meal 1", "multiplier": 2},
+    )
+    assert stored(engine)["2024-01-02"] == (600.0, 15.0)
+
+    client.patch("/api/custom_foods/-1", json={"kcal_per_100g": 200})
+    assert stored(engine) == {"2024-01-01": (200.0, 10.0), "2024-01-02": (300.0, 15.0)}
+
+    client.delete(f"/api/entries/{entry['id']}")
+    # The meal is still there, but a day without entries has no row
+    assert "2024-01-01" not in stored(engine)
+
+    history = client.get(
+        "/api/history", params={"start_date": "2024-01-01", "end_date": "2024-01-03"}
+    ).json()
+    assert [d["kcal"] for d in history] == [0.0, 300.0, 0.0]
+
+
+def test_rollback_leaves_totals_untouched(client):
+    engine = client.engine
+    entry = client.post(
+        "/api/entries", json={"meal_id": 1, "fdc_id": -1, "quantity_g": 50}
+    ).json()
+    resp = client.patch(
+        f"/api/entries/{entry['id']}", json={"quantity_g": 500, "portion_count": 2}
+    )
+    assert resp.status_code == 400
+    assert stored(engine) == {"2024-01-01": (200.0, 5.0)}
+
+    with Session(engine) as session:
+        session.add(FoodEntry(meal_id=1, fdc_id=-1, quantity_g=500, sort_order=9))
+        session.flush()
+        session.rollback()
+        session.add(Meal(date="2024-01-05", name="Meal 1", sort_order=1))
+        session.commit()
+    assert stored(engine) == {"2024-01-01": (200.0, 5.0)}
+
+
+def test_empty_meals_change_versions_but_not_totals(client, monkeypatch):
+    engine = client.engine
+
+    def tag():
+        with Session(engine) as session:
+            return daily_totals.etag(session, "2024-01-02", "2024-01-02")
+
+    before = tag()
+    resp = client.post("/api/meals", json={"date": "2024-01-02"})
+    assert resp.status_code == 200
+    assert tag() != before
+    assert stored(engine) == {}
+
+    refreshed = []
+    real_refresh = daily_totals.refresh
+
+    def spy(session, dates):
+        refreshed.append(sorted(dates))
+        return real_refresh(session, dates)
+
+    monkeypatch.setattr(daily_totals, "refresh", spy)
+    for _ in range(2):
+        with Session(engine) as session:
+            assert daily_totals.load(session, "2024-01-01", "2024-01-02") == {}
+    assert refreshed == []
+
+
+def test_history_fills_missing_days_and_rebuild(client):
+    engine = client.engine
+    client.post("/api/entries", json={"meal_id": 1, "fdc_id": -1, "quantity_g": 50})
+    with Session(engine) as session:
+        session.exec(delete(DailyTotals))
+        session.commit()
+    history = client.get(
+        "/api/history",
+        params={
+            "start_date": "2024-01-01",
+            "end_date": "2024-01-01",
+            "nutrients": "fiber",
+        },
+    ).json()
+    assert history[0]["kcal"] == 200.0 and history[0]["fiber"] == 0.0
+    assert stored(engine) == {"2024-01-01": (200.0, 5.0)}
+
+    with Session(engine) as session:
+        row = session.get(DailyTotals, "2024-01-01")
+        row.kcal = 1.0
+        session.add(DailyTotals(date="1999-01-01", nutrients=b""))
+        session.commit()
+
+    def tags():
+        with Session(engine) as session:
+            return [
+                daily_totals.etag(session, day, day)
+                for day in ("1999-01-01", "2024-01-01")
+            ]
+
+    before = tags()
+    assert daily_totals.rebuild(engine) == 1
+    assert stored(engine) == {"2024-01-01": (200.0, 5.0)}
+    # Both the rewritten day and the dropped one get a new ETag
+    after = tags()
+    assert all(old != new for old, new in zip(before, after))
+
+
+def test_sql_totals_match_python_scaling(client):
+    engine = client.engine
+    with Session(engine) as session:
+        egg = Food(
+            fdc_id=-2,
+            description="Egg",
+            data_type="Custom",
+            kcal_per_100g=0,
+            protein_g_per_100g=0,
+            carb_g_per_100g=0,
+            fat_g_per_100g=0,
+            unit_name="egg",
+            kcal_per_unit=70,
+            protein_g_per_unit=6,
+        )
+        session.add(egg)
+        utils.save_fdc_food(session, 9, FOOD_WITH_FIBER)
+        entries = [(-1, 50), (-2, 3), (9, 200), (9, 50), (404, 100)]
+        for i, (fdc_id, qty) in enumerate(entries, start=1):
+            session.add(
+                FoodEntry(meal_id=1, fdc_id=fdc_id, quantity_g=qty, sort_order=i)
+            )
+        session.commit()
+
+        expected = [0.0] * len(nutrient_vectors.NUTRIENTS)
+        vectors = nutrient_vectors.load_vectors(session, [9])
+        for fdc_id, qty in entries:
+            food = session.get(Food, fdc_id)
+            if food is None:
+                continue
+            vec = nutrient_vectors.scaled(food, vectors.get(fdc_id), qty)
+            expected = [a + b for a, b in zip(expected, vec)]
+        row = session.get(DailyTotals, "2024-01-01")
+        assert nutrient_vectors.unpack(row.nutrients) == pytest.approx(expected)
+        assert [row.kcal, row.protein, row.carb, row.fat] == pytest.approx(expected[:4])
@@ -0,0 +1,122 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db
+from server.models import Food, Meal
+from server.routers import meals
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+def cached_dates():
+    return {key[0] for key in meals.day_cache._data}
+
+
+def test_day_cache_hits_and_invalidation():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(
+                Food(
+                    fdc_id=1,
+                    description="Rice",
+                    kcal_per_100g=130,
+                    protein_g_per_100g=2.5,
+                    carb_g_per_100g=28,
+                    fat_g_per_100g=0.3,
+                )
+            )
+            session.add(Meal(id=1, date="2024-01-01", name="Meal 1", sort_order=1))
+            session.add(Meal(id=2, date="2024-01-02", name="Meal 1", sort_order=1))
+            session.commit()
+        entry = client.post(
+            "/api/entries", json={"meal_id": 1, "fdc_id": 1, "quantity_g": 100}
+        ).json()
+
+        def warm():
+            for day in ("2024-01-01", "2024-01-02"):
+                client.get(f"/api/days/{day}/full")
+            assert cached_dates() == {"2024-01-01", "2024-01-02"}
+
+        warm()
+        hits = meals.day_cache.hits
+        first = client.get("/api/days/2024-01-01/full").json()
+        assert meals.day_cache.hits == hits + 1
+        assert first["totals"]["kcal"] == 130
+
+        mutations = [
+            lambda: client.patch(
+                f"/api/entries/{entry['id']}", json={"quantity_g": 200}
+            ),
+            lambda: client.patch("/api/meals/1", json={"name": "Lunch"}),
+            lambda: client.post(
+                "/api/entries", json={"meal_id": 1, "fdc_id": 1, "quantity_g": 50}
+            ),
+            lambda: client.delete(f"/api/entries/{entry['id']}"),
+        ]
+        for mutate in mutations:
+            warm()
+            assert mutate().status_code == 200
+            assert cached_dates() == {"2024-01-02"}
+
+        assert client.get("/api/days/2024-01-01/full").json()["totals"]["kcal"] == 65
+
+        warm()
+        resp = client.post(
+            "/api/meals/1/copy_to", json={"date": "2024-01-03", "meal_name": "Meal 1"}
+        )
+        assert resp.status_code == 201
+        assert cached_dates() == {"2024-01-01", "2024-01-02"}
+
+        preset = client.post(
+            "/api/presets", json={"name": "Rice", "items": [{"fdc_id": 1, "grams": 10}]}
+        ).json()
+        warm()
+        client.post(
+            f"/api/presets/{preset['id']}/apply",
+            json={"date": "2024-01-02", "meal_name": "Meal 1"},
+        )
+        assert cached_dates() == {"2024-01-01"}
+
+        bar = {
+            "description": "Bar",
+            "kcal_per_100g": 400,
+            "protein_g_per_100g": 10,
+            "carb_g_per_100g": 60,
+            "fat_g_per_100g": 15,
+        }
+        custom = client.post("/api/custom_foods", json=bar).json()
+        client.post(
+            "/api/entries",
+            json={"meal_id": 2, "fdc_id": custom["fdc_id"], "quantity_g": 50},
+        )
+        warm()
+        client.patch(
+            f"/api/custom_foods/{custom['fdc_id']}", json={"kcal_per_100g": 200}
+        )
+        assert cached_dates() == {"2024-01-01"}
+        day = client.get("/api/days/2024-01-02/full").json()
+        assert day["totals"]["kcal"] == 113
+
+    app.app.dependency_overrides.clear()
@@ -0,0 +1,99 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db
+from server.models import Food, Meal
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+def test_day_and_history_etags():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(
+                Food(
+                    fdc_id=1,
+                    description="Rice",
+                    kcal_per_100g=130,
+                    protein_g_per_100g=2.5,
+                    carb_g_per_100g=28,
+                    fat_g_per_100g=0.3,
+                )
+            )
+            session.add(Meal(id=1, date="2024-01-01", name="Meal 1", sort_order=1))
+            session.add(Meal(id=2, date="2024-01-02", name="Meal 1", sort_order=1))
+            session.commit()
+        client.post("/api/entries", json={"meal_id": 1, "fdc_id": 1, "quantity_g": 100})
+
+        day_url = "/api/days/2024-01-01/full"
+        history = {"start_date": "2024-01-01", "end_date": "2024-01-03"}
+        resp = client.get(day_url)
+        tag = resp.headers["ETag"]
+        hist_tag = client.get("/api/history", params=history).headers["ETag"]
+        assert client.get(day_url, params={"nutrients": "fiber"}).headers[
+            "ETag"
+        ] not in (tag, hist_tag)
+
+        statements = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def record(conn, cursor, statement, *args):
+            statements.append(statement.lower())
+
+        resp = client.get(day_url, headers={"If-None-Match": tag})
+        assert resp.status_code == 304
+        assert resp.headers["ETag"] == tag and resp.content == b""
+        resp = client.get(
+            "/api/history", params=history, headers={"If-None-Match": hist_tag}
+        )
+        assert resp.status_code == 304
+        assert statements and not any(
+            t in s for s in statements for t in ("foodentry", "meal", "food ")
+        )
+        event.remove(engine, "before_cursor_execute", record)
+
+        # Another day's change leaves this day alone, but not the range
+        client.post("/api/entries", json={"meal_id": 2, "fdc_id": 1, "quantity_g": 50})
+        assert client.get(day_url, headers={"If-None-Match": tag}).status_code == 304
+        resp = client.get(
+            "/api/history", params=history, headers={"If-None-Match": hist_tag}
+        )
+        assert resp.status_code == 200
+
+        client.patch("/api/meals/1", json={"name": "Breakfast"})
+        resp = client.get(day_url, headers={"If-None-Match": tag})
+        assert resp.status_code == 200
+        assert resp.json()["meals"][0]["name"] == "Breakfast"
+        tag = resp.headers["ETag"]
+
+        client.put("/api/water/2024-01-01", json={"milliliters": 500})
+        hist_tag = client.get("/api/history", params=history).headers["ETag"]
+        client.put("/api/water/2024-01-03", json={"milliliters": 250})
+        resp = client.get(
+            "/api/history", params=history, headers={"If-None-Match": hist_tag}
+        )
+        assert resp.status_code == 200
+        assert resp.json()[2]["water"] == 250.0
@@ -1,4 +1,105 @@
-from server.utils import extract_macros_from_fdc
+import json
+from pathlib import Path
+
+from server.utils import (
+    MacroTotals,
+    _compute_calories,
+    _parse_label_nutrients,
+    _resolve_fiber,
+    _to_float,
+    extract_macros_from_fdc,
+    extract_macros_many,
+)
+
+HERE = Path(__file__).resolve().parent
+
+
+def legacy_extract_macros_from_fdc(data: dict) -> MacroTotals:
+    """The if/elif implementation replaced by the dispatch table, as reference."""
+    out: MacroTotals = {"kcal": 0.0, "protein": 0.0, "carb": 0.0, "fat": 0.0}
+    sugars = starch = fiber_total = fiber_sol = fiber_ins = fiber_any = None
+    water = ash = alcohol = None
+    lbl = (data or {}).get("labelNutrients") or None
+    if lbl:
+        fiber_total, sugars = _parse_label_nutrients(lbl, out)
+    for n in data.get("foodNutrients") or []:
+        amt = n.get("amount")
+        if amt is None:
+            continue
+        nut = n.get("nutrient") or {}
+        name = (nut.get("name") or n.get("name") or "").strip().lower()
+        num_raw = (
+            nut.get("number")
+            or n.get("nutrientNumber")
+            or n.get("nutrientId")
+            or nut.get("id")
+        )
+        num = None
+        if num_raw is not None:
+            try:
+                num = int(float(str(num_raw)))
+            except Exception:
+                num = None
+        a = _to_float(amt)
+        if num == 1003 or "protein" in name:
+            out["protein"] = a
+        elif num in (1004, 1293) or "fat" in name and "trans" not in name:
+            out["fat"] = a
+        elif num == 1005 or "carbohydrate" in name:
+            out["carb"] = a
+        elif num == 1008 or "energy" in name:
+            out["kcal"] = a
+        elif num == 2000 or "sugar" in name:
+            sugars = a
+        elif num == 2001 or "starch" in name:
+            starch = a
+        elif num in (1079, 1082, 1056, 1057) or "fiber" in name:
+            if "total" in name:
+                fiber_total = a
+            elif "soluble" in name:
+                fiber_sol = a
+            elif "insoluble" in name:
+                fiber_ins = a
+            else:
+                fiber_any = a
+        elif num == 1051 or "water" in name:
+            water = a
+        elif num == 1001 or "ash" in name:
+            ash = a
+        elif num == 1005 or "alcohol" in name:
+            alcohol = a
+    fiber = _resolve_fiber(fiber_total, fiber_sol, fiber_ins, fiber_any)
+    if (out["carb"] or 0.0) == 0.0:
+        comp_sum = sum(x for x in (sugars, starch, fiber) if x is not None)
+        if comp_sum:
+            out["carb"] = comp_sum
+    if (out["carb"] or 0.0) == 0.0 and (water is not None and ash is not None):
+        out["carb"] = max(
+            0.0,
+            100.0
+            - (water or 0.0)
+            - (out["protein"] or 0.0)
+            - (out["fat"] or 0.0)
+            - (ash or 0.0)
+            - (alcohol or 0.0),
+        )
+    if (out["kcal"] or 0.0) == 0.0:
+        _compute_calories(out, fiber)
+    for k in out:
+        out[k] = _to_float(out[k])
+    return out
+
+
+def load_foods(paths):
+    foods = []
+    for path in paths:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if "foodNutrients" in data or "fdcId" in data:
+            foods.append(data)
+        else:
+            for value in data.values():
+                foods.extend(value)
+    return foods
 
 
 def test_extract_macros_empty():
@@ -38,3 +139,31 @@ def test_extract_macros_odd_nutrient_numbers():
     assert macros["fat"] == 5
     assert macros["carb"] == 20
     assert macros["kcal"] == 165.0
+
+
+def test_extract_macros_matches_legacy_implementation():
+    fixture = HERE / "fixtures" / "fdc_foundation_sample.json"
+    foods = load_foods(sorted((HERE.parent / "logs").glob("*.json")) + [fixture])
+    foods += [
+        {"labelNutrients": {"fat": {"value": 3}, "sugars": {"value": 4}}},
+        {
+            "labelNutrients": {"calories": {"value": 50}},
+            "foodNutrients": [
+                {"nutrient": {"name": "Fatty acids, total trans"}, "amount": 1},
+                {"nutrient": {"name": "Fiber, soluble"}, "amount": 2},
+                {"nutrient": {"name": "Fiber, insoluble"}, "amount": 3},
+                {"nutrient": {"name": "Water"}, "amount": 80},
+                {"nutrient": {"name": "Ash"}, "amount": 1},
+                {"nutrient": {"name": "Alcohol, ethyl"}, "amount": 2},
+                {"nutrient": {"id": 1008, "name": "Protein"}, "amount": 7},
+                {"nutrientId": True, "amount": 5},
+                {"nutrientNumber": 1.0, "name": "Energy", "amount": "bad"},
+                {"nutrientNumber": "x", "name": "Starch", "amount": None},
+            ],
+        },
+        {"foodNutrients": [{"nutrientNumber": 1082, "amount": 4}]},
+    ]
+    expected = [legacy_extract_macros_from_fdc(f) for f in foods]
+    assert extract_macros_many(foods) == expected
+    # Second pass is served from the memoised classifications
+    assert extract_macros_many(foods) == expected
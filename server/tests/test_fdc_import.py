@@ -0,0 +1,154 @@
+import asyncio
+import io
+import json
+import os
+from pathlib import Path
+
+os.environ["USDA_KEY"] = "test"
+
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db, fdc_import, nutrients, utils
+from server.models import FdcFood, Food
+from server.portions import get_portions
+from server.utils import ensure_food_cached, extract_macros_from_fdc
+
+FIXTURE = Path(__file__).parent / "fixtures" / "fdc_foundation_sample.json"
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+def test_iter_json_foods_streams_across_chunks(monkeypatch):
+    monkeypatch.setattr(fdc_import, "_READ_SIZE", 7)
+    with open(FIXTURE, encoding="utf-8") as fp:
+        foods = list(fdc_import._iter_json_foods(fp))
+    assert [f["fdcId"] for f in foods] == [900001, 900002, 900003]
+    assert list(fdc_import._iter_json_foods(io.StringIO('{"Foods": []}'))) == []
+
+
+def test_import_json_release_matches_extract_macros(monkeypatch):
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(fdc_import, "BATCH_SIZE", 2)
+    assert fdc_import.import_fdc(FIXTURE, engine) == 3
+    raw = json.loads(FIXTURE.read_text())["FoundationFoods"]
+    with Session(engine) as session:
+        for data in raw:
+            row = session.get(FdcFood, data["fdcId"])
+            macros = extract_macros_from_fdc(data)
+            assert row.description == data["description"]
+            assert row.kcal_per_100g == macros["kcal"]
+            assert row.protein_g_per_100g == macros["protein"]
+            assert row.carb_g_per_100g == macros["carb"]
+
+
+def test_import_csv_release(tmp_path):
+    (tmp_path / "nutrient.csv").write_text(
+        "id,name,unit_name,nutrient_nbr,rank\n"
+        "1003,Protein,G,203,600\n"
+        "1004,Total lipid (fat),G,204,800\n"
+        '1005,"Carbohydrate, by difference",G,205,1110\n'
+        "1008,Energy,KCAL,208,300\n"
+        '1079,"Fiber, total dietary",G,291,1200\n'
+        '1093,"Sodium, Na",MG,307,5800\n'
+        '1162,"Vitamin C, total ascorbic acid",MG,401,6300\n'
+    )
+    (tmp_path / "food.csv").write_text(
+        "fdc_id,data_type,description,food_category_id,publication_date\n"
+        "1,branded_food,Peanut Butter,16,2020-01-01\n"
+        "2,foundation_food,Orange,9,2020-01-01\n"
+    )
+    (tmp_path / "food_nutrient.csv").write_text(
+        "id,fdc_id,nutrient_id,amount\n"
+        "10,2,1162,53.2\n"
+        "11,1,1003,25\n"
+        "12,2,1005,11.8\n"
+        "13,1,1004,50\n"
+        "14,2,1003,0.9\n"
+        "15,1,1008,588\n"
+        "16,1,1079,6\n"
+        "17,1,1093,430\n"
+    )
+    (tmp_path / "branded_food.csv").write_text(
+        "fdc_id,brand_owner,serving_size,serving_size_unit,household_serving_fulltext\n"
+        "1,Acme,32,g,2 Tbsp\n"
+    )
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    assert fdc_import.import_fdc(tmp_path, engine) == 2
+    with Session(engine) as session:
+        pb = session.get(FdcFood, 1)
+        assert pb.brand_owner == "Acme"
+        assert (pb.kcal_per_100g, pb.protein_g_per_100g, pb.fat_g_per_100g) == (
+            588,
+            25,
+            50,
+        )
+        orange = session.get(FdcFood, 2)
+        assert orange.carb_g_per_100g == 11.8
+        assert orange.protein_g_per_100g == 0.9
+        assert orange.portions is None
+
+        # The stored vector and serving come along when the food is used
+        food = asyncio.run(ensure_food_cached(1, session))
+        assert food.kcal_per_100g == 588
+        vector = nutrients.load_vectors(session, [1])[1]
+        assert vector[nutrients.INDEX["fiber"]] == 6
+        assert vector[nutrients.INDEX["sodium"]] == 430
+        assert [(p.name, p.gram_weight) for p in get_portions(session, 1)] == [
+            ("2 Tbsp", 32)
+        ]
+
+
+def test_ensure_food_cached_uses_imported_copy(monkeypatch):
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    fdc_import.import_fdc(FIXTURE, engine)
+
+    async def no_network(*args, **kwargs):
+        raise AssertionError("USDA should not be called")
+
+    monkeypatch.setattr(utils, "fetch_food_detail", no_network)
+    monkeypatch.setattr(utils, "fetch_foods_detail", no_network)
+    with Session(engine) as session:
+        food = asyncio.run(ensure_food_cached(900001, session))
+        assert food.description == "Yogurt, Greek, plain, nonfat"
+        foods = asyncio.run(utils.ensure_foods_cached([900002, 900003], session))
+        assert foods[900003].kcal_per_100g == 379
+        assert session.get(Food, 900002) is not None
+
+
+def test_foods_search_answers_from_imported_copy_offline(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    monkeypatch.setattr(utils, "USDA_OFFLINE", True)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        fdc_import.import_fdc(FIXTURE, engine)
+        resp = client.get("/api/foods/search", params={"q": "greek yogurt"})
+        assert resp.status_code == 200
+        assert [r["fdcId"] for r in resp.json()["results"]] == [900001]
+        resp = client.get(
+            "/api/foods/search", params={"q": "o", "dataType": "SR Legacy"}
+        )
+        assert [r["fdcId"] for r in resp.json()["results"]] == [900003]
+        detail = client.get("/api/foods/900002")
+        assert detail.status_code == 200
+        assert detail.json()["protein_g_per_100g"] == 22.5
+        assert client.get("/api/foods/12345").status_code == 404
@@ -0,0 +1,68 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db, usda, utils
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+def test_foods_get_resolves_food_in_one_usda_request(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    calls = []
+
+    async def fake_get(url, **kwargs):
+        calls.append(str(url))
+        payload = {
+            "fdcId": 555,
+            "descriptionShort": "Oats",
+            "brandOwner": "Acme",
+            "dataCategory": "Branded",
+            "foodNutrients": [
+                {"nutrient": {"number": "203", "name": "Protein"}, "amount": 13},
+                {
+                    "nutrient": {"number": "204", "name": "Total lipid (fat)"},
+                    "amount": 7,
+                },
+                {"nutrient": {"number": "205", "name": "Carbohydrate"}, "amount": 68},
+                {"nutrient": {"number": "208", "name": "Energy"}, "amount": 379},
+            ],
+        }
+        return httpx.Response(200, json=payload, request=httpx.Request("GET", url))
+
+    monkeypatch.setattr(usda, "get", fake_get)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        resp = client.get("/api/foods/555", params={"refresh": True})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert len(calls) == 1
+        assert data["description"] == "Oats"
+        assert data["brand_owner"] == "Acme"
+        assert data["data_type"] == "Branded"
+        assert data["kcal_per_100g"] == 379
+        assert data["protein_g_per_100g"] == 13
+        assert data["fat_g_per_100g"] == 7
+        assert data["carb_g_per_100g"] == 68
+        assert data["fetched_at"] is not None
@@ -1,6 +1,5 @@
 from importlib import reload
 
-import httpx
 from fastapi.testclient import TestClient
 from sqlalchemy.pool import StaticPool
 from sqlmodel import Session, SQLModel, create_engine
@@ -50,21 +49,7 @@ def test_foods_get_handles_malformed_nutrients(tmp_path, monkeypatch):
             ],
         }
 
-    class DummyAsyncClient:
-        def __init__(self, *args, **kwargs):
-            pass
-
-        async def __aenter__(self):
-            return self
-
-        async def __aexit__(self, exc_type, exc, tb):
-            pass
-
-        async def get(self, *args, **kwargs):
-            raise httpx.RequestError("boom")
-
     monkeypatch.setattr(foods, "fetch_food_detail", fake_fetch_food_detail)
-    monkeypatch.setattr(httpx, "AsyncClient", DummyAsyncClient)
 
     with TestClient(app.app) as client:
         SQLModel.metadata.create_all(engine)
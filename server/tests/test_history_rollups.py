@@ -0,0 +1,192 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+from datetime import date
+
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from server import app, daily_totals, db
+from server.models import BodyWeight, Food, FoodEntry, Meal, PeriodTotals, WaterIntake
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+def log(session, day, grams):
+    meal = Meal(date=day, name="Meal 1", sort_order=1)
+    session.add(meal)
+    session.flush()
+    session.add(FoodEntry(meal_id=meal.id, fdc_id=1, quantity_g=grams, sort_order=1))
+
+
+def test_period_bounds():
+    assert daily_totals.period_bounds(date(2024, 2, 14), "week") == (
+        date(2024, 2, 12),
+        date(2024, 2, 18),
+    )
+    assert daily_totals.period_bounds(date(2024, 2, 14), "month") == (
+        date(2024, 2, 1),
+        date(2024, 2, 29),
+    )
+    assert daily_totals.period_bounds(date(2024, 12, 31), "month")[1] == date(
+        2024, 12, 31
+    )
+
+
+def test_monthly_history_uses_cached_rollups():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(
+                Food(
+                    fdc_id=1,
+                    description="Rice",
+                    kcal_per_100g=100,
+                    protein_g_per_100g=2,
+                    carb_g_per_100g=20,
+                    fat_g_per_100g=1,
+                )
+            )
+            log(session, "2024-01-10", 100)
+            log(session, "2024-01-20", 300)
+            log(session, "2024-02-05", 200)
+            session.add_all(
+                [
+                    BodyWeight(date="2024-01-10", weight=80),
+                    BodyWeight(date="2024-01-20", weight=79),
+                    WaterIntake(date="2024-01-10", milliliters=1000),
+                ]
+            )
+            session.commit()
+
+        params = {
+            "start_date": "2024-01-01",
+            "end_date": "2024-02-10",
+            "granularity": "month",
+        }
+        data = client.get("/api/history", params=params).json()
+        assert data == [
+            {
+                "start": "2024-01-01",
+                "end": "2024-01-31",
+                "days": 31,
+                "logged_days": 2,
+                "totals": {
+                    "kcal": 400.0,
+                    "protein": 8.0,
+                    "carb": 80.0,
+                    "fat": 4.0,
+                    "water": 1000.0,
+                },
+                "averages": {
+                    "kcal": 200.0,
+                    "protein": 4.0,
+                    "carb": 40.0,
+                    "fat": 2.0,
+                    "water": 1000.0,
+                },
+                "weight": 79.5,
+            },
+            {
+                "start": "2024-02-01",
+                "end": "2024-02-10",
+                "days": 10,
+                "logged_days": 1,
+                "totals": {
+                    "kcal": 200.0,
+                    "protein": 4.0,
+                    "carb": 40.0,
+                    "fat": 2.0,
+                    "water": 0.0,
+                },
+                "averages": {
+                    "kcal": 200.0,
+                    "protein": 4.0,
+                    "carb": 40.0,
+                    "fat": 2.0,
+                    "water": 0.0,
+                },
+                "weight": None,
+            },
+        ]
+        with Session(engine) as session:
+            rows = session.exec(select(PeriodTotals)).all()
+            # Only the closed, fully covered month is cached
+            assert [(r.granularity, r.start) for r in rows] == [("month", "2024-01-01")]
+
+        client.post("/api/entries", json={"meal_id": 1, "fdc_id": 1, "quantity_g": 50})
+        with Session(engine) as session:
+            assert session.exec(select(PeriodTotals)).all() == []
+        data = client.get("/api/history", params=params).json()
+        assert data[0]["totals"]["kcal"] == 450.0
+
+        weekly = client.get(
+            "/api/history",
+            params={
+                "start_date": "2024-01-08",
+                "end_date": "2024-01-21",
+                "granularity": "week",
+            },
+        ).json()
+        assert [(w["start"], w["totals"]["kcal"]) for w in weekly] == [
+            ("2024-01-08", 150.0),
+            ("2024-01-15", 300.0),
+        ]
+
+        resp = client.get("/api/history", params={**params, "granularity": "year"})
+        assert resp.status_code == 400
+
+
+def test_days_with_only_empty_meals_are_not_logged():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(
+                Food(
+                    fdc_id=1,
+                    description="Rice",
+                    kcal_per_100g=100,
+                    protein_g_per_100g=2,
+                    carb_g_per_100g=20,
+                    fat_g_per_100g=1,
+                )
+            )
+            log(session, "2026-09-07", 2000)
+            session.commit()
+        # Opening a day in the web client creates its empty meals
+        for _ in range(4):
+            client.post("/api/meals", json={"date": "2026-09-08"})
+
+        params = {
+            "start_date": "2026-09-07",
+            "end_date": "2026-09-13",
+            "granularity": "week",
+        }
+        for _ in range(2):
+            (week,) = client.get("/api/history", params=params).json()
+            assert week["logged_days"] == 1
+            assert week["averages"]["kcal"] == 2000
+
+    app.app.dependency_overrides.clear()
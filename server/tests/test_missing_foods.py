@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db, utils
+from server.models import Favorite, MissingFood
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    utils.missing_cache.clear()
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    utils.missing_cache.clear()
+
+
+def test_missing_food_is_not_requested_again(engine, monkeypatch):
+    calls = []
+
+    async def fake_fetch(fdc_id):
+        calls.append(fdc_id)
+        raise HTTPException(status_code=404, detail="USDA error 404: not found")
+
+    monkeypatch.setattr(utils, "fetch_food_detail", fake_fetch)
+
+    async def run():
+        with Session(engine) as session:
+            for _ in range(3):
+                with pytest.raises(HTTPException) as exc:
+                    await utils.ensure_food_cached(404404, session)
+                assert exc.value.status_code == 404
+
+    asyncio.run(run())
+    assert calls == [404404]
+
+    # Persisted, so a cold in-memory cache still fails fast
+    utils.missing_cache.clear()
+    asyncio.run(run())
+    assert calls == [404404]
+
+
+def test_batch_path_records_and_skips_missing_ids(engine, monkeypatch):
+    calls = []
+
+    async def fake_fetch_many(ids):
+        calls.append(list(ids))
+        return {}
+
+    monkeypatch.setattr(utils, "fetch_foods_detail", fake_fetch_many)
+
+    async def run():
+        with Session(engine) as session:
+            for _ in range(2):
+                with pytest.raises(HTTPException) as exc:
+                    await utils.ensure_foods_cached([7, 8], session)
+                assert exc.value.status_code == 404
+
+    asyncio.run(run())
+    assert calls == [[7, 8]]
+
+
+def test_missing_entries_expire(engine):
+    with Session(engine) as session:
+        old = datetime.utcnow() - utils.MISSING_TTL - timedelta(minutes=1)
+        session.add(MissingFood(fdc_id=1, checked_at=old))
+        session.add(MissingFood(fdc_id=2, checked_at=datetime.utcnow()))
+        session.commit()
+        assert utils.known_missing(session, [1, 2, 3]) == [2]
+
+
+def test_batch_keeps_found_foods_when_some_are_missing(engine, monkeypatch):
+    async def fake_fetch_many(ids):
+        return {7: {"fdcId": 7, "description": "Found"}}
+
+    monkeypatch.setattr(utils, "fetch_foods_detail", fake_fetch_many)
+
+    async def run():
+        with Session(engine) as session:
+            with pytest.raises(HTTPException):
+                await utils.ensure_foods_cached([7, 8], session)
+            assert utils.known_missing(session, [7, 8]) == [8]
+            foods = await utils.ensure_foods_cached([7], session)
+            assert foods[7].description == "Found"
+
+    asyncio.run(run())
+
+
+def test_missing_food_does_not_commit_callers_favorite(engine, monkeypatch):
+    async def fake_fetch(fdc_id):
+        raise HTTPException(status_code=404, detail="USDA error 404: not found")
+
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    monkeypatch.setattr(utils, "fetch_food_detail", fake_fetch)
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session
+    with TestClient(app.app) as client:
+        for _ in range(2):
+            resp = client.post("/api/favorites", json={"fdc_id": 404404})
+            assert resp.status_code == 404
+    app.app.dependency_overrides.clear()
+
+    with Session(engine) as session:
+        assert session.get(Favorite, 404404) is None
+        assert session.get(MissingFood, 404404) is not None
+
+
+def test_record_missing_leaves_callers_session_alone(engine):
+    with Session(engine) as session:
+        session.add(Favorite(fdc_id=5))
+        utils.record_missing(session, [5])
+        session.rollback()
+    with Session(engine) as session:
+        assert session.get(Favorite, 5) is None
+        assert session.get(MissingFood, 5) is not None
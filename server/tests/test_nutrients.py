@@ -0,0 +1,114 @@
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db, nutrients, utils
+from server.models import Food, FoodEntry, FoodNutrients, Meal
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+PAYLOAD = {
+    "fdcId": 10,
+    "description": "Bran flakes",
+    "foodNutrients": [
+        {"nutrient": {"id": 1003, "name": "Protein"}, "amount": 10},
+        {"nutrient": {"id": 1004, "name": "Total lipid (fat)"}, "amount": 2},
+        {"nutrient": {"id": 1005, "name": "Carbohydrate"}, "amount": 80},
+        {"nutrient": {"id": 1008, "name": "Energy"}, "amount": 350},
+        {"nutrient": {"id": 1079, "name": "Fiber, total dietary"}, "amount": 18},
+        {"nutrient": {"id": 2000, "name": "Sugars, total"}, "amount": 16},
+        {"nutrient": {"id": 1093, "name": "Sodium, Na"}, "amount": 600},
+    ],
+}
+
+
+def test_nutrient_vector_is_stored_and_packed_in_fixed_order():
+    assert utils.extract_nutrients_from_fdc(PAYLOAD) == [350, 10, 80, 2, 18, 16, 600]
+    blob = nutrients.pack([1.0, 2.0])
+    assert nutrients.unpack(blob) == [1.0, 2.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        utils.save_fdc_food(session, 10, PAYLOAD)
+        row = session.get(FoodNutrients, 10)
+        assert len(row.vector) == 8 * len(nutrients.NUTRIENTS)
+        assert nutrients.load_vectors(session, [10, 11]) == {
+            10: [350, 10, 80, 2, 18, 16, 600]
+        }
+
+
+def test_day_history_and_export_sum_requested_nutrients():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            utils.save_fdc_food(session, 10, PAYLOAD)
+            session.add(
+                Food(
+                    fdc_id=-1,
+                    description="Homemade",
+                    data_type="Custom",
+                    kcal_per_100g=100,
+                    protein_g_per_100g=1,
+                    carb_g_per_100g=1,
+                    fat_g_per_100g=1,
+                )
+            )
+            meal = Meal(date="2024-03-01", name="Meal 1", sort_order=1)
+            session.add(meal)
+            session.commit()
+            session.add(
+                FoodEntry(meal_id=meal.id, fdc_id=10, quantity_g=50, sort_order=1)
+            )
+            session.add(
+                FoodEntry(meal_id=meal.id, fdc_id=-1, quantity_g=100, sort_order=2)
+            )
+            session.commit()
+
+        params = {"nutrients": "fiber,sodium,kcal"}
+        day = client.get("/api/days/2024-03-01", params=params).json()
+        assert day["totals"]["kcal"] == 275
+        assert day["nutrients"] == {"fiber": 9.0, "sodium": 300.0}
+        assert client.get("/api/days/2024-03-01").json()["nutrients"] is None
+
+        full = client.get("/api/days/2024-03-01/full", params=params).json()
+        assert full["totals"]["sodium"] == 300.0
+        assert full["meals"][0]["subtotal"]["fiber"] == 9.0
+        assert full["meals"][0]["entries"][1]["fiber"] == 0.0
+
+        history = client.get(
+            "/api/history",
+            params={
+                "start_date": "2024-03-01",
+                "end_date": "2024-03-01",
+                "nutrients": "sugar",
+            },
+        ).json()
+        assert history[0]["sugar"] == 8.0
+
+        csv_text = client.get(
+            "/api/export",
+            params={"start": "2024-03-01", "end": "2024-03-01", "nutrients": "fiber"},
+        ).text
+        lines = csv_text.strip().splitlines()
+        assert lines[0].endswith(",fat,fiber")
+        assert lines[1].endswith(",9.0")
+
+        bad = client.get("/api/days/2024-03-01", params={"nutrients": "iron"})
+        assert bad.status_code == 400
@@ -0,0 +1,145 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+from datetime import date
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from server import app, db, usda, utils
+from server.models import FoodPayload, FoodPortion, Meal
+from server.portions import extract_portions_from_fdc
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+BREAD = {
+    "fdcId": 700,
+    "description": "Bread, whole wheat",
+    "dataType": "SR Legacy",
+    "foodNutrients": [
+        {"nutrient": {"number": "208", "name": "Energy"}, "amount": 250},
+        {"nutrient": {"number": "203", "name": "Protein"}, "amount": 12},
+    ],
+    "foodPortions": [
+        {
+            "amount": 1,
+            "modifier": "slice",
+            "measureUnit": {"name": "undetermined"},
+            "gramWeight": 32,
+        },
+        {"amount": 2, "measureUnit": {"name": "cup"}, "gramWeight": 90},
+        {"portionDescription": "1 roll", "amount": 3, "gramWeight": 60},
+        {"amount": 1, "modifier": "9000", "gramWeight": 0},
+    ],
+}
+
+
+def test_extract_portions_from_fdc():
+    assert extract_portions_from_fdc(BREAD) == [
+        {"name": "slice", "amount": 1.0, "gram_weight": 32.0},
+        {"name": "cup", "amount": 2.0, "gram_weight": 90.0},
+        {"name": "1 roll", "amount": 1.0, "gram_weight": 60.0},
+    ]
+    branded = {
+        "householdServingFullText": "2 cookies",
+        "servingSize": 28,
+        "servingSizeUnit": "g",
+    }
+    assert extract_portions_from_fdc(branded) == [
+        {"name": "2 cookies", "amount": 1.0, "gram_weight": 28.0}
+    ]
+    assert extract_portions_from_fdc({**branded, "servingSizeUnit": "ml"}) == []
+
+
+def test_log_entry_by_portion(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+
+    async def fake_get(url, **kwargs):
+        return httpx.Response(200, json=BREAD, request=httpx.Request("GET", url))
+
+    monkeypatch.setattr(usda, "get", fake_get)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            meal = Meal(date=date(2024, 1, 1).isoformat(), name="Meal 1", sort_order=1)
+            session.add(meal)
+            session.commit()
+            meal_id = meal.id
+
+        resp = client.get("/api/foods/700/portions")
+        assert resp.status_code == 200
+        by_name = {p["name"]: p for p in resp.json()}
+        assert set(by_name) == {"slice", "cup", "1 roll"}
+        slice_id, cup_id = by_name["slice"]["id"], by_name["cup"]["id"]
+
+        resp = client.post(
+            "/api/entries",
+            json={
+                "meal_id": meal_id,
+                "fdc_id": 700,
+                "portion_id": slice_id,
+                "portion_count": 2,
+            },
+        )
+        assert resp.status_code == 200
+        entry = resp.json()
+        assert entry["quantity_g"] == 64.0
+        assert entry["portion_id"] == slice_id
+
+        resp = client.patch(f"/api/entries/{entry['id']}", json={"portion_id": cup_id})
+        assert resp.json()["quantity_g"] == 45.0
+
+        resp = client.patch(f"/api/entries/{entry['id']}", json={"portion_count": 4})
+        assert resp.json()["quantity_g"] == 180.0
+
+        day = client.get("/api/days/2024-01-01/full").json()
+        row = day["meals"][0]["entries"][0]
+        assert row["portion_name"] == "cup"
+        assert row["portion_count"] == 4.0
+        assert row["kcal"] == 450.0
+
+        resp = client.post(
+            "/api/entries", json={"meal_id": meal_id, "fdc_id": 700, "portion_id": 999}
+        )
+        assert resp.status_code == 404
+        resp = client.post("/api/entries", json={"meal_id": meal_id, "fdc_id": 700})
+        assert resp.status_code == 422
+
+
+def test_portions_backfilled_from_stored_payload():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            utils.save_fdc_food(session, 700, BREAD)
+            for p in session.exec(select(FoodPortion)).all():
+                session.delete(p)
+            session.commit()
+            assert session.exec(select(FoodPayload)).first() is not None
+
+        resp = client.get("/api/foods/700/portions")
+        assert resp.status_code == 200
+        assert [p["name"] for p in resp.json()] == ["slice", "cup", "1 roll"]
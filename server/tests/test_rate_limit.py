@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+
+from server import usda
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(**kwargs):
+    clock = FakeClock()
+    sleeps = []
+
+    async def sleep(delay):
+        sleeps.append(delay)
+        clock.now += delay
+
+    limiter = usda.RateLimiter(clock=clock, sleep=sleep, **kwargs)
+    return limiter, clock, sleeps
+
+
+def test_background_requests_leave_reserve_for_interactive():
+    limiter, clock, sleeps = make_limiter(limit=10, period=10, reserve=0.5)
+
+    async def run():
+        for _ in range(5):
+            await limiter.acquire(usda.BACKGROUND)
+        assert sleeps == []
+        # Only the reserve is left: background waits for a refill...
+        await limiter.acquire(usda.BACKGROUND)
+        assert sleeps == [1.0]
+        # ...while interactive requests spend the reserve immediately.
+        for _ in range(5):
+            await limiter.acquire(usda.INTERACTIVE)
+        assert sleeps == [1.0]
+
+    asyncio.run(run())
+
+
+def test_low_priority_context_marks_requests_as_background():
+    limiter, clock, sleeps = make_limiter(limit=4, period=4, reserve=0.5)
+    limiter.tokens = 2.0
+
+    async def run():
+        with usda.low_priority():
+            await limiter.acquire()
+        assert sleeps == [1.0]
+        await limiter.acquire()
+        assert sleeps == [1.0]
+
+    asyncio.run(run())
+
+
+def test_headers_resync_bucket_and_429_pauses_requests():
+    limiter, clock, sleeps = make_limiter(limit=1000, period=3600)
+    ok = httpx.Response(
+        200, headers={"X-RateLimit-Limit": "3600", "X-RateLimit-Remaining": "7"}
+    )
+    limiter.observe(ok)
+    assert limiter.limit == 3600
+    assert limiter.tokens == 7
+
+    limited = httpx.Response(429, headers={"Retry-After": "30"})
+    limiter.observe(limited)
+    assert limiter.snapshot()["blocked_for"] == 30
+
+    asyncio.run(limiter.acquire(usda.INTERACTIVE))
+    assert sleeps[0] == 30
+    assert clock.now >= 30
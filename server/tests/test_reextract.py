@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from server import utils
+from server.models import Food, FoodPayload
+from server.reextract import reextract
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+PAYLOAD = {
+    "fdcId": 42,
+    "description": "Lentils",
+    "foodNutrients": [
+        {"nutrient": {"number": "203", "name": "Protein"}, "amount": 9},
+        {"nutrient": {"number": "204", "name": "Total lipid (fat)"}, "amount": 0.4},
+        {"nutrient": {"number": "205", "name": "Carbohydrate"}, "amount": 20},
+        {"nutrient": {"number": "208", "name": "Energy"}, "amount": 116},
+    ],
+}
+
+
+def test_fetched_payloads_are_stored_compressed():
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        food = utils.save_fdc_food(session, 42, PAYLOAD)
+        stored = session.exec(select(FoodPayload)).one()
+        assert stored.fdc_id == 42
+        assert stored.fetched_at == food.fetched_at
+        assert utils.unpack_payload(stored.data) == PAYLOAD
+        assert len(stored.data) < len(str(PAYLOAD))
+
+
+def test_reextract_recomputes_macros_from_latest_payload():
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        old = dict(PAYLOAD, description="Lentils (old)")
+        session.add(
+            FoodPayload(
+                fdc_id=42,
+                fetched_at=datetime.utcnow() - timedelta(days=60),
+                data=utils.pack_payload(old),
+            )
+        )
+        food = utils.save_fdc_food(session, 42, PAYLOAD)
+        # Simulate macros produced by an older extractor
+        food.protein_g_per_100g = 0.0
+        food.kcal_per_100g = 0.0
+        session.add(food)
+        # A food refreshed from the offline import after its last payload
+        session.add(
+            Food(
+                fdc_id=7,
+                description="Imported",
+                kcal_per_100g=1,
+                protein_g_per_100g=1,
+                fat_g_per_100g=1,
+                carb_g_per_100g=1,
+                fetched_at=datetime.utcnow() + timedelta(days=1),
+            )
+        )
+        session.add(
+            FoodPayload(
+                fdc_id=7, fetched_at=datetime.utcnow(), data=utils.pack_payload(PAYLOAD)
+            )
+        )
+        session.commit()
+
+    assert reextract(engine, batch_size=1) == 1
+
+    with Session(engine) as session:
+        food = session.get(Food, 42)
+        assert food.description == "Lentils"
+        assert food.protein_g_per_100g == 9
+        assert food.kcal_per_100g == 116
+        assert session.get(Food, 7).description == "Imported"
+
+
+def test_only_the_latest_payloads_are_kept(monkeypatch):
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+
+    def stored(session, fdc_id):
+        return session.exec(
+            select(FoodPayload.fetched_at).where(FoodPayload.fdc_id == fdc_id)
+        ).all()
+
+    with Session(engine) as session:
+        utils.save_fdc_food(session, 7, dict(PAYLOAD, fdcId=7))
+        for _ in range(3):
+            utils.save_fdc_food(session, 42, PAYLOAD)
+        latest = session.get(Food, 42).fetched_at
+        assert stored(session, 42) == [latest]
+        assert len(stored(session, 7)) == 1
+
+        monkeypatch.setattr(utils, "PAYLOAD_HISTORY", 2)
+        for _ in range(3):
+            utils.save_fdc_food(session, 42, PAYLOAD)
+        assert len(stored(session, 42)) == 2
+        assert session.get(Food, 42).fetched_at in stored(session, 42)
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import db, utils
+from server.models import Food
+from server.refresher import FoodRefresher
+from server.utils import ensure_food_cached
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def make_food(fdc_id, age_days, description="Old"):
+    return Food(
+        fdc_id=fdc_id,
+        description=description,
+        kcal_per_100g=10,
+        protein_g_per_100g=1,
+        fat_g_per_100g=1,
+        carb_g_per_100g=1,
+        fetched_at=datetime.utcnow() - timedelta(days=age_days),
+    )
+
+
+def test_stale_food_served_then_refreshed_in_background(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(make_food(1, 60))
+        session.commit()
+    calls = []
+
+    async def fake_fetch_many(ids):
+        calls.append(list(ids))
+        return {i: {"fdcId": i, "description": "New"} for i in ids}
+
+    monkeypatch.setattr(utils, "fetch_foods_detail", fake_fetch_many)
+
+    async def run():
+        refresher = FoodRefresher(workers=1)
+        refresher.start()
+        try:
+            with Session(engine) as session:
+                food = await ensure_food_cached(1, session)
+                assert food.description == "Old"
+                assert calls == []
+            await refresher.drain()
+        finally:
+            await refresher.stop()
+        assert utils.stale_refresher is None
+
+    asyncio.run(run())
+    assert calls == [[1]]
+    with Session(engine) as session:
+        assert session.get(Food, 1).description == "New"
+
+
+def test_sweep_queues_foods_close_to_expiry(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([make_food(1, 1), make_food(2, 28), make_food(-3, 90)])
+        session.commit()
+    calls = []
+
+    async def fake_fetch_many(ids):
+        calls.append(sorted(ids))
+        return {i: {"fdcId": i, "description": "New"} for i in ids}
+
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    monkeypatch.setattr(utils, "fetch_foods_detail", fake_fetch_many)
+
+    async def run():
+        refresher = FoodRefresher(workers=2, refresh_ahead=timedelta(days=3))
+        refresher.start()
+        try:
+            assert refresher.sweep() == 1
+            await refresher.drain()
+        finally:
+            await refresher.stop()
+
+    asyncio.run(run())
+    assert calls == [[2]]
+    with Session(engine) as session:
+        assert session.get(Food, 1).description == "Old"
+        assert session.get(Food, 2).description == "New"
+
+
+def test_first_sweep_runs_at_startup(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(make_food(4, 28))
+        session.commit()
+    calls = []
+
+    async def fake_fetch_many(ids):
+        calls.append(sorted(ids))
+        return {i: {"fdcId": i, "description": "New"} for i in ids}
+
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    monkeypatch.setattr(utils, "fetch_foods_detail", fake_fetch_many)
+
+    async def run():
+        refresher = FoodRefresher(workers=1, sweep_interval=3600)
+        refresher.start()
+        try:
+            await asyncio.sleep(0)
+            await refresher.drain()
+        finally:
+            await refresher.stop()
+
+    asyncio.run(run())
+    assert calls == [[4]]
@@ -0,0 +1,91 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db, utils
+from server.cache import TTLCache
+from server.routers import foods
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expiry_staleness_and_lru():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=10, stale_ttl=5, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == (1, False)
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    clock.now = 12
+    assert cache.get("a") == (1, True)
+    clock.now = 20
+    assert cache.get("a") is None
+    assert cache.stats() == {
+        "size": 1,
+        "maxsize": 2,
+        "hits": 1,
+        "stale_hits": 1,
+        "misses": 2,
+    }
+
+
+def test_foods_search_served_from_cache_and_revalidated(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    clock = FakeClock()
+    monkeypatch.setattr(
+        foods, "search_cache", TTLCache(ttl=10, stale_ttl=100, clock=clock)
+    )
+    calls = []
+
+    async def fake_search(q, dataType):
+        calls.append((q, dataType))
+        return {"results": [{"fdcId": len(calls), "description": q}]}
+
+    monkeypatch.setattr(foods, "_usda_search", fake_search)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        first = client.get("/api/foods/search", params={"q": "Greek  Yogurt"})
+        again = client.get("/api/foods/search", params={"q": "greek yogurt"})
+        assert first.json() == again.json()
+        assert len(calls) == 1
+
+        clock.now = 15
+        stale = client.get("/api/foods/search", params={"q": "greek yogurt"})
+        assert stale.json()["results"][0]["fdcId"] == 1
+        fresh = client.get("/api/foods/search", params={"q": "greek yogurt"})
+        assert len(calls) == 2
+        assert fresh.json()["results"][0]["fdcId"] == 2
+
+        stats = client.get("/api/foods/search/stats").json()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 2
+        assert stats["stale_hits"] == 1
@@ -0,0 +1,90 @@
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import search_index
+from server.models import Favorite, Food
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def make_food(fdc_id, description, brand=None, data_type="Custom"):
+    return Food(
+        fdc_id=fdc_id,
+        description=description,
+        brand_owner=brand,
+        data_type=data_type,
+        kcal_per_100g=1,
+        protein_g_per_100g=1,
+        fat_g_per_100g=1,
+        carb_g_per_100g=1,
+    )
+
+
+def search(session, q, *conditions):
+    return [f.fdc_id for f in search_index.search_foods(session, q, *conditions)]
+
+
+def test_build_match_query():
+    assert search_index.build_match_query('Chick "bre') == '"chick"* "bre"*'
+    assert search_index.build_match_query("  -- ") is None
+
+
+def test_triggers_keep_index_in_sync():
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        assert search_index.fts_available(session)
+        session.add_all(
+            [
+                make_food(-1, "Chicken breast, grilled"),
+                make_food(-2, "Chickpea salad", brand="Deli Co"),
+                make_food(3, "Chicken thigh", data_type="Foundation"),
+            ]
+        )
+        session.commit()
+        assert search(session, "chick bre") == [-1]
+        assert search(session, "deli") == [-2]
+        assert search(session, "chicken", Food.data_type == "Custom") == [-1]
+
+        session.add(Favorite(fdc_id=-2, alias="lunch bowl"))
+        food = session.get(Food, -1)
+        food.description = "Turkey breast"
+        session.commit()
+        assert search(session, "lunch") == [-2]
+        assert search(session, "turkey") == [-1]
+        assert search(session, "chicken breast") == []
+
+        session.delete(session.get(Favorite, -2))
+        session.delete(session.get(Food, 3))
+        session.commit()
+        assert search(session, "lunch") == []
+        assert search(session, "thigh") == []
+
+
+def test_existing_rows_are_backfilled():
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Simulate a database created before the index existed
+        for name in ("food_fts_ai", "food_fts_au", "food_fts_ad"):
+            conn.execute(text(f"DROP TRIGGER {name}"))
+        for name in ("favorite_fts_ai", "favorite_fts_au", "favorite_fts_ad"):
+            conn.execute(text(f"DROP TRIGGER {name}"))
+        conn.execute(text("DROP TABLE food_fts"))
+    with Session(engine) as session:
+        assert not search_index.fts_available(session)
+        session.add(make_food(-5, "Protein bar"))
+        session.add(Favorite(fdc_id=-5, alias="snack"))
+        session.commit()
+        # Without the index the LIKE fallback still answers
+        assert search(session, "snack") == [-5]
+    with engine.begin() as conn:
+        assert search_index.create_food_fts(conn)
+    with Session(engine) as session:
+        assert search(session, "snack") == [-5]
+        assert search(session, "prot") == [-5]
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import db, usda, utils
+from server.cache import TTLCache
+from server.models import Food
+from server.refresher import FoodRefresher
+from server.routers import foods
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def test_search_prefetch_warms_top_results_at_low_priority(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(
+            Food(
+                fdc_id=2,
+                description="Cached",
+                kcal_per_100g=1,
+                protein_g_per_100g=1,
+                fat_g_per_100g=1,
+                carb_g_per_100g=1,
+                fetched_at=datetime.utcnow(),
+            )
+        )
+        session.commit()
+    monkeypatch.setattr(utils, "USDA_KEY", "test")
+    monkeypatch.setattr(foods, "search_cache", TTLCache())
+
+    async def fake_search(q, dataType):
+        return {"results": [{"fdcId": i, "description": q} for i in (1, 2, 3, 4)]}
+
+    calls = []
+
+    async def fake_fetch_many(ids):
+        calls.append((list(ids), usda._priority.get()))
+        return {i: {"fdcId": i, "description": f"Food {i}"} for i in ids}
+
+    monkeypatch.setattr(foods, "_usda_search", fake_search)
+    monkeypatch.setattr(utils, "fetch_foods_detail", fake_fetch_many)
+
+    async def run():
+        refresher = FoodRefresher(workers=1)
+        refresher.start()
+        try:
+            with Session(engine) as session:
+                await foods.foods_search("apple", None, prefetch=0, session=session)
+                await refresher.drain()
+                assert calls == []
+                await foods.foods_search("apple", None, prefetch=3, session=session)
+                await refresher.drain()
+        finally:
+            await refresher.stop()
+
+    asyncio.run(run())
+    assert calls == [([1, 3], usda.BACKGROUND)]
+    with Session(engine) as session:
+        assert session.get(Food, 3).description == "Food 3"
+        assert session.get(Food, 4) is None
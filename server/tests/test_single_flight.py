@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import utils
+from server.models import Food
+from server.utils import ensure_food_cached, ensure_foods_cached
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def payload(fdc_id):
+    return {
+        "fdcId": fdc_id,
+        "description": f"Food {fdc_id}",
+        "labelNutrients": {"calories": {"value": 100}},
+    }
+
+
+def test_concurrent_callers_share_one_fetch(monkeypatch):
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    calls = []
+
+    async def slow_fetch(fdc_id):
+        calls.append(fdc_id)
+        await asyncio.sleep(0.01)
+        return payload(fdc_id)
+
+    async def slow_fetch_many(ids):
+        calls.extend(ids)
+        await asyncio.sleep(0.01)
+        return {i: payload(i) for i in ids}
+
+    monkeypatch.setattr(utils, "fetch_food_detail", slow_fetch)
+    monkeypatch.setattr(utils, "fetch_foods_detail", slow_fetch_many)
+
+    async def run():
+        sessions = [Session(engine) for _ in range(4)]
+        try:
+            a, b, batch, c = await asyncio.gather(
+                ensure_food_cached(5, sessions[0]),
+                ensure_food_cached(5, sessions[1]),
+                ensure_foods_cached([5, 6], sessions[2]),
+                ensure_food_cached(6, sessions[3]),
+            )
+            return [
+                a.description,
+                b.description,
+                batch[6].description,
+                c.description,
+            ]
+        finally:
+            for s in sessions:
+                s.close()
+
+    results = asyncio.run(run())
+    assert sorted(calls) == [5, 6]
+    assert results == ["Food 5", "Food 5", "Food 6", "Food 6"]
+    assert utils._inflight_fetches == {}
+
+
+def test_waiters_receive_leader_failure(monkeypatch):
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+
+    async def failing_fetch(fdc_id):
+        await asyncio.sleep(0.01)
+        raise HTTPException(status_code=502, detail="down")
+
+    monkeypatch.setattr(utils, "fetch_food_detail", failing_fetch)
+
+    async def run():
+        with Session(engine) as s1, Session(engine) as s2:
+            return await asyncio.gather(
+                ensure_food_cached(9, s1),
+                ensure_food_cached(9, s2),
+                return_exceptions=True,
+            )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, HTTPException) for r in results)
+    assert utils._inflight_fetches == {}
+
+
+def test_cancelled_leader_fails_waiters_as_unavailable(monkeypatch):
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    started = asyncio.Event()
+
+    async def hanging_fetch(fdc_id):
+        started.set()
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(utils, "fetch_food_detail", hanging_fetch)
+
+    async def run():
+        with Session(engine) as first, Session(engine) as second:
+            leader = asyncio.create_task(ensure_food_cached(9, first))
+            await started.wait()
+            waiter = asyncio.create_task(ensure_food_cached(9, second))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            with pytest.raises(HTTPException) as exc:
+                await waiter
+            return exc.value.status_code
+
+    assert asyncio.run(run()) == 503
+    assert utils._inflight_fetches == {}
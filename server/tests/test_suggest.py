@@ -0,0 +1,135 @@
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db
+from server.models import Favorite, Food, FoodEntry, Meal
+from server.suggest import SuggestIndex, suggest_index
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+def make_food(fdc_id, description, **kwargs):
+    return Food(
+        fdc_id=fdc_id,
+        description=description,
+        kcal_per_100g=1,
+        protein_g_per_100g=1,
+        fat_g_per_100g=1,
+        carb_g_per_100g=1,
+        **kwargs,
+    )
+
+
+def test_suggest_ranks_by_usage_and_tracks_changes():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(make_food(1, "Yogurt, Greek, plain"))
+        session.add(make_food(2, "Yogurt, vanilla"))
+        session.add(make_food(3, "Crème fraîche"))
+        session.add(Meal(id=1, date="2024-01-01", name="Meal 1", sort_order=1))
+        session.commit()
+        for i in range(3):
+            session.add(FoodEntry(meal_id=1, fdc_id=2, quantity_g=100, sort_order=i))
+        session.commit()
+
+    with TestClient(app.app) as client:
+
+        def suggest(q):
+            resp = client.get("/api/foods/suggest", params={"q": q})
+            assert resp.status_code == 200
+            return [r["fdcId"] for r in resp.json()["results"]]
+
+        # Built at startup; the most logged food comes first
+        assert suggest("yog") == [2, 1]
+        assert suggest("greek") == [1]
+        assert suggest("creme fr") == [3]
+
+        client.post("/api/favorites", json={"fdc_id": 1, "alias": "breakfast pot"})
+        assert suggest("breakf") == [1]
+        client.delete("/api/favorites/1")
+        assert suggest("breakf") == []
+
+        resp = client.post(
+            "/api/custom_foods",
+            json={
+                "description": "Granola bar",
+                "kcal_per_100g": 400,
+                "protein_g_per_100g": 8,
+                "fat_g_per_100g": 15,
+                "carb_g_per_100g": 60,
+            },
+        )
+        assert resp.status_code == 200, resp.text
+        assert len(suggest("granola")) == 1
+
+
+def test_suggest_lookup_is_fast_on_large_index():
+    index = SuggestIndex()
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i in range(5000):
+            session.add(make_food(100000 + i, f"Food item number {i} with words"))
+        session.commit()
+        index.build(session)
+    assert index.suggest("item number 4999")[0]["fdcId"] == 104999
+    start = time.perf_counter()
+    for _ in range(100):
+        index.suggest("food item number 12")
+    assert (time.perf_counter() - start) / 100 < 0.005
+
+
+def test_suggest_index_follows_commits_only():
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(make_food(1, "Oat milk"))
+        session.add(make_food(2, "Oat bran"))
+        session.add(Meal(id=1, date="2024-01-01", name="Meal 1", sort_order=1))
+        session.commit()
+        suggest_index.build(session)
+
+        def uses():
+            return {r["fdcId"]: r["uses"] for r in suggest_index.suggest("oat")}
+
+        session.add(make_food(3, "Oatcake"))
+        session.add(Favorite(fdc_id=1, alias="barista"))
+        session.add(FoodEntry(meal_id=1, fdc_id=2, quantity_g=50, sort_order=1))
+        session.flush()
+        session.rollback()
+        assert uses() == {1: 0, 2: 0}
+        assert suggest_index.suggest("barista") == []
+
+        entry = FoodEntry(meal_id=1, fdc_id=2, quantity_g=50, sort_order=1)
+        session.add(entry)
+        session.commit()
+        assert uses() == {1: 0, 2: 1}
+
+        # Moving an entry to another food moves its use
+        entry = session.get(FoodEntry, entry.id)
+        entry.fdc_id = 1
+        session.commit()
+        assert uses() == {1: 1, 2: 0}
+
+        session.exec(delete(Food).where(Food.fdc_id == 2))
+        session.commit()
+        assert list(uses()) == [1]
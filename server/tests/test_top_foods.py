@@ -0,0 +1,152 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, db
+from server.models import Food, FoodEntry, Meal
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+def log(session, day, *items):
+    meal = Meal(date=day, name="Meal 1", sort_order=1)
+    session.add(meal)
+    session.flush()
+    for order, (fdc_id, qty) in enumerate(items, start=1):
+        session.add(
+            FoodEntry(meal_id=meal.id, fdc_id=fdc_id, quantity_g=qty, sort_order=order)
+        )
+
+
+def test_top_foods_ranks_in_sql():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add_all(
+                [
+                    Food(
+                        fdc_id=1,
+                        description="Rice",
+                        kcal_per_100g=130,
+                        protein_g_per_100g=2.5,
+                        carb_g_per_100g=28,
+                        fat_g_per_100g=0.3,
+                    ),
+                    Food(
+                        fdc_id=2,
+                        description="Chicken",
+                        kcal_per_100g=165,
+                        protein_g_per_100g=31,
+                        carb_g_per_100g=0,
+                        fat_g_per_100g=3.6,
+                    ),
+                    Food(
+                        fdc_id=3,
+                        description="Egg",
+                        kcal_per_100g=0,
+                        protein_g_per_100g=0,
+                        carb_g_per_100g=0,
+                        fat_g_per_100g=0,
+                        unit_name="egg",
+                        kcal_per_unit=70,
+                        protein_g_per_unit=6,
+                        carb_g_per_unit=0.5,
+                        fat_g_per_unit=5,
+                    ),
+                ]
+            )
+            log(session, "2024-01-01", (1, 200), (2, 100))
+            log(session, "2024-01-02", (1, 100), (3, 2))
+            log(session, "2024-01-03", (1, 100))
+            # Outside the range
+            log(session, "2024-02-01", (2, 1000))
+            session.commit()
+
+        statements = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        params = {"start_date": "2024-01-01", "end_date": "2024-01-31"}
+        resp = client.get("/api/analytics/top_foods", params=params)
+        event.remove(engine, "before_cursor_execute", record)
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["metric"] == "kcal"
+        assert body["total"] == 825
+        assert body["logged_days"] == 3
+        rice, chicken, egg = body["foods"]
+        assert rice == {
+            "fdc_id": 1,
+            "description": "Rice",
+            "total": 520,
+            "share": round(520 / 825, 4),
+            "entries": 3,
+            "days": 3,
+            "frequency": 1.0,
+            "quantity": 400,
+            "unit_name": None,
+        }
+        assert (chicken["fdc_id"], chicken["total"], chicken["days"]) == (2, 165, 1)
+        assert (egg["total"], egg["quantity"], egg["unit_name"]) == (140, 2, "egg")
+        assert egg["frequency"] == round(1 / 3, 4)
+        # One aggregate plus the logged-day count, next to the ETag lookup
+        assert len([s for s in statements if "foodentry" in s]) == 2
+
+        resp = client.get(
+            "/api/analytics/top_foods",
+            params={**params, "metric": "protein", "limit": 1},
+        )
+        foods = resp.json()["foods"]
+        assert [f["fdc_id"] for f in foods] == [2]
+        assert foods[0]["total"] == 31
+
+        resp = client.get(
+            "/api/analytics/top_foods",
+            params={"start_date": "2023-01-01", "end_date": "2023-12-31"},
+        )
+        assert resp.json()["foods"] == [] and resp.json()["total"] == 0
+
+        resp = client.get(
+            "/api/analytics/top_foods", params={**params, "metric": "iron"}
+        )
+        assert resp.status_code == 400
+
+    app.app.dependency_overrides.clear()
+
+
+def test_top_foods_query_uses_covering_indexes():
+    engine = get_test_engine()
+    SQLModel.metadata.create_all(engine)
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT foodentry.fdc_id, sum(foodentry.quantity_g) "
+            "FROM foodentry JOIN meal ON meal.id = foodentry.meal_id "
+            "WHERE meal.date >= '2024-01-01' AND meal.date <= '2024-01-31' "
+            "GROUP BY foodentry.fdc_id"
+        ).all()
+    details = " | ".join(row[3] for row in plan)
+    assert "SEARCH foodentry USING COVERING INDEX ix_foodentry_meal_food" in details
+    assert "SCAN foodentry" not in details
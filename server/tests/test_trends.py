@@ -0,0 +1,265 @@
+import os
+
+os.environ["USDA_KEY"] = "test"
+
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from server import app, daily_totals, db, trends
+from server.models import BodyWeight, Food, FoodEntry, Meal
+
+
+def get_test_engine():
+    return create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+
+def override_get_session(engine):
+    def _get_session():
+        with Session(engine) as session:
+            yield session
+
+    return _get_session
+
+
+def log(session, day, grams):
+    meal = Meal(date=day, name="Meal 1", sort_order=1)
+    session.add(meal)
+    session.flush()
+    session.add(FoodEntry(meal_id=meal.id, fdc_id=1, quantity_g=grams, sort_order=1))
+
+
+def expected(kcal, weights, day, window, alpha):
+    """Recompute one day's rolling kcal mean and weight trend from scratch."""
+    first = day - timedelta(days=window - 1)
+    values = [v for d, v in kcal.items() if first <= d <= day]
+    trend = None
+    for d in sorted(w for w in weights if w <= day):
+        trend = weights[d] if trend is None else trend + alpha * (weights[d] - trend)
+    mean = round(sum(values) / len(values), 2) if values else None
+    return mean, None if trend is None else round(trend, 2)
+
+
+def test_rolling_mean_skips_unlogged_days():
+    rolling = trends.RollingMean(2)
+    assert rolling.push(None) is None
+    assert rolling.push([2.0] * trends.SIZE)[0] == 2.0
+    assert rolling.push([4.0] * trends.SIZE)[0] == 3.0
+    assert rolling.push(None)[0] == 4.0
+    assert rolling.push(None) is None
+
+
+def test_trends_extend_incrementally_and_follow_edits(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        kcal = {}
+        weights = {}
+        with Session(engine) as session:
+            session.add(
+                Food(
+                    fdc_id=1,
+                    description="Rice",
+                    kcal_per_100g=100,
+                    protein_g_per_100g=2,
+                    carb_g_per_100g=20,
+                    fat_g_per_100g=1,
+                )
+            )
+            for i in range(0, 20, 2):
+                day = date(2024, 1, 1) + timedelta(days=i)
+                log(session, day.isoformat(), 100 + 10 * i)
+                kcal[day] = 100.0 + 10 * i
+            for i in range(0, 20, 3):
+                day = date(2024, 1, 1) + timedelta(days=i)
+                session.add(BodyWeight(date=day.isoformat(), weight=80 - 0.2 * i))
+                weights[day] = 80 - 0.2 * i
+            session.commit()
+
+        loaded = []
+        real_load = daily_totals.load
+
+        def spy(session, start, end):
+            loaded.append((start, end))
+            return real_load(session, start, end)
+
+        monkeypatch.setattr(daily_totals, "load", spy)
+
+        def fetch(end):
+            params = {
+                "start_date": "2024-01-05",
+                "end_date": end,
+                "windows": "3",
+                "alpha": 0.5,
+            }
+            resp = client.get("/api/analytics/trends", params=params)
+            assert resp.status_code == 200
+            return resp.json()
+
+        def check(rows):
+            for row in rows:
+                mean, trend = expected(
+                    kcal, weights, date.fromisoformat(row["date"]), 3, 0.5
+                )
+                rolled = row["rolling"]["3"]
+                assert (rolled and rolled["kcal"]) == mean
+                assert row["weight_trend"] == trend
+
+        rows = fetch("2024-01-15")
+        assert rows[0]["date"] == "2024-01-05" and len(rows) == 11
+        assert rows[0]["logged"] and rows[0]["kcal"] == 140
+        check(rows)
+        assert loaded == [("2024-01-01", "2024-01-15")]
+
+        check(fetch("2024-01-16"))
+        assert loaded[-1] == ("2024-01-16", "2024-01-16")
+
+        with Session(engine) as session:
+            log(session, "2024-01-10", 500)
+            session.add(BodyWeight(date="2024-01-11", weight=70))
+            session.commit()
+        kcal[date(2024, 1, 10)] = 500.0
+        weights[date(2024, 1, 11)] = 70
+        check(fetch("2024-01-18"))
+        assert loaded[-1] == ("2024-01-10", "2024-01-18")
+
+        # A day logged before the series starts rebuilds it
+        with Session(engine) as session:
+            log(session, "2023-12-30", 300)
+            session.commit()
+        kcal[date(2023, 12, 30)] = 300.0
+        check(fetch("2024-01-18"))
+        assert loaded[-1] == ("2023-12-30", "2024-01-18")
+
+    app.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("windows", ["7,x", "", "0", "400"])
+def test_trends_reject_bad_windows(windows):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        resp = client.get(
+            "/api/analytics/trends",
+            params={
+                "start_date": "2024-01-01",
+                "end_date": "2024-01-02",
+                "windows": windows,
+            },
+        )
+        assert resp.status_code == 400
+    app.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        ("1900-01-01", "2024-01-02"),
+        ("2024-01-01", "9999-12-31"),
+        ((date.today() + timedelta(days=40)).isoformat(),) * 2,
+        ("2024-01-02", "2024-01-01"),
+    ],
+)
+def test_trends_reject_unbounded_ranges(start, end):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        resp = client.get(
+            "/api/analytics/trends", params={"start_date": start, "end_date": end}
+        )
+        assert resp.status_code == 400
+        assert len(trends.series_cache._data) == 0
+    app.app.dependency_overrides.clear()
+
+
+def test_trends_series_starts_at_first_logged_day(monkeypatch):
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        loaded = []
+        real_load = daily_totals.load
+
+        def spy(session, start, end):
+            loaded.append((start, end))
+            return real_load(session, start, end)
+
+        monkeypatch.setattr(daily_totals, "load", spy)
+        params = {"start_date": "2022-01-01", "end_date": "2024-01-03"}
+
+        # Nothing logged yet: no days are computed at all
+        rows = client.get("/api/analytics/trends", params=params).json()
+        assert len(rows) == 733 and loaded == []
+        assert rows[0]["rolling"] == {"7": None, "30": None}
+
+        with Session(engine) as session:
+            session.add(BodyWeight(date="2024-01-02", weight=80))
+            session.commit()
+        rows = client.get("/api/analytics/trends", params=params).json()
+        assert loaded == [("2024-01-02", "2024-01-03")]
+        assert rows[0] == {
+            "date": "2022-01-01",
+            "logged": False,
+            "kcal": 0.0,
+            "protein": 0.0,
+            "carb": 0.0,
+            "fat": 0.0,
+            "weight": None,
+            "weight_trend": None,
+            "rolling": {"7": None, "30": None},
+        }
+        assert [r["weight_trend"] for r in rows[-3:]] == [None, 80, 80]
+        (series,) = [value for _, value in trends.series_cache._data.values()]
+        assert series.origin == date(2024, 1, 2) and len(series.daily) == 2
+
+    app.app.dependency_overrides.clear()
+
+
+def test_trends_skip_days_with_only_empty_meals():
+    engine = get_test_engine()
+    db.engine = engine
+    app.app.dependency_overrides[db.get_session] = override_get_session(engine)
+
+    with TestClient(app.app) as client:
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(
+                Food(
+                    fdc_id=1,
+                    description="Rice",
+                    kcal_per_100g=100,
+                    protein_g_per_100g=2,
+                    carb_g_per_100g=20,
+                    fat_g_per_100g=1,
+                )
+            )
+            log(session, "2024-09-07", 2000)
+            session.commit()
+        # Opening a day in the web client creates its empty meals
+        for day in ("2024-01-01", "2024-09-08"):
+            client.post("/api/meals", json={"date": day})
+
+        rows = client.get(
+            "/api/analytics/trends",
+            params={"start_date": "2024-09-07", "end_date": "2024-09-08"},
+        ).json()
+        assert [r["logged"] for r in rows] == [True, False]
+        assert [r["rolling"]["7"]["kcal"] for r in rows] == [2000, 2000]
+        (series,) = [value for _, value in trends.series_cache._data.values()]
+        assert series.origin == date(2024, 9, 7)
+
+    app.app.dependency_overrides.clear()
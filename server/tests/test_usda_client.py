@@ -0,0 +1,26 @@
+import asyncio
+
+from server import usda, utils
+
+
+def test_usda_client_is_shared_and_closed():
+    async def run():
+        first = await utils.get_usda_client()
+        second = await usda.get_client()
+        assert first is second
+        assert not first.is_closed
+        await utils.aclose_usda_client()
+        assert first.is_closed
+        third = await usda.get_client()
+        assert third is not first
+        await usda.aclose()
+
+    asyncio.run(run())
+
+
+def test_http2_requires_opt_in(monkeypatch):
+    monkeypatch.delenv("USDA_HTTP2", raising=False)
+    assert usda._http2_enabled() is False
+    monkeypatch.setenv("USDA_HTTP2", "1")
+    monkeypatch.setattr(usda.importlib.util, "find_spec", lambda name: None)
+    assert usda._http2_enabled() is False
@@ -0,0 +1,226 @@
+"""Rolling averages and the smoothed weight trend behind ``/api/analytics/trends``.
+
+A :class:`TrendSeries` runs from the first day with logged food or a weigh-in;
+days before it have no averages or trend. Days whose meals are all empty count
+as not logged. Each new day updates the running window sums and the weight EMA
+in constant time, and the computed prefix stays in memory per
+``(windows, alpha)``, so asking for one more day computes one more day.
+
+``dayversion`` says which days changed since a prefix was computed: every
+commit gives the days it touched a version above all earlier ones. The prefix
+is cut back to the earliest such day and recomputed from there.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import deque
+from datetime import date, timedelta
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from server import daily_totals
+from server import nutrients as nutrient_vectors
+from server.cache import TTLCache
+from server.models import BodyWeight, DayVersion, FoodEntry, Meal
+
+SIZE = len(nutrient_vectors.NUTRIENTS)
+
+
+class RollingMean:
+    """Mean over the logged days among the last ``size`` days."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._days: Deque[Optional[List[float]]] = deque()
+        self._sums = [0.0] * SIZE
+        self._logged = 0
+
+    def push(self, vector: Optional[List[float]]) -> Optional[List[float]]:
+        """Add the next day (``None`` if nothing was logged) and return the mean."""
+        self._days.append(vector)
+        if vector is not None:
+            self._logged += 1
+            for i in range(SIZE):
+                self._sums[i] += vector[i]
+        if len(self._days) > self.size:
+            dropped = self._days.popleft()
+            if dropped is not None:
+                self._logged -= 1
+                for i in range(SIZE):
+                    self._sums[i] -= dropped[i]
+        if not self._logged:
+            # Start over from exact zeros once the window empties
+            self._sums = [0.0] * SIZE
+            return None
+        return [s / self._logged for s in self._sums]
+
+
+class TrendSeries:
+    """Per-day inputs and outputs from ``origin`` up to :attr:`end`."""
+
+    def __init__(self, origin: date, windows: Sequence[int], alpha: float) -> None:
+        self.origin = origin
+        self.windows = tuple(windows)
+        self.alpha = alpha
+        # Highest dayversion the computed days reflect
+        self.version = 0
+        self.lock = threading.Lock()
+        self.daily: List[Optional[List[float]]] = []
+        self.weights: List[Optional[float]] = []
+        self.trend: List[Optional[float]] = []
+        self.means: Dict[int, List[Optional[List[float]]]] = {w: [] for w in windows}
+        self._rolling = {w: RollingMean(w) for w in windows}
+
+    @property
+    def end(self) -> date:
+        return self.origin + timedelta(days=len(self.daily) - 1)
+
+    def push(self, vector: Optional[List[float]], weight: Optional[float]) -> None:
+        self.daily.append(vector)
+        self.weights.append(weight)
+        for size, rolling in self._rolling.items():
+            self.means[size].append(rolling.push(vector))
+        prev = self.trend[-1] if self.trend else None
+        if weight is None:
+            self.trend.append(prev)
+        elif prev is None:
+            self.trend.append(weight)
+        else:
+            self.trend.append(prev + self.alpha * (weight - prev))
+
+    def truncate(self, day: date) -> None:
+        """Forget ``day`` and everything after it."""
+        keep = max(0, (day - self.origin).days)
+        if keep >= len(self.daily):
+            return
+        del self.daily[keep:], self.weights[keep:], self.trend[keep:]
+        for size in self.windows:
+            del self.means[size][keep:]
+            rolling = self._rolling[size] = RollingMean(size)
+            for vector in self.daily[max(0, keep - size) : keep]:
+                rolling.push(vector)
+
+    def extend(self, session: Session, until: date) -> None:
+        """Compute the days after :attr:`end` up to ``until``."""
+        first = self.end + timedelta(days=1)
+        if first > until:
+            return
+        start, stop = first.isoformat(), until.isoformat()
+        totals = daily_totals.load(session, start, stop)
+        weights = dict(
+            session.exec(
+                select(BodyWeight.date, BodyWeight.weight).where(
+                    BodyWeight.date >= start, BodyWeight.date <= stop
+                )
+            ).all()
+        )
+        cur = first
+        while cur <= until:
+            day = cur.isoformat()
+            self.push(totals.get(day), weights.get(day))
+            cur += timedelta(days=1)
+
+    def row(self, day: date, keys: Sequence[str]) -> dict:
+        i = (day - self.origin).days
+        # Days before the first log have nothing to average or smooth
+        known = i >= 0
+        vector = self.daily[i] if known else None
+        values = vector or [0.0] * SIZE
+        rolling = {}
+        for size in self.windows:
+            mean = self.means[size][i] if known else None
+            rolling[str(size)] = (
+                None
+                if mean is None
+                else {k: round(mean[nutrient_vectors.INDEX[k]], 2) for k in keys}
+            )
+        trend = self.trend[i] if known else None
+        return (
+            {"date": day.isoformat(), "logged": vector is not None}
+            | {k: round(values[nutrient_vectors.INDEX[k]], 2) for k in keys}
+            | {
+                "weight": self.weights[i] if known else None,
+                "weight_trend": None if trend is None else round(trend, 2),
+                "rolling": rolling,
+            }
+        )
+
+
+# One computed series per (windows, alpha)
+series_cache = TTLCache(
+    maxsize=int(os.getenv("TRENDS_CACHE_SIZE", "8")),
+    ttl=float(os.getenv("TRENDS_CACHE_TTL", "86400")),
+)
+
+
+def _first_day(session: Session) -> Optional[date]:
+    firsts = [
+        session.exec(
+            select(func.min(Meal.date)).join(FoodEntry, FoodEntry.meal_id == Meal.id)
+        ).one(),
+        session.exec(select(func.min(BodyWeight.date))).one(),
+    ]
+    firsts = [d for d in firsts if d]
+    return date.fromisoformat(min(firsts)) if firsts else None
+
+
+def _sync(session: Session, series: TrendSeries) -> bool:
+    """Drop days changed since ``series`` was computed; False if it must be rebuilt."""
+    current = session.exec(select(func.max(DayVersion.version))).one() or 0
+    if current == series.version:
+        return True
+    changed = session.exec(
+        select(func.min(DayVersion.date)).where(DayVersion.version > series.version)
+    ).one()
+    if changed is not None:
+        if date.fromisoformat(changed) < series.origin:
+            return False
+        series.truncate(date.fromisoformat(changed))
+    series.version = current
+    return True
+
+
+def _rows(
+    session: Session, series: TrendSeries, start: date, end: date, keys: Sequence[str]
+) -> List[dict]:
+    series.extend(session, end)
+    out = []
+    cur = start
+    while cur <= end:
+        out.append(series.row(cur, keys))
+        cur += timedelta(days=1)
+    return out
+
+
+def load(
+    session: Session,
+    start: date,
+    end: date,
+    windows: Tuple[int, ...],
+    alpha: float,
+    keys: Sequence[str],
+) -> List[dict]:
+    """One row per day of ``[start, end]`` with its rolling means and trend.
+
+    Callers bound the range; the series itself only ever spans from the first
+    logged day to the furthest ``end`` requested.
+    """
+    hit = series_cache.get((windows, alpha))
+    if hit is not None:
+        series = hit[0]
+        with series.lock:
+            if _sync(session, series):
+                return _rows(session, series, start, end, keys)
+    # Read the version first so commits made while computing are caught later
+    version = session.exec(select(func.max(DayVersion.version))).one() or 0
+    # With nothing logged yet, start past the range; the first log rebuilds it
+    origin = _first_day(session) or end + timedelta(days=1)
+    series = TrendSeries(origin, windows, alpha)
+    series.version = version
+    with series.lock:
+        series_cache.set((windows, alpha), series)
+        return _rows(session, series, start, end, keys)
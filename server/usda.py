@@ -0,0 +1,197 @@
+"""Pooled HTTP client shared by every outbound USDA FoodData Central call.
+
+All USDA traffic (food detail, batch lookups and search) goes through the
+single ``httpx.AsyncClient`` returned by :func:`get_client`, so connections are
+kept alive and reused instead of paying TCP and TLS setup per request. The
+client is closed from the application ``lifespan`` on shutdown.
+
+Requests made with :func:`get` and :func:`post` first take a token from
+:data:`limiter`, a token bucket that tracks USDA's hourly quota through the
+``X-RateLimit-*`` response headers. Work running inside :func:`low_priority`
+(background refreshes, prefetches) leaves a reserve of the quota untouched so
+interactive requests keep headroom.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import importlib.util
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+import httpx
+
+USDA_BASE = "https://api.nal.usda.gov/fdc/v1"
+
+# USDA is the only host this pool talks to, so these are per-host limits.
+USDA_MAX_CONNECTIONS = int(os.getenv("USDA_MAX_CONNECTIONS", "10"))
+USDA_MAX_KEEPALIVE = int(os.getenv("USDA_MAX_KEEPALIVE", "5"))
+USDA_KEEPALIVE_EXPIRY = float(os.getenv("USDA_KEEPALIVE_EXPIRY", "30"))
+USDA_TIMEOUT = float(os.getenv("USDA_TIMEOUT", "20"))
+USDA_CONNECT_TIMEOUT = float(os.getenv("USDA_CONNECT_TIMEOUT", "5"))
+# Requests per hour; USDA's default quota per key. Refined from response headers.
+USDA_RATE_LIMIT = int(os.getenv("USDA_RATE_LIMIT", "1000"))
+# Share of the quota that only interactive requests may use
+USDA_BACKGROUND_RESERVE = float(os.getenv("USDA_BACKGROUND_RESERVE", "0.25"))
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 is opt-in via ``USDA_HTTP2=1`` and needs the ``h2`` package."""
+    if os.getenv("USDA_HTTP2", "0").lower() not in ("1", "true", "yes"):
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("USDA_HTTP2 is set but the h2 package is not installed")
+        return False
+    return True
+
+
+async def get_client() -> httpx.AsyncClient:
+    """Return the shared, connection-pooled USDA client."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(USDA_TIMEOUT, connect=USDA_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=USDA_MAX_CONNECTIONS,
+                max_keepalive_connections=USDA_MAX_KEEPALIVE,
+                keepalive_expiry=USDA_KEEPALIVE_EXPIRY,
+            ),
+            http2=_http2_enabled(),
+            headers={"Accept": "application/json"},
+        )
+    return _client
+
+
+async def aclose() -> None:
+    """Close the shared client if it has been created."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "usda_priority", default=INTERACTIVE
+)
+
+
+@contextlib.contextmanager
+def low_priority() -> Iterator[None]:
+    """Mark USDA requests made inside the block as background work."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimiter:
+    """Token bucket mirroring USDA's hourly request quota.
+
+    The bucket holds up to ``limit`` tokens and refills continuously over
+    ``period`` seconds. ``X-RateLimit-Limit``/``X-RateLimit-Remaining`` headers
+    resynchronise it with USDA's own count, and a 429 pauses all requests until
+    ``Retry-After`` (or one refill interval) has passed. Background requests
+    wait while fewer than ``reserve`` of the tokens are left.
+    """
+
+    def __init__(
+        self,
+        limit: int = USDA_RATE_LIMIT,
+        period: float = 3600.0,
+        reserve: float = USDA_BACKGROUND_RESERVE,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ) -> None:
+        self.limit = limit
+        self.period = period
+        self.reserve = reserve
+        self.tokens = float(limit)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._blocked_until = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.period
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.limit, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self, priority: int) -> float:
+        now = self._clock()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill()
+        floor = self.reserve * self.limit if priority == BACKGROUND else 0.0
+        if self.tokens - 1 >= floor:
+            return 0.0
+        return (floor + 1 - self.tokens) / self.rate
+
+    async def acquire(self, priority: Optional[int] = None) -> None:
+        if priority is None:
+            priority = _priority.get()
+        while (delay := self._delay(priority)) > 0:
+            await self._sleep(delay)
+        self.tokens -= 1
+
+    def observe(self, response: httpx.Response) -> None:
+        headers = response.headers
+        try:
+            if "X-RateLimit-Limit" in headers:
+                self.limit = max(1, int(headers["X-RateLimit-Limit"]))
+            if "X-RateLimit-Remaining" in headers:
+                self._refill()
+                self.tokens = float(headers["X-RateLimit-Remaining"])
+        except ValueError:
+            logger.warning("Ignoring malformed USDA rate limit headers")
+        if response.status_code == 429:
+            try:
+                retry_after = float(headers.get("Retry-After", ""))
+            except ValueError:
+                retry_after = 1 / self.rate
+            self.tokens = 0.0
+            self._blocked_until = self._clock() + retry_after
+            logger.warning("USDA rate limit hit; pausing for %.0fs", retry_after)
+
+    def snapshot(self) -> Dict[str, float]:
+        self._refill()
+        return {
+            "limit": self.limit,
+            "remaining": round(self.tokens, 2),
+            "background_reserve": round(self.reserve * self.limit, 2),
+            "blocked_for": round(max(0.0, self._blocked_until - self._clock()), 2),
+        }
+
+
+limiter = RateLimiter()
+
+
+async def get(url: str, **kwargs: Any) -> httpx.Response:
+    """Rate-limited GET through the shared client."""
+    await limiter.acquire()
+    response = await (await get_client()).get(url, **kwargs)
+    limiter.observe(response)
+    return response
+
+
+async def post(url: str, **kwargs: Any) -> httpx.Response:
+    """Rate-limited POST through the shared client."""
+    await limiter.acquire()
+    response = await (await get_client()).post(url, **kwargs)
+    limiter.observe(response)
+    return response
@@ -1,13 +1,17 @@
+import asyncio
+import functools
 import json
 import logging
 import os
+import time
+import zlib
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Dict, Optional, TypedDict
+from typing import Callable, Dict, Iterable, List, Optional, TypedDict
 
 import httpx
-from fastapi import HTTPException
-from sqlalchemy import func
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import delete, func
 from sqlmodel import Session, select
 from tenacity import (
     before_sleep_log,
@@ -17,15 +21,36 @@ from tenacity import (
     wait_exponential,
 )
 
-from server.models import Food, Meal
+from server import nutrients, portions, usda
+from server.cache import TTLCache
+from server.models import FdcFood, Food, FoodNutrients, FoodPayload, Meal, MissingFood
 
-USDA_BASE = "https://api.nal.usda.gov/fdc/v1"
+USDA_BASE = usda.USDA_BASE
 from dotenv import find_dotenv, load_dotenv
 
 load_dotenv(find_dotenv())
 
 CACHE_TTL = timedelta(days=30)
 
+# Never call USDA; answer only from cached and imported (fdc_import) foods
+USDA_OFFLINE = os.getenv("USDA_OFFLINE", "").lower() in ("1", "true", "yes")
+
+# Set by server.refresher while its background workers are running. When set,
+# stale cached foods are returned as-is and refreshed off the request path.
+stale_refresher = None
+
+# USDA's multi-id /foods endpoint accepts at most 20 fdcIds per request
+USDA_BATCH_SIZE = 20
+USDA_BATCH_CONCURRENCY = 4
+
+# How long an fdc_id USDA reported as missing is answered with 404 locally
+MISSING_TTL = timedelta(hours=float(os.getenv("USDA_MISSING_TTL_HOURS", "168")))
+# In-memory front for the persisted ``MissingFood`` table: fdc_id -> checked_at
+missing_cache = TTLCache(maxsize=4096, ttl=MISSING_TTL.total_seconds())
+
+# Raw payloads kept per food, newest first; older ones are pruned on insert
+PAYLOAD_HISTORY = max(1, int(os.getenv("USDA_PAYLOAD_HISTORY", "1")))
+
 logger = logging.getLogger(__name__)
 
 exceptions_to_retry = (
@@ -66,25 +91,15 @@ _config = _load_config() or {}
 # USDA_KEY is loaded from config file first, then environment
 USDA_KEY = _config.get("usda_key") or os.getenv("USDA_KEY")
 
-_usda_client: Optional[httpx.AsyncClient] = None
-
 
 async def get_usda_client() -> httpx.AsyncClient:
-    """Return a shared AsyncClient for USDA requests."""
-    global _usda_client
-    if _usda_client is None:
-        _usda_client = httpx.AsyncClient(
-            timeout=20.0, headers={"Accept": "application/json"}
-        )
-    return _usda_client
+    """Return the shared AsyncClient for USDA requests."""
+    return await usda.get_client()
 
 
 async def aclose_usda_client() -> None:
     """Close the shared USDA AsyncClient if it exists."""
-    global _usda_client
-    if _usda_client is not None:
-        await _usda_client.aclose()
-        _usda_client = None
+    await usda.aclose()
 
 
 def update_usda_key(new_key: str) -> None:
@@ -159,59 +174,175 @@ def _compute_calories(out: MacroTotals, fiber: Optional[float]) -> None:
     )
 
 
+# Where extract_macros_from_fdc stores a nutrient's amount. Fiber is split by
+# name into total/soluble/insoluble/other; _SKIP marks irrelevant nutrients.
+(
+    _PROTEIN,
+    _FAT,
+    _CARB,
+    _KCAL,
+    _SUGAR,
+    _STARCH,
+    _FIBER_TOTAL,
+    _FIBER_SOLUBLE,
+    _FIBER_INSOLUBLE,
+    _FIBER_OTHER,
+    _WATER,
+    _ASH,
+    _ALCOHOL,
+    _SODIUM,
+    _SKIP,
+) = range(15)
+_FIBER = _FIBER_TOTAL
+
+# Checked in this order; the first keyword found in the name wins
+_NAME_KEYWORDS = (
+    ("protein", _PROTEIN),
+    ("fat", _FAT),
+    ("carbohydrate", _CARB),
+    ("energy", _KCAL),
+    ("sugar", _SUGAR),
+    ("starch", _STARCH),
+    ("fiber", _FIBER),
+    ("water", _WATER),
+    ("ash", _ASH),
+    ("alcohol", _ALCOHOL),
+    ("sodium", _SODIUM),
+)
+
+_SLOT_BY_NUMBER: Dict[int, int] = {
+    1003: _PROTEIN,
+    1004: _FAT,
+    1293: _FAT,
+    1005: _CARB,
+    1008: _KCAL,
+    2000: _SUGAR,
+    2001: _STARCH,
+    1079: _FIBER,
+    1082: _FIBER,
+    1056: _FIBER,
+    1057: _FIBER,
+    1051: _WATER,
+    1001: _ASH,
+    1093: _SODIUM,
+}
+
+# (name, number, type(number)) -> slot; type keeps 1 and True apart
+_slot_cache: Dict[tuple, int] = {}
+_SLOT_CACHE_SIZE = 4096
+
+
+def _nutrient_slot(raw_name, num_raw) -> int:
+    """Classify one nutrient by number, falling back to keywords in its name.
+
+    When both match, whichever comes first in ``_NAME_KEYWORDS`` order wins,
+    exactly like the original if/elif chain.
+    """
+    name = raw_name.strip().lower()
+    slot = _SKIP
+    for keyword, candidate in _NAME_KEYWORDS:
+        if keyword in name and not (keyword == "fat" and "trans" in name):
+            slot = candidate
+            break
+    if num_raw is not None:
+        try:
+            num = int(float(str(num_raw)))
+        except Exception:
+            num = None
+        if num is not None:
+            slot = min(slot, _SLOT_BY_NUMBER.get(num, _SKIP))
+    if slot == _FIBER:
+        if "total" in name:
+            slot = _FIBER_TOTAL
+        elif "soluble" in name:
+            slot = _FIBER_SOLUBLE
+        elif "insoluble" in name:
+            slot = _FIBER_INSOLUBLE
+        else:
+            slot = _FIBER_OTHER
+    return slot
+
+
 def extract_macros_from_fdc(data: dict) -> MacroTotals:
+    """Compute per-100g kcal, protein, carb and fat from an FDC food payload.
+
+    Nutrients are classified once per distinct (name, number) pair and the
+    result memoised, so the per-nutrient work is a dict lookup and a store.
+    """
+    return _extract_fdc(data)[0]
+
+
+def extract_nutrients_from_fdc(data: dict) -> List[float]:
+    """Per-100g values of every tracked nutrient, in ``nutrients.NUTRIENTS`` order."""
+    out, fiber, sugars, sodium = _extract_fdc(data)
+    return [
+        out["kcal"],
+        out["protein"],
+        out["carb"],
+        out["fat"],
+        _to_float(fiber or 0.0),
+        _to_float(sugars or 0.0),
+        _to_float(sodium or 0.0),
+    ]
+
+
+def _extract_fdc(
+    data: dict,
+) -> tuple[MacroTotals, Optional[float], Optional[float], Optional[float]]:
+    """Return the macros plus resolved fiber, sugars and sodium (mg)."""
     out: MacroTotals = {"kcal": 0.0, "protein": 0.0, "carb": 0.0, "fat": 0.0}
-    sugars = starch = fiber_total = fiber_sol = fiber_ins = fiber_any = None
-    water = ash = alcohol = None
+    sugars = fiber_total = None
     lbl = (data or {}).get("labelNutrients") or None
     if lbl:
         fiber_total, sugars = _parse_label_nutrients(lbl, out)
+    slots: List[Optional[float]] = [None] * _SKIP
+    cache = _slot_cache
     for n in data.get("foodNutrients") or []:
         amt = n.get("amount")
         if amt is None:
             continue
         nut = n.get("nutrient") or {}
-        name = (nut.get("name") or n.get("name") or "").strip().lower()
+        raw_name = nut.get("name") or n.get("name") or ""
         num_raw = (
             nut.get("number")
             or n.get("nutrientNumber")
             or n.get("nutrientId")
             or nut.get("id")
         )
-        num = None
-        if num_raw is not None:
-            try:
-                num = int(float(str(num_raw)))
-            except Exception:
-                num = None
-        a = _to_float(amt)
-        if num == 1003 or "protein" in name:
-            out["protein"] = a
-        elif num in (1004, 1293) or "fat" in name and "trans" not in name:
-            out["fat"] = a
-        elif num == 1005 or "carbohydrate" in name:
-            out["carb"] = a
-        elif num == 1008 or "energy" in name:
-            out["kcal"] = a
-        elif num == 2000 or "sugar" in name:
-            sugars = a
-        elif num == 2001 or "starch" in name:
-            starch = a
-        elif num in (1079, 1082, 1056, 1057) or "fiber" in name:
-            if "total" in name:
-                fiber_total = a
-            elif "soluble" in name:
-                fiber_sol = a
-            elif "insoluble" in name:
-                fiber_ins = a
-            else:
-                fiber_any = a
-        elif num == 1051 or "water" in name:
-            water = a
-        elif num == 1001 or "ash" in name:
-            ash = a
-        elif num == 1005 or "alcohol" in name:
-            alcohol = a
+        key = (raw_name, num_raw, num_raw.__class__)
+        try:
+            slot = cache[key]
+        except KeyError:
+            slot = _nutrient_slot(raw_name, num_raw)
+            if len(cache) >= _SLOT_CACHE_SIZE:
+                cache.clear()
+            cache[key] = slot
+        except TypeError:  # unhashable name or number
+            slot = _nutrient_slot(raw_name, num_raw)
+        if slot != _SKIP:
+            slots[slot] = _to_float(amt)
+    for key, slot in (
+        ("protein", _PROTEIN),
+        ("fat", _FAT),
+        ("carb", _CARB),
+        ("kcal", _KCAL),
+    ):
+        if slots[slot] is not None:
+            out[key] = slots[slot]
+    if slots[_SUGAR] is not None:
+        sugars = slots[_SUGAR]
+    if slots[_FIBER_TOTAL] is not None:
+        fiber_total = slots[_FIBER_TOTAL]
+    starch = slots[_STARCH]
+    fiber_sol = slots[_FIBER_SOLUBLE]
+    fiber_ins = slots[_FIBER_INSOLUBLE]
+    fiber_any = slots[_FIBER_OTHER]
+    water = slots[_WATER]
+    ash = slots[_ASH]
+    alcohol = slots[_ALCOHOL]
+    sodium = slots[_SODIUM]
+    if sodium is None and lbl and (lbl.get("sodium") or {}).get("value") is not None:
+        sodium = _to_float(lbl["sodium"]["value"])
     fiber = _resolve_fiber(fiber_total, fiber_sol, fiber_ins, fiber_any)
     if (out["carb"] or 0.0) == 0.0:
         comp_sum = sum(x for x in (sugars, starch, fiber) if x is not None)
@@ -231,7 +362,12 @@ def extract_macros_from_fdc(data: dict) -> MacroTotals:
         _compute_calories(out, fiber)
     for k in out:
         out[k] = _to_float(out[k])
-    return out
+    return out, fiber, sugars, sodium
+
+
+def extract_macros_many(foods: Iterable[dict]) -> List[MacroTotals]:
+    """:func:`extract_macros_from_fdc` over many payloads, in order."""
+    return [extract_macros_from_fdc(data) for data in foods]
 
 
 def _log_final_failure(retry_state):
@@ -244,21 +380,133 @@ def _log_final_failure(retry_state):
     raise HTTPException(status_code=502, detail=f"USDA network error: {exc!s}")
 
 
-@retry(
+usda_retry = retry(
     retry=retry_if_exception_type(exceptions_to_retry),
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=0.4),
     before_sleep=before_sleep_log(logger, logging.WARNING),
     retry_error_callback=_log_final_failure,
 )
+
+
+class CircuitBreaker:
+    """Stop calling USDA after repeated failures.
+
+    After ``threshold`` consecutive failures the breaker opens and calls are
+    rejected immediately for ``reset_timeout`` seconds. It then lets a single
+    trial call through (half-open); success closes it again, failure re-opens.
+    """
+
+    def __init__(
+        self,
+        threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.reset()
+
+    def reset(self) -> None:
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def available(self) -> bool:
+        """Whether a call would currently be let through."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._trial)
+
+    def acquire(self) -> bool:
+        if not self.available():
+            return False
+        if self.state == "half_open":
+            self._trial = True
+        return True
+
+    def release(self) -> None:
+        """Give back a half-open trial slot without a verdict on USDA."""
+        self._trial = False
+
+    def record_success(self) -> None:
+        self.reset()
+
+    def record_failure(self) -> None:
+        self._trial = False
+        self.failures += 1
+        if self._opened_at is not None or self.failures >= self.threshold:
+            if self._opened_at is None:
+                logger.warning("USDA circuit opened after %s failures", self.failures)
+            self._opened_at = self._clock()
+
+    def snapshot(self) -> dict:
+        retry_in = 0.0
+        if self.state == "open":
+            retry_in = self.reset_timeout - (self._clock() - self._opened_at)
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": round(retry_in, 2),
+        }
+
+
+usda_breaker = CircuitBreaker(
+    threshold=int(os.getenv("USDA_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("USDA_BREAKER_RESET_SECONDS", "30")),
+)
+
+
+def is_outage(exc: BaseException) -> bool:
+    return isinstance(exc, HTTPException) and exc.status_code in (500, 502, 503, 504)
+
+
+def with_breaker(fn):
+    """Run a USDA call through :data:`usda_breaker`; 503 while it is open."""
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        if not USDA_KEY:
+            return await fn(*args, **kwargs)
+        if not usda_breaker.acquire():
+            raise HTTPException(
+                status_code=503, detail="USDA temporarily unavailable (circuit open)"
+            )
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            # The caller went away, which says nothing about USDA
+            usda_breaker.release()
+            raise
+        except Exception as exc:
+            if is_outage(exc) or not isinstance(exc, HTTPException):
+                usda_breaker.record_failure()
+            else:
+                usda_breaker.record_success()
+            raise
+        usda_breaker.record_success()
+        return result
+
+    return wrapper
+
+
+@with_breaker
+@usda_retry
 async def fetch_food_detail(fdc_id: int) -> dict:
     if not USDA_KEY:
         logger.error("USDA_KEY is not set on the server")
         raise HTTPException(status_code=500, detail="USDA_KEY is not set on the server")
     url = f"{USDA_BASE}/food/{fdc_id}"
     params = {"api_key": USDA_KEY}
-    client = await get_usda_client()
-    r = await client.get(url, params=params)
+    r = await usda.get(url, params=params)
     try:
         r.raise_for_status()
         return r.json()
@@ -272,29 +520,405 @@ async def fetch_food_detail(fdc_id: int) -> dict:
         raise HTTPException(status_code=502, detail=f"USDA JSON decode error: {exc!s}")
 
 
-async def ensure_food_cached(fdc_id: int, session: Session) -> Food:
-    food = session.get(Food, fdc_id)
-    now = datetime.utcnow()
-    if food and food.fetched_at and food.fetched_at > now - CACHE_TTL:
-        return food
-    food_json = await fetch_food_detail(fdc_id)
-    macros = extract_macros_from_fdc(food_json)
-    if food is None:
-        food = Food(fdc_id=fdc_id)
-    food.description = food_json.get("description", f"FDC {fdc_id}")
+@with_breaker
+@usda_retry
+async def _fetch_foods_chunk(fdc_ids: List[int]) -> List[dict]:
+    url = f"{USDA_BASE}/foods"
+    params = {"api_key": USDA_KEY}
+    r = await usda.post(url, params=params, json={"fdcIds": fdc_ids})
+    try:
+        r.raise_for_status()
+        return r.json() or []
+    except httpx.HTTPStatusError as exc:
+        status = exc.response.status_code
+        text = exc.response.text[:400]
+        logger.error("USDA error %s: %s", status, text)
+        raise HTTPException(status_code=status, detail=f"USDA error {status}: {text}")
+    except json.JSONDecodeError as exc:
+        logger.error("USDA JSON decode error: %s", exc)
+        raise HTTPException(status_code=502, detail=f"USDA JSON decode error: {exc!s}")
+
+
+async def fetch_foods_detail(fdc_ids: Iterable[int]) -> Dict[int, dict]:
+    """Fetch several USDA foods using the multi-id ``/foods`` endpoint.
+
+    Ids are split into chunks of ``USDA_BATCH_SIZE`` which are requested
+    concurrently, at most ``USDA_BATCH_CONCURRENCY`` at a time. Ids that USDA
+    does not return are simply absent from the result.
+    """
+    if not USDA_KEY:
+        logger.error("USDA_KEY is not set on the server")
+        raise HTTPException(status_code=500, detail="USDA_KEY is not set on the server")
+    ids = list(dict.fromkeys(fdc_ids))
+    chunks = [ids[i : i + USDA_BATCH_SIZE] for i in range(0, len(ids), USDA_BATCH_SIZE)]
+    sem = asyncio.Semaphore(USDA_BATCH_CONCURRENCY)
+
+    async def run(chunk: List[int]) -> List[dict]:
+        async with sem:
+            return await _fetch_foods_chunk(chunk)
+
+    out: Dict[int, dict] = {}
+    for items in await asyncio.gather(*(run(c) for c in chunks)):
+        for item in items:
+            if isinstance(item, dict) and item.get("fdcId") is not None:
+                out[int(item["fdcId"])] = item
+    return out
+
+
+def _is_fresh(
+    food: Optional[Food], now: datetime, max_age: timedelta = CACHE_TTL
+) -> bool:
+    return bool(food and food.fetched_at and food.fetched_at > now - max_age)
+
+
+def _apply_fdc_payload(
+    session: Session,
+    food: Food,
+    food_json: dict,
+    now: datetime,
+    vector: Optional[List[float]] = None,
+) -> None:
+    """Copy a payload onto ``food`` and store its nutrient vector and portions."""
+    if vector is None:
+        vector = extract_nutrients_from_fdc(food_json)
+    food.description = (
+        food_json.get("description")
+        or food_json.get("descriptionShort")
+        or f"FDC {food.fdc_id}"
+    )
     food.brand_owner = food_json.get("brandOwner")
-    food.data_type = food_json.get("dataType")
-    food.kcal_per_100g = macros["kcal"]
-    food.protein_g_per_100g = macros["protein"]
-    food.fat_g_per_100g = macros["fat"]
-    food.carb_g_per_100g = macros["carb"]
+    food.data_type = food_json.get("dataType") or food_json.get("dataCategory")
+    (
+        food.kcal_per_100g,
+        food.protein_g_per_100g,
+        food.carb_g_per_100g,
+        food.fat_g_per_100g,
+    ) = vector[:4]
     food.fetched_at = now
+    session.merge(FoodNutrients(fdc_id=food.fdc_id, vector=nutrients.pack(vector)))
+    portions.store_portions(session, food.fdc_id, food_json)
+
+
+def pack_payload(food_json: dict) -> bytes:
+    return zlib.compress(json.dumps(food_json, separators=(",", ":")).encode())
+
+
+def unpack_payload(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+
+def _store_payload(session: Session, fdc_id: int, food_json: dict, now: datetime):
+    """Keep the raw payload so macros can be re-extracted without USDA.
+
+    Only the newest :data:`PAYLOAD_HISTORY` payloads of a food are kept; older
+    ones are deleted in the same transaction.
+    """
+    kept = (
+        select(FoodPayload.fetched_at)
+        .where(FoodPayload.fdc_id == fdc_id, FoodPayload.fetched_at != now)
+        .order_by(FoodPayload.fetched_at.desc())
+        .limit(PAYLOAD_HISTORY - 1)
+    )
+    session.exec(
+        delete(FoodPayload).where(
+            FoodPayload.fdc_id == fdc_id,
+            FoodPayload.fetched_at != now,
+            FoodPayload.fetched_at.not_in(kept.scalar_subquery()),
+        )
+    )
+    session.add(
+        FoodPayload(fdc_id=fdc_id, fetched_at=now, data=pack_payload(food_json))
+    )
+
+
+def save_fdc_food(session: Session, fdc_id: int, food_json: dict) -> Food:
+    """Create or update the cached ``Food`` from one FDC detail payload."""
+    now = datetime.utcnow()
+    food = session.get(Food, fdc_id) or Food(fdc_id=fdc_id)
+    _apply_fdc_payload(session, food, food_json, now)
+    _store_payload(session, fdc_id, food_json, now)
     session.add(food)
     session.commit()
     session.refresh(food)
     return food
 
 
+def _apply_local_food(
+    session: Session, food: Food, local: FdcFood, now: datetime
+) -> None:
+    """Copy an imported food onto ``food`` with its nutrient vector and portions.
+
+    Rows imported before vectors were kept only carry the macros; other
+    nutrients then read as zero until ``python -m server.fdc_import`` is re-run.
+    """
+    food.description = local.description
+    food.brand_owner = local.brand_owner
+    food.data_type = local.data_type
+    food.kcal_per_100g = local.kcal_per_100g
+    food.protein_g_per_100g = local.protein_g_per_100g
+    food.fat_g_per_100g = local.fat_g_per_100g
+    food.carb_g_per_100g = local.carb_g_per_100g
+    food.fetched_at = now
+    if local.nutrients is not None:
+        session.merge(FoodNutrients(fdc_id=food.fdc_id, vector=local.nutrients))
+    if local.portions:
+        portions.save_portions(session, food.fdc_id, json.loads(local.portions))
+
+
+def known_missing(session: Session, fdc_ids: Iterable[int]) -> List[int]:
+    """Return the ids USDA reported as missing within ``MISSING_TTL``."""
+    cutoff = datetime.utcnow() - MISSING_TTL
+    out: List[int] = []
+    unknown: List[int] = []
+    for fdc_id in fdc_ids:
+        hit = missing_cache.get(fdc_id)
+        if hit is None:
+            unknown.append(fdc_id)
+        elif hit[0] > cutoff:
+            out.append(fdc_id)
+    if unknown:
+        # Keep the caller's pending rows unflushed; see record_missing()
+        with session.no_autoflush:
+            rows = session.exec(
+                select(MissingFood).where(
+                    MissingFood.fdc_id.in_(unknown), MissingFood.checked_at > cutoff
+                )
+            ).all()
+        for row in rows:
+            missing_cache.set(row.fdc_id, row.checked_at)
+            out.append(row.fdc_id)
+    return sorted(out)
+
+
+def record_missing(session: Session, fdc_ids: Iterable[int]) -> None:
+    """Remember that USDA has no food for ``fdc_ids``.
+
+    Written through a session of its own, so whatever the caller has pending
+    is never committed along with it.
+    """
+    now = datetime.utcnow()
+    ids = list(fdc_ids)
+    with Session(session.get_bind()) as own:
+        for fdc_id in ids:
+            own.merge(MissingFood(fdc_id=fdc_id, checked_at=now))
+        own.commit()
+    for fdc_id in ids:
+        missing_cache.set(fdc_id, now)
+
+
+def raise_if_missing(session: Session, fdc_ids: Iterable[int]) -> None:
+    missing = known_missing(session, fdc_ids)
+    if missing:
+        raise HTTPException(
+            status_code=404, detail=f"USDA food(s) not found: {missing}"
+        )
+
+
+# fdc_id -> future resolved once the in-flight fetch for that food is stored
+_inflight_fetches: Dict[int, asyncio.Future] = {}
+
+
+def _claim_fetches(fdc_ids: Iterable[int]) -> tuple[List[int], List[asyncio.Future]]:
+    """Split ``fdc_ids`` into ids this caller must fetch and fetches in flight.
+
+    Claimed ids get a future in ``_inflight_fetches`` so concurrent callers for
+    the same food wait on this fetch instead of issuing their own.
+    """
+    loop = asyncio.get_running_loop()
+    claimed: List[int] = []
+    pending: List[asyncio.Future] = []
+    for fdc_id in fdc_ids:
+        fut = _inflight_fetches.get(fdc_id)
+        if fut is not None and fut.get_loop() is loop:
+            pending.append(fut)
+            continue
+        fut = loop.create_future()
+        # Nobody may be waiting; mark any exception as retrieved.
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        _inflight_fetches[fdc_id] = fut
+        claimed.append(fdc_id)
+    return claimed, pending
+
+
+def _release_fetches(
+    fdc_ids: Iterable[int], exc: Optional[BaseException] = None
+) -> None:
+    if isinstance(exc, asyncio.CancelledError):
+        # Waiters were not cancelled themselves; fail them as a transient error
+        exc = HTTPException(status_code=503, detail="USDA fetch was cancelled")
+    for fdc_id in fdc_ids:
+        fut = _inflight_fetches.pop(fdc_id, None)
+        if fut is None or fut.done():
+            continue
+        if exc is None:
+            fut.set_result(None)
+        else:
+            fut.set_exception(exc)
+
+
+async def ensure_food_cached(fdc_id: int, session: Session) -> Food:
+    food = session.get(Food, fdc_id)
+    now = datetime.utcnow()
+    if _is_fresh(food, now):
+        return food
+    local = session.get(FdcFood, fdc_id) if fdc_id >= 0 else None
+    if local is not None:
+        food = food or Food(fdc_id=fdc_id)
+        _apply_local_food(session, food, local, now)
+        session.add(food)
+        session.commit()
+        session.refresh(food)
+        return food
+    if food is not None and (
+        USDA_OFFLINE
+        or not usda_breaker.available()
+        or (stale_refresher and stale_refresher.schedule([fdc_id]))
+    ):
+        return food
+    if USDA_OFFLINE:
+        raise HTTPException(status_code=404, detail="Food not available offline")
+    if food is None:
+        raise_if_missing(session, [fdc_id])
+    claimed, pending = _claim_fetches([fdc_id])
+    if pending:
+        await asyncio.shield(pending[0])
+        return session.get(Food, fdc_id, populate_existing=True)
+    try:
+        food_json = await fetch_food_detail(fdc_id)
+    except asyncio.CancelledError as exc:
+        _release_fetches(claimed, exc)
+        raise
+    except Exception as exc:
+        if food is not None and is_outage(exc):
+            logger.warning("Serving stale food %s: %s", fdc_id, exc)
+            _release_fetches(claimed)
+            return food
+        if isinstance(exc, HTTPException) and exc.status_code == 404:
+            record_missing(session, [fdc_id])
+        _release_fetches(claimed, exc)
+        raise
+    try:
+        food = save_fdc_food(session, fdc_id, food_json)
+    except (Exception, asyncio.CancelledError) as exc:
+        _release_fetches(claimed, exc)
+        raise
+    _release_fetches(claimed)
+    return food
+
+
+async def ensure_foods_cached(
+    fdc_ids: Iterable[int],
+    session: Session,
+    max_age: timedelta = CACHE_TTL,
+    defer_stale: bool = True,
+) -> Dict[int, Food]:
+    """Make sure every food in ``fdc_ids`` is cached, fetching in one batch.
+
+    Stale and missing USDA foods are collected up front, fetched together via
+    :func:`fetch_foods_detail` and written in a single commit. Foods present in
+    the imported FoodData Central copy are filled locally without a request,
+    and foods already being fetched by a concurrent caller are awaited rather
+    than refetched. Custom foods (negative ids) are never fetched. If USDA
+    omits a food that has no cached row at all, a 404 is raised and the id is
+    remembered (see :func:`record_missing`) so it is not requested again soon.
+
+    Rows older than ``max_age`` count as stale. While the background refresher
+    runs, stale rows are returned as they are and queued for refresh unless
+    ``defer_stale`` is False; only missing foods are fetched inline. Stale rows
+    are also served as they are while USDA is failing (see :data:`usda_breaker`).
+    """
+    ids = set(fdc_ids)
+    if not ids:
+        return {}
+    now = datetime.utcnow()
+    foods = {
+        f.fdc_id: f
+        for f in session.exec(select(Food).where(Food.fdc_id.in_(ids))).all()
+    }
+    for fdc_id in ids:
+        if fdc_id < 0 and fdc_id not in foods:
+            raise HTTPException(status_code=404, detail="Custom food not found")
+    to_fetch = sorted(
+        i for i in ids if i >= 0 and not _is_fresh(foods.get(i), now, max_age)
+    )
+    if not to_fetch:
+        return foods
+    local = {
+        f.fdc_id: f
+        for f in session.exec(select(FdcFood).where(FdcFood.fdc_id.in_(to_fetch)))
+    }
+    to_fetch = [i for i in to_fetch if i not in local]
+    stale = [i for i in to_fetch if i in foods]
+    if stale and (
+        not usda_breaker.available()
+        or (defer_stale and stale_refresher and stale_refresher.schedule(stale))
+    ):
+        to_fetch = [i for i in to_fetch if i not in foods]
+    if USDA_OFFLINE:
+        missing = [i for i in to_fetch if i not in foods]
+        if missing:
+            raise HTTPException(
+                status_code=404, detail=f"Food(s) not available offline: {missing}"
+            )
+        to_fetch = []
+    for fdc_id, row in local.items():
+        food = foods.get(fdc_id) or Food(fdc_id=fdc_id)
+        _apply_local_food(session, food, row, now)
+        session.add(food)
+        foods[fdc_id] = food
+    if not to_fetch:
+        session.commit()
+        return foods
+    raise_if_missing(session, [i for i in to_fetch if i not in foods])
+    claimed, pending = _claim_fetches(to_fetch)
+    try:
+        if claimed:
+            try:
+                payloads = await fetch_foods_detail(claimed)
+            except HTTPException as exc:
+                if not is_outage(exc) or any(i not in foods for i in claimed):
+                    raise
+                logger.warning("Serving stale foods %s: %s", claimed, exc.detail)
+            else:
+                missing = [i for i in claimed if i not in payloads and i not in foods]
+                for fdc_id in claimed:
+                    food_json = payloads.get(fdc_id)
+                    if food_json is None:
+                        if fdc_id in foods:
+                            logger.warning(
+                                "USDA omitted fdc_id %s; keeping stale row", fdc_id
+                            )
+                        continue
+                    food = foods.get(fdc_id) or Food(fdc_id=fdc_id)
+                    _apply_fdc_payload(session, food, food_json, now)
+                    _store_payload(session, fdc_id, food_json, now)
+                    session.add(food)
+                    foods[fdc_id] = food
+                if missing:
+                    # Keep the foods USDA did return; only the missing ones fail
+                    session.commit()
+                    record_missing(session, missing)
+                    _release_fetches([i for i in claimed if i not in missing])
+                    raise HTTPException(
+                        status_code=404, detail=f"USDA food(s) not found: {missing}"
+                    )
+            session.commit()
+    except (Exception, asyncio.CancelledError) as exc:
+        _release_fetches(claimed, exc)
+        raise
+    _release_fetches(claimed)
+    if pending:
+        await asyncio.gather(*(asyncio.shield(f) for f in pending))
+        others = [i for i in to_fetch if i not in claimed]
+        for food in session.exec(
+            select(Food)
+            .where(Food.fdc_id.in_(others))
+            .execution_options(populate_existing=True)
+        ).all():
+            foods[food.fdc_id] = food
+    return foods
+
+
 def scaled_macros_from_food(f: Food, qty: float) -> tuple[float, float, float, float]:
     """Return kcal, protein, carb and fat scaled by quantity for a food item."""
     if f.unit_name:
@@ -333,3 +957,14 @@ def get_or_create_meal(session: Session, date: date, name: str) -> Meal:
     session.commit()
     session.refresh(m)
     return m
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Tag ``response`` with ``etag``; return a 304 if the client has it already."""
+    response.headers["ETag"] = etag
+    header = request.headers.get("if-none-match")
+    if header:
+        tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+        if "*" in tags or etag.removeprefix("W/") in tags:
+            return Response(status_code=304, headers={"ETag": etag})
+    return None